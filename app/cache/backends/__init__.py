@@ -0,0 +1,119 @@
+"""
+Storage backends behind app.cache.store.
+
+A backend is a module implementing every function in STORE_API with
+the signatures and return values of app.cache.backends.redis (the
+reference; tests/test_cache.py is the conformance suite). CACHE_BACKEND
+picks one:
+
+    redis     Redis / Redis Cluster; several replicas, stream ingest
+    embedded  SQLite inside the process, in memory or persisted to a
+              WAL file; single node, no Redis server
+"""
+import importlib
+from types import ModuleType
+from typing import Optional
+
+from app.cache.keys import (
+    COMMENT_MAP,
+    FIRST_ISSUE,
+    FIRST_PR,
+)
+from app.settings import (
+    COMMENT_MAP_RETENTION_DAYS,
+    GREETING_RETENTION_DAYS,
+)
+
+
+BACKENDS = ("redis", "embedded")
+
+STORE_API = (
+    # Repository installation state
+    "mark_repo_installed",
+    "unmark_repo_installed",
+    "is_repo_installed",
+    "get_repo_installation",
+    "get_all_installed_repos",
+    "get_indexed_repos",
+    "purge_orphaned_repos",
+    # Comment <--> bot reply mapping
+    "set_comment_mapping",
+    "get_comment_mapping",
+    "delete_comment_mapping",
+    # GitHub response / maintainers caches
+    "get_cached_response",
+    "set_cached_response",
+    "get_cached_maintainers",
+    "set_cached_maintainers",
+    "invalidate_maintainers",
+    "invalidate_org_maintainers",
+    # Webhook delivery deduplication
+    "claim_delivery",
+    "release_delivery",
+    # Greetings
+    "has_been_greeted",
+    "mark_greeted",
+    "mark_user_seen",
+    "has_been_greeted_pr",
+    "mark_greeted_pr",
+    # Follow-ups
+    "schedule_followup",
+    "reschedule_followup",
+    "cancel_followup",
+    "claim_due_followups",
+    "ack_followup",
+    "release_followup",
+    "renew_followup_lease",
+    "mark_followup_sent",
+    "get_followup_data",
+    "has_followup",
+    "mark_followup_completed",
+    "is_followup_completed",
+    "clear_followup_completed",
+    "mark_followup_stopped",
+    "is_followup_stopped",
+    "clear_followup_stopped",
+    # Stale handling
+    "schedule_stale",
+    "cancel_stale",
+    "claim_due_stales",
+    "ack_stale",
+    "release_stale",
+    "renew_stale_lease",
+    "get_stale_data",
+    # Repo-wide cleanup / migration
+    "purge_repo",
+    "purge_installation",
+    "resume_purges",
+    "migrate_repo",
+    "purge_all",
+    "close_store",
+)
+
+
+def _days(days: float) -> Optional[int]:
+    return int(days * 86400) or None
+
+
+# Retention (seconds) per repo-scoped family, for every backend;
+# None: no expiry. Follow-up / stale state lives as long as its
+# schedule; stopped / completed flags record a decision on a live
+# issue and go only when it closes (or the repo is purged).
+RETENTION_SECONDS = {
+    COMMENT_MAP: _days(COMMENT_MAP_RETENTION_DAYS),
+    FIRST_ISSUE: _days(GREETING_RETENTION_DAYS),
+    FIRST_PR: _days(GREETING_RETENTION_DAYS),
+}
+
+
+def load_backend(name: str) -> ModuleType:
+    if name not in BACKENDS:
+        raise RuntimeError(f"Unknown CACHE_BACKEND {name!r} (expected one of {BACKENDS})")
+
+    backend = importlib.import_module(f"app.cache.backends.{name}")
+
+    missing = [fn for fn in STORE_API if not hasattr(backend, fn)]
+    if missing:
+        raise RuntimeError(f"Store backend {name!r} lacks: {', '.join(missing)}")
+
+    return backend
@@ -0,0 +1,650 @@
+"""
+Embedded store backend (CACHE_BACKEND=embedded): the store API on
+SQLite inside the process, for single-node installs without a Redis
+server (and for tests).
+
+EMBEDDED_STORE_PATH empty keeps everything in memory; otherwise the
+database file is opened in WAL mode and survives restarts. One process
+only: claims and installed-repo state are not shared with other
+replicas, and stream ingest needs Redis.
+
+Keys are the key strings of app.cache.keys, so follow-up / stale keys
+handed out by the claim functions work with split_issue_key(). Due
+times live in their own table, indexed by (queue, due time). Each call
+runs as one transaction without yielding to the event loop, which
+makes it atomic with respect to other tasks.
+"""
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from app.cache.backends import RETENTION_SECONDS
+from app.cache.keys import (
+    COMMENT_MAP,
+    FIRST_ISSUE,
+    FIRST_PR,
+    FOLLOWUP,
+    FOLLOWUP_INDEX,
+    FOLLOWUP_LEASES,
+    STALE,
+    STALE_INDEX,
+    STALE_LEASES,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+    ETAG_PREFIX,
+    DELIVERY_PREFIX,
+    repo_key,
+    key_family,
+    renamed_key,
+    followup_key,
+    stale_key,
+    maintainers_key,
+    org_maintainers_key,
+)
+from app.logger import get_logger
+from app.settings import EMBEDDED_STORE_PATH
+
+
+logger = get_logger("yaplate.cache.embedded")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    repo TEXT,
+    value TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS kv_repo ON kv (repo) WHERE repo IS NOT NULL;
+CREATE INDEX IF NOT EXISTS kv_expiry ON kv (expires_at) WHERE expires_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS due (
+    queue TEXT NOT NULL,
+    key TEXT NOT NULL,
+    at REAL NOT NULL,
+    PRIMARY KEY (queue, key)
+);
+CREATE INDEX IF NOT EXISTS due_by_time ON due (queue, at);
+
+CREATE TABLE IF NOT EXISTS installed_repos (
+    repo TEXT PRIMARY KEY,
+    installation_id INTEGER
+);
+"""
+
+# Expired rows are hidden from reads at once and deleted in bulk at
+# most this often
+_EXPIRE_INTERVAL_SECONDS = 60
+
+_db: Optional[sqlite3.Connection] = None
+_next_expire = 0.0
+
+
+def _connect() -> sqlite3.Connection:
+    global _db
+
+    if _db is None:
+        path = EMBEDDED_STORE_PATH or ":memory:"
+        _db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+
+        if EMBEDDED_STORE_PATH:
+            _db.execute("PRAGMA journal_mode=WAL")
+            _db.execute("PRAGMA synchronous=NORMAL")
+
+        _db.executescript(_SCHEMA)
+        logger.info("Embedded store opened (%s)", path)
+
+    return _db
+
+
+@contextmanager
+def _transaction():
+    global _next_expire
+
+    db = _connect()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        if now >= _next_expire:
+            db.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+            _next_expire = now + _EXPIRE_INTERVAL_SECONDS
+
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    else:
+        db.execute("COMMIT")
+
+
+def _get(db, key: str):
+    row = db.execute(
+        "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+        (key, time.time()),
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _put(db, key: str, value, repo: Optional[str] = None, ttl: Optional[float] = None):
+    db.execute(
+        "INSERT INTO kv (key, repo, value, expires_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET "
+        "repo = excluded.repo, value = excluded.value, expires_at = excluded.expires_at",
+        (key, repo, json.dumps(value), time.time() + ttl if ttl else None),
+    )
+
+
+def _put_scoped(db, repo: str, key: str, value):
+    """
+    Write a repo-scoped key with its family's retention.
+    """
+    _put(db, key, value, repo=repo, ttl=RETENTION_SECONDS.get(key_family(key)[0]))
+
+
+def _delete(db, *keys: str):
+    for key in keys:
+        db.execute("DELETE FROM kv WHERE key = ?", (key,))
+        db.execute("DELETE FROM due WHERE key = ?", (key,))
+
+
+def _hash(fields: dict) -> dict:
+    # Field values read back as strings, as from a Redis hash
+    return {field: str(value) for field, value in fields.items()}
+
+
+def _installed(db, repo: str) -> bool:
+    return db.execute("SELECT 1 FROM installed_repos WHERE repo = ?", (repo,)).fetchone() is not None
+
+
+# Repository installation state
+async def mark_repo_installed(repo: str, installation_id: Optional[int] = None):
+    with _transaction() as db:
+        db.execute(
+            "INSERT INTO installed_repos (repo, installation_id) VALUES (?, ?) "
+            "ON CONFLICT (repo) DO UPDATE SET "
+            "installation_id = COALESCE(excluded.installation_id, installation_id)",
+            (repo, installation_id),
+        )
+
+
+def _purge_repo(db, repo: str):
+    keys = [key for (key,) in db.execute("SELECT key FROM kv WHERE repo = ?", (repo,))]
+    _delete(db, *keys)
+
+
+async def unmark_repo_installed(repo: str):
+    with _transaction() as db:
+        db.execute("DELETE FROM installed_repos WHERE repo = ?", (repo,))
+        _purge_repo(db, repo)
+
+
+async def is_repo_installed(repo: str) -> bool:
+    with _transaction() as db:
+        return _installed(db, repo)
+
+
+async def get_repo_installation(repo: str) -> Optional[int]:
+    with _transaction() as db:
+        row = db.execute(
+            "SELECT installation_id FROM installed_repos WHERE repo = ?", (repo,)
+        ).fetchone()
+    return row[0] if row else None
+
+
+async def get_all_installed_repos() -> set[str]:
+    with _transaction() as db:
+        return {repo for (repo,) in db.execute("SELECT repo FROM installed_repos")}
+
+
+async def get_indexed_repos() -> set[str]:
+    """
+    Repos that own at least one stored key.
+    """
+    with _transaction() as db:
+        return {
+            repo
+            for (repo,) in db.execute(
+                "SELECT DISTINCT repo FROM kv WHERE repo IS NOT NULL "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (time.time(),),
+            )
+        }
+
+
+async def purge_orphaned_repos(valid_repos: set[str]):
+    orphaned = await get_indexed_repos() - set(valid_repos)
+    with _transaction() as db:
+        for repo in orphaned:
+            _purge_repo(db, repo)
+
+
+# Comment <--> bot reply mapping
+async def set_comment_mapping(user_comment_id: int, bot_comment_id: int, repo: str):
+    with _transaction() as db:
+        _put_scoped(db, repo, repo_key(repo, COMMENT_MAP, user_comment_id), str(bot_comment_id))
+
+
+async def get_comment_mapping(user_comment_id: int, repo: str):
+    with _transaction() as db:
+        return _get(db, repo_key(repo, COMMENT_MAP, user_comment_id))
+
+
+async def delete_comment_mapping(user_comment_id: int, repo: str):
+    with _transaction() as db:
+        _delete(db, repo_key(repo, COMMENT_MAP, user_comment_id))
+
+
+# GitHub conditional-request cache
+async def get_cached_response(endpoint: str) -> Optional[dict]:
+    with _transaction() as db:
+        return _get(db, f"{ETAG_PREFIX}{endpoint}")
+
+
+async def set_cached_response(endpoint: str, entry: dict, ttl_seconds: int):
+    with _transaction() as db:
+        _put(db, f"{ETAG_PREFIX}{endpoint}", entry, ttl=ttl_seconds)
+
+
+# Repo maintainers cache
+async def get_cached_maintainers(repo: str) -> Optional[list[str]]:
+    with _transaction() as db:
+        return _get(db, maintainers_key(repo))
+
+
+async def set_cached_maintainers(repo: str, maintainers: list[str], ttl_seconds: int):
+    with _transaction() as db:
+        _put(db, maintainers_key(repo), maintainers, ttl=ttl_seconds)
+
+
+async def invalidate_maintainers(repo: str):
+    with _transaction() as db:
+        _delete(db, maintainers_key(repo))
+
+
+def _delete_prefixed(db, prefix: str) -> int:
+    # Key range [prefix, next prefix): a primary key range, not a scan
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.execute(
+        "DELETE FROM kv WHERE key >= ? AND key < ?", (prefix, upper)
+    ).rowcount
+
+
+async def invalidate_org_maintainers(org: str):
+    """
+    Team / org membership changes can affect every repo of the org.
+    """
+    with _transaction() as db:
+        _delete_prefixed(db, f"{org_maintainers_key(org)}:")
+
+
+# Webhook delivery deduplication
+async def claim_delivery(delivery_id: str, ttl_seconds: int) -> bool:
+    """
+    Record a webhook delivery id.
+
+    Returns False if it was already recorded (a redelivery).
+    """
+    key = f"{DELIVERY_PREFIX}{delivery_id}"
+    with _transaction() as db:
+        if _get(db, key) is not None:
+            return False
+        _put(db, key, 1, ttl=ttl_seconds)
+        return True
+
+
+async def release_delivery(delivery_id: str):
+    with _transaction() as db:
+        _delete(db, f"{DELIVERY_PREFIX}{delivery_id}")
+
+
+# Greeting tracking (one row per entry, value: written at)
+async def _mark(family: str, repo: str, *parts):
+    with _transaction() as db:
+        _put_scoped(db, repo, repo_key(repo, family, *parts), int(time.time()))
+
+
+async def _is_marked(family: str, repo: str, *parts) -> bool:
+    with _transaction() as db:
+        return _get(db, repo_key(repo, family, *parts)) is not None
+
+
+async def _unmark_flag(family: str, repo: str, *parts):
+    with _transaction() as db:
+        _delete(db, repo_key(repo, family, *parts))
+
+
+async def has_been_greeted(repo_id: int, username: str, repo: str) -> bool:
+    return await _is_marked(FIRST_ISSUE, repo, repo_id, username)
+
+
+async def mark_greeted(repo_id: int, username: str, repo: str):
+    await _mark(FIRST_ISSUE, repo, repo_id, username)
+
+
+async def mark_user_seen(repo_id: int, username: str, repo: str):
+    """
+    Mark a user as already seen in this repo (startup reconciliation).
+    """
+    if not username:
+        return
+    await _mark(FIRST_ISSUE, repo, repo_id, username)
+
+
+async def has_been_greeted_pr(repo_id: int, username: str, repo: str) -> bool:
+    return await _is_marked(FIRST_PR, repo, repo_id, username)
+
+
+async def mark_greeted_pr(repo_id: int, username: str, repo: str):
+    await _mark(FIRST_PR, repo, repo_id, username)
+
+
+# Due-time queues
+def _set_due(db, queue: str, key: str, at: float, replace: bool = True):
+    db.execute(
+        "INSERT INTO due (queue, key, at) VALUES (?, ?, ?) ON CONFLICT (queue, key) DO "
+        + ("UPDATE SET at = excluded.at" if replace else "NOTHING"),
+        (queue, key, at),
+    )
+
+
+def _unset_due(db, queue: str, key: str):
+    db.execute("DELETE FROM due WHERE queue = ? AND key = ?", (queue, key))
+
+
+def _schedule(queue: str, repo: str, key: str, due_at: float, fields: dict):
+    with _transaction() as db:
+        if not _installed(db, repo):
+            return
+
+        data = _get(db, key) or {}
+        data.update(_hash(fields))
+        _put(db, key, data, repo=repo)
+        _set_due(db, queue, key, due_at)
+
+
+def _claim_due(index: str, leases: str, now: float, lease_seconds: float, limit: int) -> list[str]:
+    """
+    Re-queue expired leases (unless rescheduled since), then move up to
+    `limit` due keys into `leases` until now + lease_seconds.
+    """
+    with _transaction() as db:
+        expired = [
+            key
+            for (key,) in db.execute(
+                "SELECT key FROM due WHERE queue = ? AND at <= ?", (leases, now)
+            ).fetchall()
+        ]
+        for key in expired:
+            _unset_due(db, leases, key)
+            _set_due(db, index, key, now, replace=False)
+
+        due = [
+            key
+            for (key,) in db.execute(
+                "SELECT key FROM due WHERE queue = ? AND at <= ? ORDER BY at, key LIMIT ?",
+                (index, now, limit),
+            ).fetchall()
+        ]
+        for key in due:
+            _unset_due(db, index, key)
+            _set_due(db, leases, key, now + lease_seconds)
+
+    return due
+
+
+def _renew(leases: str, key: str, lease_seconds: float) -> bool:
+    """
+    Extend a held, unexpired lease to now + lease_seconds.
+    """
+    now = time.time()
+    with _transaction() as db:
+        row = db.execute(
+            "SELECT at FROM due WHERE queue = ? AND key = ?", (leases, key)
+        ).fetchone()
+        if row is None or row[0] <= now:
+            return False
+
+        _set_due(db, leases, key, now + lease_seconds)
+        return True
+
+
+def _release(index: str, leases: str, key: str):
+    """
+    Hand a claimed key back, due now; a newer schedule is kept.
+    """
+    with _transaction() as db:
+        _unset_due(db, leases, key)
+        _set_due(db, index, key, time.time(), replace=False)
+
+
+# Follow-up scheduling
+async def schedule_followup(repo: str, issue_number: int, assignee: str, lang: str, due_at: float, attempt: int = 1):
+    _schedule(FOLLOWUP_INDEX, repo, followup_key(repo, issue_number), due_at, {
+        "repo": repo,
+        "issue_number": issue_number,
+        "assignee": assignee,
+        "lang": lang,
+        "due_at": due_at,
+        "sent": 0,
+        "attempt": attempt,
+    })
+
+
+async def reschedule_followup(repo: str, issue_number: int, next_due_at: float):
+    """
+    Bump the attempt and due time; cancels instead if the follow-up is
+    gone or the repo is no longer installed.
+    """
+    key = followup_key(repo, issue_number)
+
+    with _transaction() as db:
+        data = _get(db, key)
+        if not data or not _installed(db, repo):
+            _delete(db, key, stale_key(repo, issue_number))
+            return
+
+        data.update(_hash({
+            "due_at": next_due_at,
+            "sent": 0,
+            "attempt": int(data.get("attempt", 1)) + 1,
+        }))
+        _put(db, key, data, repo=repo)
+        _set_due(db, FOLLOWUP_INDEX, key, next_due_at)
+
+
+async def cancel_followup(repo: str, issue_number: int):
+    with _transaction() as db:
+        _delete(db, followup_key(repo, issue_number), stale_key(repo, issue_number))
+
+
+async def claim_due_followups(now: float, lease_seconds: float, limit: int) -> list[str]:
+    return _claim_due(FOLLOWUP_INDEX, FOLLOWUP_LEASES, now, lease_seconds, limit)
+
+
+async def ack_followup(key: str):
+    with _transaction() as db:
+        _unset_due(db, FOLLOWUP_LEASES, key)
+
+
+async def release_followup(key: str):
+    _release(FOLLOWUP_INDEX, FOLLOWUP_LEASES, key)
+
+
+async def renew_followup_lease(key: str, lease_seconds: float) -> bool:
+    return _renew(FOLLOWUP_LEASES, key, lease_seconds)
+
+
+async def mark_followup_sent(key: str):
+    with _transaction() as db:
+        data = _get(db, key)
+        if data is not None:
+            data["sent"] = "1"
+            db.execute("UPDATE kv SET value = ? WHERE key = ?", (json.dumps(data), key))
+        _unset_due(db, FOLLOWUP_INDEX, key)
+
+
+async def get_followup_data(key: str):
+    with _transaction() as db:
+        return _get(db, key) or {}
+
+
+async def has_followup(repo: str, issue_number: int) -> bool:
+    with _transaction() as db:
+        return _get(db, followup_key(repo, issue_number)) is not None
+
+
+async def mark_followup_completed(repo: str, issue_number: int):
+    await _mark(FOLLOWUP_COMPLETED, repo, repo, issue_number)
+
+
+async def is_followup_completed(repo: str, issue_number: int) -> bool:
+    return await _is_marked(FOLLOWUP_COMPLETED, repo, repo, issue_number)
+
+
+async def clear_followup_completed(repo: str, issue_number: int):
+    await _unmark_flag(FOLLOWUP_COMPLETED, repo, repo, issue_number)
+
+
+async def mark_followup_stopped(repo: str, issue_number: int):
+    await _mark(FOLLOWUP_STOPPED, repo, repo, issue_number)
+
+
+async def is_followup_stopped(repo: str, issue_number: int) -> bool:
+    return await _is_marked(FOLLOWUP_STOPPED, repo, repo, issue_number)
+
+
+async def clear_followup_stopped(repo: str, issue_number: int):
+    await _unmark_flag(FOLLOWUP_STOPPED, repo, repo, issue_number)
+
+
+# Stale handling
+async def schedule_stale(repo: str, issue_number: int, lang: str, due_at: float):
+    _schedule(STALE_INDEX, repo, stale_key(repo, issue_number), due_at, {
+        "repo": repo,
+        "issue_number": issue_number,
+        "lang": lang,
+        "due_at": due_at,
+    })
+
+
+async def cancel_stale(repo: str, issue_number: int):
+    with _transaction() as db:
+        _delete(db, stale_key(repo, issue_number))
+
+
+async def claim_due_stales(now: float, lease_seconds: float, limit: int) -> list[str]:
+    return _claim_due(STALE_INDEX, STALE_LEASES, now, lease_seconds, limit)
+
+
+async def ack_stale(key: str):
+    with _transaction() as db:
+        _unset_due(db, STALE_LEASES, key)
+
+
+async def release_stale(key: str):
+    _release(STALE_INDEX, STALE_LEASES, key)
+
+
+async def renew_stale_lease(key: str, lease_seconds: float) -> bool:
+    return _renew(STALE_LEASES, key, lease_seconds)
+
+
+async def get_stale_data(key: str):
+    with _transaction() as db:
+        return _get(db, key) or {}
+
+
+# Repo-wide cleanup / migration
+async def purge_repo(repo: str):
+    with _transaction() as db:
+        _purge_repo(db, repo)
+
+
+async def purge_installation(installation_id: int, repos: Iterable[str] = ()):
+    """
+    Delete one installation's state on uninstall: the repos recorded
+    under it, plus `repos` where no installation is recorded, and its
+    cached responses. One transaction, so nothing is left to resume.
+    """
+    with _transaction() as db:
+        owners = dict(db.execute(
+            "SELECT repo, installation_id FROM installed_repos WHERE installation_id IS NOT NULL"
+        ).fetchall())
+
+        tenant = {repo for repo, owner in owners.items() if owner == int(installation_id)}
+        tenant.update(repo for repo in repos if repo not in owners)
+
+        for repo in tenant:
+            db.execute("DELETE FROM installed_repos WHERE repo = ?", (repo,))
+            _purge_repo(db, repo)
+
+        etags = _delete_prefixed(db, f"{ETAG_PREFIX}{installation_id}:")
+
+    logger.info(
+        "Purged installation %s: %s repo(s), %s cached response(s)",
+        installation_id,
+        len(tenant),
+        etags,
+    )
+
+
+async def resume_purges() -> int:
+    # Purges are single transactions here
+    return 0
+
+
+async def migrate_repo(old_repo: str, new_repo: str):
+    """
+    Move a repo's state to its new name, in one transaction.
+    """
+    if old_repo == new_repo:
+        return
+
+    with _transaction() as db:
+        rows = db.execute(
+            "SELECT key, value, expires_at FROM kv WHERE repo = ?", (old_repo,)
+        ).fetchall()
+
+        for key, raw, expires_at in rows:
+            value = json.loads(raw)
+            if key_family(key)[0] in (FOLLOWUP, STALE):
+                value["repo"] = new_repo
+
+            new_key = renamed_key(key, old_repo, new_repo)
+
+            db.execute("DELETE FROM kv WHERE key = ?", (key,))
+            db.execute(
+                "INSERT OR REPLACE INTO kv (key, repo, value, expires_at) VALUES (?, ?, ?, ?)",
+                (new_key, new_repo, json.dumps(value), expires_at),
+            )
+            db.execute(
+                "UPDATE OR REPLACE due SET key = ? WHERE key = ?", (new_key, key)
+            )
+
+        row = db.execute(
+            "SELECT installation_id FROM installed_repos WHERE repo = ?", (old_repo,)
+        ).fetchone()
+        db.execute("DELETE FROM installed_repos WHERE repo = ?", (old_repo,))
+        db.execute(
+            "INSERT INTO installed_repos (repo, installation_id) VALUES (?, ?) "
+            "ON CONFLICT (repo) DO UPDATE SET "
+            "installation_id = COALESCE(excluded.installation_id, installation_id)",
+            (new_repo, row[0] if row else None),
+        )
+
+
+async def purge_all():
+    with _transaction() as db:
+        db.execute("DELETE FROM kv")
+        db.execute("DELETE FROM due")
+        db.execute("DELETE FROM installed_repos")
+
+
+async def close_store():
+    global _db, _next_expire
+
+    if _db is not None:
+        _db.close()
+        _db = None
+        _next_expire = 0.0
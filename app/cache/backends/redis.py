@@ -0,0 +1,992 @@
+"""
+Redis store backend (CACHE_BACKEND=redis): Redis or Redis Cluster,
+in the key layout of app.cache.keys. Shared by every replica and by
+the stream workers.
+"""
+import json
+import time
+from typing import Iterable, Optional
+
+from app.cache.backends import RETENTION_SECONDS
+from app.cache.keys import (
+    COMMENT_MAP,
+    FIRST_ISSUE,
+    FIRST_PR,
+    FOLLOWUP,
+    FOLLOWUP_INDEX,
+    FOLLOWUP_LEASES,
+    STALE,
+    STALE_INDEX,
+    STALE_LEASES,
+    INSTALLED_REPOS,
+    REPO_INSTALLATION,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+    ETAG_PREFIX,
+    DELIVERY_PREFIX,
+    INSTALLATION_PURGE_PREFIX,
+    KEY_SCHEMA_VERSION_KEY,
+    KEY_SCHEMA_LAYOUT_KEY,
+    REPO_KEYS,
+    REDIS_KEY_SHARDS,
+    shard_of,
+    shard_key,
+    repo_key,
+    key_shard,
+    key_family,
+    greeting_bucket,
+    flag_bucket,
+    renamed_key,
+    followup_key,
+    stale_key,
+    maintainers_key,
+    org_maintainers_key,
+)
+from app.cache import installed_repos
+from app.cache.redis_client import get_async_redis, close_async_redis
+from app.cache.scripts import run_script
+from app.logger import get_logger
+
+
+logger = get_logger("yaplate.cache.store")
+
+
+# Utility
+def _as_str(x):
+    return x.decode() if isinstance(x, bytes) else x
+
+def _safe_iter(keys: Iterable):
+    for key in keys:
+        yield _as_str(key)
+
+
+# Per-repo key index
+def _repo_keys(repo: str) -> str:
+    return repo_key(repo, REPO_KEYS, repo)
+
+
+# Bucketed families: small hashes of entry -> written-at (epoch
+# seconds), see app.cache.keys
+BUCKETED_FAMILIES = (
+    FIRST_ISSUE,
+    FIRST_PR,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+)
+
+# Families stored as hashes (everything else is a string)
+_HASH_FAMILIES = (FOLLOWUP, STALE, *BUCKETED_FAMILIES)
+
+
+# Retention (RETENTION_SECONDS) is applied on every write. A bucket's
+# TTL is refreshed by each write to it; its older entries are pruned
+# by the key sweeper.
+
+
+# All writes touching several keys use MULTI explicitly: on Redis
+# Cluster a bare pipeline() is not transactional. Keys of one MULTI
+# always share a shard (slot).
+async def _set_indexed(r, repo: str, key: str, value=1):
+    """
+    SET a repo-scoped key (with its family's retention) and index it,
+    atomically (one MULTI). Index entries of expired keys are dropped
+    by the key sweeper.
+    """
+    pipe = r.pipeline(transaction=True)
+    pipe.set(key, value, ex=RETENTION_SECONDS.get(key_family(key)[0]))
+    pipe.sadd(_repo_keys(repo), key)
+    await pipe.execute()
+
+
+async def _delete_indexed(r, repo: str, key: str):
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.srem(_repo_keys(repo), key)
+    await pipe.execute()
+
+
+def _greeting_key(family: str, repo: str, repo_id: int, username: str) -> str:
+    return repo_key(repo, family, repo_id, greeting_bucket(username))
+
+
+def _flag_key(family: str, repo: str, issue_number: int) -> str:
+    return repo_key(repo, family, repo, flag_bucket(issue_number))
+
+
+async def _set_bucketed(r, repo: str, key: str, field):
+    """
+    Add one entry to a bucket (refreshing the bucket's retention) and
+    index the bucket, atomically (one MULTI).
+    """
+    pipe = r.pipeline(transaction=True)
+    pipe.hset(key, field, int(time.time()))
+    ttl = RETENTION_SECONDS.get(key_family(key)[0])
+    if ttl:
+        pipe.expire(key, ttl)
+    pipe.sadd(_repo_keys(repo), key)
+    await pipe.execute()
+
+
+async def _delete_bucketed(r, key: str, field):
+    """
+    Remove one entry. A bucket left empty disappears and its index
+    entry is dropped by the key sweeper.
+    """
+    await r.hdel(key, field)
+
+
+# Repository installation state
+async def mark_repo_installed(repo: str, installation_id: Optional[int] = None):
+    """
+    Called for nearly every event, so the change is only broadcast
+    when the repo was not in the set yet.
+    """
+    r = get_async_redis()
+    shard = shard_of(repo)
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.sadd(shard_key(shard, INSTALLED_REPOS), repo)
+        if installation_id is not None:
+            pipe.hset(shard_key(shard, REPO_INSTALLATION), repo, installation_id)
+        added, *_ = await pipe.execute()
+
+        installed_repos.apply(installed_repos.ADDED, repo)
+        if added:
+            await installed_repos.publish_change(installed_repos.ADDED, repo)
+    except Exception:
+        logger.exception("Failed to mark repo installed: %s", repo)
+
+
+async def _unmark(r, repo: str):
+    shard = shard_of(repo)
+
+    pipe = r.pipeline(transaction=True)
+    pipe.srem(shard_key(shard, INSTALLED_REPOS), repo)
+    pipe.hdel(shard_key(shard, REPO_INSTALLATION), repo)
+    await pipe.execute()
+
+    installed_repos.apply(installed_repos.REMOVED, repo)
+    await installed_repos.publish_change(installed_repos.REMOVED, repo)
+
+
+async def unmark_repo_installed(repo: str):
+    r = get_async_redis()
+    try:
+        await _unmark(r, repo)
+        await _unlink_repo_keys(r, repo)
+    except Exception:
+        logger.exception("Failed to unmark repo installed: %s", repo)
+
+
+async def is_repo_installed(repo: str) -> bool:
+    installed = installed_repos.contains(repo)
+    if installed is not None:
+        return installed
+
+    r = get_async_redis()
+    try:
+        return bool(await r.sismember(shard_key(shard_of(repo), INSTALLED_REPOS), repo))
+    except Exception:
+        logger.exception("Failed to check repo installed state: %s", repo)
+        return False
+
+
+async def get_repo_installation(repo: str) -> Optional[int]:
+    r = get_async_redis()
+    try:
+        value = await r.hget(shard_key(shard_of(repo), REPO_INSTALLATION), repo)
+        return int(value) if value is not None else None
+    except Exception:
+        logger.exception("Failed to get repo installation: %s", repo)
+        return None
+
+
+async def get_all_installed_repos() -> set[str]:
+    repos = installed_repos.snapshot()
+    if repos is not None:
+        return repos
+
+    try:
+        return await installed_repos.fetch_all(get_async_redis())
+    except Exception:
+        logger.exception("Failed to list installed repos")
+        return set()
+
+
+async def get_indexed_repos() -> set[str]:
+    """
+    Repos that own at least one indexed key.
+    """
+    r = get_async_redis()
+    try:
+        return {
+            key_family(_as_str(key))[1]
+            async for key in r.scan_iter(f"yaplate:{{s*}}:{REPO_KEYS}:*")
+        }
+    except Exception:
+        logger.exception("Failed to list indexed repos")
+        return set()
+
+
+async def purge_orphaned_repos(valid_repos: set[str]):
+    try:
+        orphaned = await get_indexed_repos() - set(valid_repos)
+        for repo in orphaned:
+            await purge_repo(repo)
+    except Exception:
+        logger.exception("Failed to purge orphaned repos")
+
+
+
+# Comment <--> bot reply mapping
+async def set_comment_mapping(user_comment_id: int, bot_comment_id: int, repo: str):
+    r = get_async_redis()
+    try:
+        await _set_indexed(r, repo, repo_key(repo, COMMENT_MAP, user_comment_id), bot_comment_id)
+    except Exception:
+        logger.exception("Failed to set comment mapping: %s", user_comment_id)
+
+
+async def get_comment_mapping(user_comment_id: int, repo: str):
+    r = get_async_redis()
+    try:
+        return await r.get(repo_key(repo, COMMENT_MAP, user_comment_id))
+    except Exception:
+        logger.exception("Failed to get comment mapping: %s", user_comment_id)
+        return None
+
+
+async def delete_comment_mapping(user_comment_id: int, repo: str):
+    r = get_async_redis()
+    try:
+        await _delete_indexed(r, repo, repo_key(repo, COMMENT_MAP, user_comment_id))
+    except Exception:
+        logger.exception("Failed to delete comment mapping: %s", user_comment_id)
+
+
+# GitHub conditional-request cache
+async def get_cached_response(endpoint: str) -> Optional[dict]:
+    r = get_async_redis()
+    try:
+        raw = await r.get(f"{ETAG_PREFIX}{endpoint}")
+        return json.loads(raw) if raw else None
+    except Exception:
+        logger.exception("Failed to get cached response: %s", endpoint)
+        return None
+
+
+async def set_cached_response(endpoint: str, entry: dict, ttl_seconds: int):
+    r = get_async_redis()
+    try:
+        await r.set(f"{ETAG_PREFIX}{endpoint}", json.dumps(entry), ex=ttl_seconds)
+    except Exception:
+        logger.exception("Failed to set cached response: %s", endpoint)
+
+
+# Repo maintainers cache
+async def get_cached_maintainers(repo: str) -> Optional[list[str]]:
+    r = get_async_redis()
+    try:
+        raw = await r.get(maintainers_key(repo))
+        return json.loads(raw) if raw is not None else None
+    except Exception:
+        logger.exception("Failed to get cached maintainers: %s", repo)
+        return None
+
+
+async def set_cached_maintainers(repo: str, maintainers: list[str], ttl_seconds: int):
+    """
+    Cache the list and record it in its org's set. The set's TTL is
+    refreshed with every entry, so it lives as long as the newest one.
+    """
+    r = get_async_redis()
+    key = maintainers_key(repo)
+    org_key = org_maintainers_key(repo.split("/", 1)[0])
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.set(key, json.dumps(maintainers), ex=ttl_seconds)
+        pipe.sadd(org_key, key)
+        pipe.expire(org_key, ttl_seconds)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to cache maintainers: %s", repo)
+
+
+async def invalidate_maintainers(repo: str):
+    r = get_async_redis()
+    key = maintainers_key(repo)
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.srem(org_maintainers_key(repo.split("/", 1)[0]), key)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to invalidate maintainers: %s", repo)
+
+
+async def invalidate_org_maintainers(org: str):
+    """
+    Team / org membership changes can affect every repo of the org:
+    drop the entries listed in the org's set (one slot, no scan).
+    """
+    r = get_async_redis()
+    org_key = org_maintainers_key(org)
+    try:
+        keys = await r.smembers(org_key)
+        await r.delete(org_key, *keys)
+    except Exception:
+        logger.exception("Failed to invalidate org maintainers: %s", org)
+
+
+# Webhook delivery deduplication
+async def claim_delivery(delivery_id: str, ttl_seconds: int) -> bool:
+    """
+    Record a webhook delivery id.
+
+    Returns False if it was already recorded (a redelivery).
+    Fails open: if Redis is unavailable the delivery is processed.
+    """
+    r = get_async_redis()
+    try:
+        return bool(await r.set(f"{DELIVERY_PREFIX}{delivery_id}", 1, nx=True, ex=ttl_seconds))
+    except Exception:
+        logger.exception("Failed to record delivery: %s", delivery_id)
+        return True
+
+
+async def release_delivery(delivery_id: str):
+    """
+    Forget a delivery id so GitHub's redelivery is not skipped
+    (used when the event could not be queued).
+    """
+    r = get_async_redis()
+    try:
+        await r.delete(f"{DELIVERY_PREFIX}{delivery_id}")
+    except Exception:
+        logger.exception("Failed to release delivery: %s", delivery_id)
+
+
+# Greeting tracking
+async def has_been_greeted(repo_id: int, username: str, repo: str) -> bool:
+    r = get_async_redis()
+    try:
+        return await r.hexists(_greeting_key(FIRST_ISSUE, repo, repo_id, username), username)
+    except Exception:
+        logger.exception("Failed to check greeting state")
+        return False
+
+
+async def mark_greeted(repo_id: int, username: str, repo: str):
+    r = get_async_redis()
+    try:
+        await _set_bucketed(r, repo, _greeting_key(FIRST_ISSUE, repo, repo_id, username), username)
+    except Exception:
+        logger.exception("Failed to mark greeted")
+
+
+# Greeting seeding (startup reconciliation)
+async def mark_user_seen(repo_id: int, username: str, repo: str):
+    """
+    Mark a user as already seen in this repo.
+    Used during startup reconciliation to avoid false
+    'first issue' greetings after downtime.
+    """
+    if not username:
+        return
+
+    r = get_async_redis()
+    try:
+        await _set_bucketed(r, repo, _greeting_key(FIRST_ISSUE, repo, repo_id, username), username)
+    except Exception:
+        logger.exception(
+            "Failed to mark user seen: repo_id=%s user=%s",
+            repo_id,
+            username,
+        )
+
+async def has_been_greeted_pr(repo_id: int, username: str, repo: str) -> bool:
+    r = get_async_redis()
+    try:
+        return await r.hexists(_greeting_key(FIRST_PR, repo, repo_id, username), username)
+    except Exception:
+        logger.exception("Failed to check PR greeting state")
+        return False
+
+async def mark_greeted_pr(repo_id: int, username: str, repo: str):
+    r = get_async_redis()
+    try:
+        await _set_bucketed(r, repo, _greeting_key(FIRST_PR, repo, repo_id, username), username)
+    except Exception:
+        logger.exception("Failed to mark PR greeted")
+
+
+
+# Follow-up scheduling
+async def _schedule(index: str, repo: str, key: str, due_at: float, fields: dict):
+    """
+    Installed check + HSET + ZADD + index in one atomic round trip.
+    """
+    shard = shard_of(repo)
+
+    args = [repo, due_at]
+    for field, value in fields.items():
+        args += [field, value]
+
+    await run_script(
+        "schedule",
+        keys=[shard_key(shard, INSTALLED_REPOS), key, shard_key(shard, index), _repo_keys(repo)],
+        args=args,
+    )
+
+
+async def schedule_followup(repo: str, issue_number: int, assignee: str, lang: str, due_at: float, attempt: int = 1):
+    key = followup_key(repo, issue_number)
+
+    try:
+        await _schedule(FOLLOWUP_INDEX, repo, key, due_at, {
+            "repo": repo,
+            "issue_number": issue_number,
+            "assignee": assignee,
+            "lang": lang,
+            "due_at": due_at,
+            "sent": 0,
+            "attempt": attempt,
+        })
+    except Exception:
+        logger.exception("Failed to schedule followup: %s #%s", repo, issue_number)
+
+
+async def reschedule_followup(repo: str, issue_number: int, next_due_at: float):
+    """
+    Bump the attempt and due time atomically; cancels instead if the
+    follow-up is gone or the repo is no longer installed.
+    """
+    key = followup_key(repo, issue_number)
+    shard = shard_of(repo)
+
+    try:
+        await run_script(
+            "reschedule_followup",
+            keys=[
+                shard_key(shard, INSTALLED_REPOS),
+                key,
+                shard_key(shard, FOLLOWUP_INDEX),
+                stale_key(repo, issue_number),
+                shard_key(shard, STALE_INDEX),
+                _repo_keys(repo),
+                shard_key(shard, FOLLOWUP_LEASES),
+                shard_key(shard, STALE_LEASES),
+            ],
+            args=[next_due_at, repo],
+        )
+    except Exception:
+        logger.exception("Failed to reschedule followup: %s #%s", repo, issue_number)
+
+
+# Due-item leases: each due key is handed to exactly one scheduler
+# replica, which acks it when done or releases it on failure.
+_claim_offset = 0
+
+
+async def _claim_due(index: str, leases: str, now: float, lease_seconds: float, limit: int) -> list[str]:
+    """
+    Atomically move up to `limit` due keys into the shards' `leases`
+    until now + lease_seconds. Expired leases (a replica died mid-item)
+    are re-queued first. Concurrent callers get disjoint batches.
+
+    Shards are visited in rotating order, so a busy shard cannot
+    starve the others.
+    """
+    global _claim_offset
+
+    claimed: list[str] = []
+    start = _claim_offset
+    _claim_offset = (_claim_offset + 1) % REDIS_KEY_SHARDS
+
+    for i in range(REDIS_KEY_SHARDS):
+        if len(claimed) >= limit:
+            break
+
+        shard = (start + i) % REDIS_KEY_SHARDS
+        try:
+            claimed += _safe_iter(await run_script(
+                "claim_due",
+                keys=[shard_key(shard, index), shard_key(shard, leases)],
+                args=[now, now + lease_seconds, limit - len(claimed)],
+            ))
+        except Exception:
+            logger.exception("Failed to claim due items: %s (shard %s)", index, shard)
+
+    return claimed
+
+
+async def _ack(leases: str, key: str):
+    r = get_async_redis()
+    try:
+        await r.zrem(shard_key(key_shard(key), leases), key)
+    except Exception:
+        logger.exception("Failed to ack lease: %s", key)
+
+
+async def _renew(leases: str, key: str, lease_seconds: float) -> bool:
+    """
+    Extend a held lease to now + lease_seconds. False if the lease
+    expired or is gone: the key may be claimed by another replica, so
+    the caller must stop working on it (and neither ack nor release).
+    """
+    now = time.time()
+    try:
+        return bool(await run_script(
+            "renew_lease",
+            keys=[shard_key(key_shard(key), leases)],
+            args=[key, now, now + lease_seconds],
+        ))
+    except Exception:
+        logger.exception("Failed to renew lease: %s", key)
+        return False
+
+
+async def _release(index: str, leases: str, key: str):
+    """
+    Hand a claimed key back, due now, without waiting for its lease to
+    expire. A newer schedule written meanwhile is kept (NX).
+    """
+    r = get_async_redis()
+    shard = key_shard(key)
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.zrem(shard_key(shard, leases), key)
+        pipe.zadd(shard_key(shard, index), {key: time.time()}, nx=True)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to release lease: %s", key)
+
+
+async def cancel_followup(repo: str, issue_number: int):
+    r = get_async_redis()
+    key = followup_key(repo, issue_number)
+
+    try:
+        stale = stale_key(repo, issue_number)
+        shard = shard_of(repo)
+
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key, stale)
+        pipe.zrem(shard_key(shard, FOLLOWUP_INDEX), key)
+        pipe.zrem(shard_key(shard, STALE_INDEX), stale)
+        pipe.zrem(shard_key(shard, FOLLOWUP_LEASES), key)
+        pipe.zrem(shard_key(shard, STALE_LEASES), stale)
+        pipe.srem(_repo_keys(repo), key, stale)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to cancel followup: %s #%s", repo, issue_number)
+
+
+async def claim_due_followups(now: float, lease_seconds: float, limit: int) -> list[str]:
+    return await _claim_due(FOLLOWUP_INDEX, FOLLOWUP_LEASES, now, lease_seconds, limit)
+
+
+async def ack_followup(key: str):
+    await _ack(FOLLOWUP_LEASES, key)
+
+
+async def release_followup(key: str):
+    await _release(FOLLOWUP_INDEX, FOLLOWUP_LEASES, key)
+
+
+async def renew_followup_lease(key: str, lease_seconds: float) -> bool:
+    return await _renew(FOLLOWUP_LEASES, key, lease_seconds)
+
+
+async def mark_followup_sent(key: str):
+    r = get_async_redis()
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.hset(key, "sent", 1)
+        pipe.zrem(shard_key(key_shard(key), FOLLOWUP_INDEX), key)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to mark followup sent: %s", key)
+
+
+async def get_followup_data(key: str):
+    r = get_async_redis()
+    try:
+        return await r.hgetall(key)
+    except Exception:
+        logger.exception("Failed to get followup data: %s", key)
+        return {}
+
+
+async def has_followup(repo: str, issue_number: int) -> bool:
+    r = get_async_redis()
+    try:
+        return await r.exists(followup_key(repo, issue_number))
+    except Exception:
+        logger.exception("Failed to check followup existence")
+        return False
+
+async def mark_followup_completed(repo: str, issue_number: int):
+    r = get_async_redis()
+    await _set_bucketed(r, repo, _flag_key(FOLLOWUP_COMPLETED, repo, issue_number), issue_number)
+
+
+async def is_followup_completed(repo: str, issue_number: int) -> bool:
+    r = get_async_redis()
+    return bool(await r.hexists(_flag_key(FOLLOWUP_COMPLETED, repo, issue_number), issue_number))
+
+
+async def clear_followup_completed(repo: str, issue_number: int):
+    r = get_async_redis()
+    await _delete_bucketed(r, _flag_key(FOLLOWUP_COMPLETED, repo, issue_number), issue_number)
+
+
+# Stale handling
+async def schedule_stale(repo: str, issue_number: int, lang: str, due_at: float):
+    key = stale_key(repo, issue_number)
+
+    try:
+        await _schedule(STALE_INDEX, repo, key, due_at, {
+            "repo": repo,
+            "issue_number": issue_number,
+            "lang": lang,
+            "due_at": due_at,
+        })
+    except Exception:
+        logger.exception("Failed to schedule stale: %s #%s", repo, issue_number)
+
+
+async def cancel_stale(repo: str, issue_number: int):
+    r = get_async_redis()
+    key = stale_key(repo, issue_number)
+
+    try:
+        shard = shard_of(repo)
+
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.zrem(shard_key(shard, STALE_INDEX), key)
+        pipe.zrem(shard_key(shard, STALE_LEASES), key)
+        pipe.srem(_repo_keys(repo), key)
+        await pipe.execute()
+    except Exception:
+        logger.exception("Failed to cancel stale: %s #%s", repo, issue_number)
+
+
+async def claim_due_stales(now: float, lease_seconds: float, limit: int) -> list[str]:
+    return await _claim_due(STALE_INDEX, STALE_LEASES, now, lease_seconds, limit)
+
+
+async def ack_stale(key: str):
+    await _ack(STALE_LEASES, key)
+
+
+async def release_stale(key: str):
+    await _release(STALE_INDEX, STALE_LEASES, key)
+
+
+async def renew_stale_lease(key: str, lease_seconds: float) -> bool:
+    return await _renew(STALE_LEASES, key, lease_seconds)
+
+
+async def get_stale_data(key: str):
+    r = get_async_redis()
+    try:
+        return await r.hgetall(key)
+    except Exception:
+        logger.exception("Failed to get stale data: %s", key)
+        return {}
+
+
+
+# Repo-wide cleanup / migration
+
+# Per-shard ZSETs that may reference a follow-up / stale key
+_DUE_ZSETS = (FOLLOWUP_INDEX, STALE_INDEX, FOLLOWUP_LEASES, STALE_LEASES)
+
+# Keys deleted per round trip by purges
+_PURGE_BATCH = 500
+
+
+async def _unlink_repo_keys(r, repo: str):
+    """
+    UNLINK a repo's indexed keys, _PURGE_BATCH per MULTI. A batch
+    leaves the index together with its keys, so an interrupted purge
+    is finished by running it again. The index disappears with its
+    last entry.
+    """
+    shard = shard_of(repo)
+    index = _repo_keys(repo)
+
+    while True:
+        keys = list(_safe_iter(await r.srandmember(index, _PURGE_BATCH)))
+        if not keys:
+            return
+
+        pipe = r.pipeline(transaction=True)
+        pipe.unlink(*keys)
+        for name in _DUE_ZSETS:
+            pipe.zrem(shard_key(shard, name), *keys)
+        pipe.srem(index, *keys)
+        await pipe.execute()
+
+
+async def purge_repo(repo: str):
+    """
+    Delete every indexed key of a repo. O(keys in the repo).
+    """
+    r = get_async_redis()
+    try:
+        await _unlink_repo_keys(r, repo)
+    except Exception:
+        logger.exception("Failed to purge repo: %s", repo)
+
+
+async def _unlink_scanned(r, pattern: str, keep: Iterable[str] = ()) -> int:
+    """
+    UNLINK every key matching pattern, one pipeline per _PURGE_BATCH
+    keys (one UNLINK per key, so a cluster pipeline can route them).
+    """
+    unlinked = 0
+    batch = []
+
+    async def flush():
+        pipe = r.pipeline(transaction=False)
+        for key in batch:
+            pipe.unlink(key)
+        await pipe.execute()
+
+    async for key in r.scan_iter(pattern, count=_PURGE_BATCH):
+        key = _as_str(key)
+        if key in keep:
+            continue
+
+        batch.append(key)
+        if len(batch) == _PURGE_BATCH:
+            await flush()
+            unlinked += len(batch)
+            batch.clear()
+
+    if batch:
+        await flush()
+        unlinked += len(batch)
+
+    return unlinked
+
+
+async def _repo_owners(r) -> dict[str, str]:
+    """
+    Every recorded repo -> installation id (one pipelined round trip).
+    """
+    pipe = r.pipeline(transaction=False)
+    for shard in range(REDIS_KEY_SHARDS):
+        pipe.hgetall(shard_key(shard, REPO_INSTALLATION))
+
+    owners = {}
+    for mapping in await pipe.execute():
+        owners.update(mapping)
+    return owners
+
+
+async def _run_installation_purge(r, installation_id: str):
+    """
+    Work through a purge job until its set is empty. A repo leaves the
+    job only after its keys are gone; one that has since moved to
+    another installation is left alone.
+    """
+    job = f"{INSTALLATION_PURGE_PREFIX}{installation_id}"
+    purged = 0
+
+    while True:
+        repo = _as_str(await r.srandmember(job))
+        if repo is None:
+            break
+
+        owner = await r.hget(shard_key(shard_of(repo), REPO_INSTALLATION), repo)
+        if owner is None or _as_str(owner) == installation_id:
+            await _unmark(r, repo)
+            await _unlink_repo_keys(r, repo)
+            purged += 1
+
+        await r.srem(job, repo)
+
+    return purged
+
+
+async def purge_installation(installation_id: int, repos: Iterable[str] = ()):
+    """
+    Delete one installation's state on uninstall; other installations
+    are untouched.
+
+    Its repos are those recorded under it in REPO_INSTALLATION, plus
+    `repos` (the webhook's list) where no installation is recorded.
+    They are saved as a purge job first, which resume_purges() (run by
+    the key sweeper) finishes if this process dies halfway. Its ETag cache entries are dropped
+    as well (they also expire on their own).
+    """
+    r = get_async_redis()
+    installation_id = str(installation_id)
+
+    try:
+        owners = {
+            _as_str(repo): _as_str(owner)
+            for repo, owner in (await _repo_owners(r)).items()
+        }
+        tenant = {repo for repo, owner in owners.items() if owner == installation_id}
+        tenant.update(repo for repo in repos if repo not in owners)
+
+        if tenant:
+            await r.sadd(f"{INSTALLATION_PURGE_PREFIX}{installation_id}", *tenant)
+
+        purged = await _run_installation_purge(r, installation_id)
+        etags = await _unlink_scanned(r, f"{ETAG_PREFIX}{installation_id}:*")
+
+        logger.info(
+            "Purged installation %s: %s repo(s), %s cached response(s)",
+            installation_id,
+            purged,
+            etags,
+        )
+    except Exception:
+        logger.exception("Failed to purge installation: %s", installation_id)
+
+
+async def resume_purges() -> int:
+    """
+    Finish installation purges left unfinished by a crash or restart.
+    """
+    r = get_async_redis()
+    purged = 0
+
+    try:
+        async for job in r.scan_iter(f"{INSTALLATION_PURGE_PREFIX}*"):
+            installation_id = _as_str(job)[len(INSTALLATION_PURGE_PREFIX):]
+            logger.info("Resuming purge of installation %s", installation_id)
+            purged += await _run_installation_purge(r, installation_id)
+    except Exception:
+        logger.exception("Failed to resume installation purges")
+
+    return purged
+
+
+async def migrate_repo(old_repo: str, new_repo: str):
+    """
+    Move a repo's state to its new name. O(keys in the repo).
+
+    The new name usually hashes to another shard (slot), so keys are
+    copied rather than RENAMEd: one read round trip for the index, one
+    for key contents, then one MULTI writing the new shard and one
+    deleting from the old. If the second MULTI fails both copies are
+    left; replaying the rename finishes the move.
+    """
+    if old_repo == new_repo:
+        return
+
+    r = get_async_redis()
+    old_shard = shard_of(old_repo)
+    new_shard = shard_of(new_repo)
+    old_index = _repo_keys(old_repo)
+    new_index = _repo_keys(new_repo)
+
+    try:
+        keys = list(_safe_iter(await r.smembers(old_index)))
+
+        read = r.pipeline(transaction=False)
+        for key in keys:
+            if key_family(key)[0] in _HASH_FAMILIES:
+                read.hgetall(key)
+            else:
+                read.get(key)
+            read.pttl(key)
+            for name in _DUE_ZSETS:
+                read.zscore(shard_key(old_shard, name), key)
+        read.hget(shard_key(old_shard, REPO_INSTALLATION), old_repo)
+        state = await read.execute()
+
+        installation_id = state.pop()
+
+        write = r.pipeline(transaction=True)
+        moved = []
+        width = 2 + len(_DUE_ZSETS)
+
+        for i, key in enumerate(keys):
+            value, ttl, *scores = state[width * i:width * (i + 1)]
+            if not value:
+                continue
+
+            new_key = renamed_key(key, old_repo, new_repo)
+            if new_key != key:
+                moved.append(key)
+
+            if isinstance(value, dict):
+                # Buckets merge into any the new name already has
+                if key_family(key)[0] in (FOLLOWUP, STALE):
+                    value["repo"] = new_repo
+                    write.delete(new_key)
+                write.hset(new_key, mapping=value)
+                if ttl > 0:
+                    write.pexpire(new_key, ttl)
+            else:
+                write.set(new_key, value, px=ttl if ttl > 0 else None)
+
+            for name, score in zip(_DUE_ZSETS, scores):
+                if score is not None:
+                    write.zadd(shard_key(new_shard, name), {new_key: score})
+
+            write.sadd(new_index, new_key)
+
+        write.sadd(shard_key(new_shard, INSTALLED_REPOS), new_repo)
+        if installation_id is not None:
+            write.hset(shard_key(new_shard, REPO_INSTALLATION), new_repo, installation_id)
+
+        await write.execute()
+
+        delete = r.pipeline(transaction=True)
+        if moved:
+            delete.unlink(*moved)
+            for name in _DUE_ZSETS:
+                delete.zrem(shard_key(old_shard, name), *moved)
+        delete.delete(old_index)
+        delete.srem(shard_key(old_shard, INSTALLED_REPOS), old_repo)
+        delete.hdel(shard_key(old_shard, REPO_INSTALLATION), old_repo)
+        await delete.execute()
+
+        installed_repos.apply(installed_repos.REMOVED, old_repo)
+        installed_repos.apply(installed_repos.ADDED, new_repo)
+        await installed_repos.publish_change(installed_repos.REMOVED, old_repo)
+        await installed_repos.publish_change(installed_repos.ADDED, new_repo)
+
+    except Exception:
+        logger.exception("Failed to migrate repo: %s -> %s", old_repo, new_repo)
+
+
+async def purge_all():
+    """
+    Delete every yaplate key (all installations) in UNLINK batches.
+    Re-running it after an interruption finishes the job. The schema
+    version and layout stay, so a running app keeps accepting the
+    database.
+    """
+    r = get_async_redis()
+    try:
+        unlinked = await _unlink_scanned(r, "yaplate:*", keep={KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_LAYOUT_KEY})
+        logger.info("Purged %s key(s)", unlinked)
+    except Exception:
+        logger.exception("Failed to purge all keys")
+
+
+async def mark_followup_stopped(repo: str, issue_number: int):
+    r = get_async_redis()
+    await _set_bucketed(r, repo, _flag_key(FOLLOWUP_STOPPED, repo, issue_number), issue_number)
+
+async def is_followup_stopped(repo: str, issue_number: int) -> bool:
+    r = get_async_redis()
+    return bool(await r.hexists(_flag_key(FOLLOWUP_STOPPED, repo, issue_number), issue_number))
+
+async def clear_followup_stopped(repo: str, issue_number: int):
+    r = get_async_redis()
+    await _delete_bucketed(r, _flag_key(FOLLOWUP_STOPPED, repo, issue_number), issue_number)
+
+
+async def close_store():
+    await close_async_redis()
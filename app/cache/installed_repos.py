@@ -0,0 +1,145 @@
+"""
+In-process mirror of the installed-repo sets (INSTALLED_REPOS, one
+per key shard).
+
+Membership checks read the local copy, so the hot path costs no round
+trip. Every change is published on INSTALLED_REPOS_CHANNEL and applied
+by each process's listener. Pub/sub is fire-and-forget, so the copy is
+also fully resynced every INSTALLED_REPOS_RESYNC_SECONDS and after
+every reconnect. Until the first sync (and while disconnected) the
+mirror reports itself unavailable and callers go to Redis instead.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from app import metrics
+from app.cache.keys import (
+    INSTALLED_REPOS,
+    INSTALLED_REPOS_CHANNEL,
+    REDIS_KEY_SHARDS,
+    shard_key,
+)
+from app.cache.redis_client import get_async_redis, get_async_pubsub_redis
+from app.logger import get_logger
+from app.settings import INSTALLED_REPOS_RESYNC_SECONDS
+
+
+logger = get_logger("yaplate.cache.installed_repos")
+
+ADDED = "+"
+REMOVED = "-"
+
+_repos: Optional[set[str]] = None
+_task: Optional[asyncio.Task] = None
+
+
+def contains(repo: str) -> Optional[bool]:
+    """
+    Local membership check; None when the mirror is not in sync.
+    """
+    return None if _repos is None else repo in _repos
+
+
+def snapshot() -> Optional[set[str]]:
+    return None if _repos is None else set(_repos)
+
+
+def apply(op: str, repo: str):
+    """
+    Apply one change locally. Also called by the writer, so its own
+    process sees the change without waiting for the broadcast.
+    """
+    if _repos is None:
+        return
+
+    if op == ADDED:
+        _repos.add(repo)
+    elif op == REMOVED:
+        _repos.discard(repo)
+
+    metrics.set_gauge("installed_repos_mirror_size", len(_repos))
+
+
+async def publish_change(op: str, repo: str):
+    await get_async_pubsub_redis().publish(INSTALLED_REPOS_CHANNEL, f"{op}{repo}")
+
+
+async def fetch_all(r) -> set[str]:
+    """
+    Union of every shard's installed set; one pipelined round trip
+    (per node on a cluster).
+    """
+    pipe = r.pipeline(transaction=False)
+    for shard in range(REDIS_KEY_SHARDS):
+        pipe.smembers(shard_key(shard, INSTALLED_REPOS))
+
+    return set().union(*await pipe.execute())
+
+
+async def _resync(r):
+    global _repos
+
+    _repos = await fetch_all(r)
+
+    metrics.inc("installed_repos_resync_total")
+    metrics.set_gauge("installed_repos_mirror_size", len(_repos))
+
+
+async def _listen():
+    global _repos
+
+    r = get_async_redis()
+
+    while True:
+        pubsub = get_async_pubsub_redis().pubsub(ignore_subscribe_messages=True)
+
+        try:
+            # Subscribe before loading, so no change falls in between
+            await pubsub.subscribe(INSTALLED_REPOS_CHANNEL)
+            await _resync(r)
+            next_resync = time.monotonic() + INSTALLED_REPOS_RESYNC_SECONDS
+
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    data = message["data"]
+                    apply(data[:1], data[1:])
+
+                if time.monotonic() >= next_resync:
+                    await _resync(r)
+                    next_resync = time.monotonic() + INSTALLED_REPOS_RESYNC_SECONDS
+
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Changes may be missed from here on: fall back to Redis
+            # until resubscribed and resynced.
+            _repos = None
+            logger.exception("Installed-repo mirror lost its subscription; retrying")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+async def start_installed_repos_sync():
+    global _task
+
+    if _task is None:
+        _task = asyncio.create_task(_listen())
+        logger.info("Installed-repo mirror started")
+
+
+async def stop_installed_repos_sync():
+    global _task, _repos
+
+    if _task is not None:
+        _task.cancel()
+        # Bounded, so a wedged connection never holds up shutdown
+        await asyncio.wait({_task}, timeout=5)
+        _task = None
+
+    _repos = None
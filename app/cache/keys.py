@@ -1,30 +1,247 @@
+import zlib
+from typing import Optional
+
+from app.settings import REDIS_KEY_SHARDS, REDIS_GREETING_BUCKETS
+
+
+# =========================================================
+# Key schema (version 3, Redis Cluster ready)
+# =========================================================
+# Every repo-scoped key carries its shard's hash tag "{s<n>}", with
+# n = crc32(repo) % REDIS_KEY_SHARDS. All keys of one repo, and the
+# due-time indexes / installed set of its shard, hash to the same
+# cluster slot, so multi-key scripts and MULTIs stay single-slot.
+#
+# REDIS_KEY_SHARDS decides which shard every repo lives in: changing it
+# needs a data migration, so it is recorded (with
+# REDIS_GREETING_BUCKETS) in KEY_SCHEMA_LAYOUT_KEY and checked at
+# startup. Older layouts (1: flat keys, 2: one string key per greeting
+# / flag) are converted by `python -m app.cache.migrations key-schema-v3`.
+KEY_SCHEMA_VERSION = 3
+KEY_SCHEMA_VERSION_KEY = "yaplate:schema_version"
+KEY_SCHEMA_LAYOUT_KEY = "yaplate:schema_layout"
+
+# Greeting and follow-up flag state is kept in small per-repo hashes
+# ("buckets") rather than one key per entry: a hash of up to
+# hash-max-listpack-entries (128 by default) fields is stored as one
+# compact listpack. Users spread over REDIS_GREETING_BUCKETS buckets
+# per repo by a hash of the login; issues fill FLAG_BUCKET_SIZE-wide
+# number ranges. Like REDIS_KEY_SHARDS, changing either moves entries.
+FLAG_BUCKET_SIZE = 128
+
+
+def key_layout() -> dict[str, str]:
+    """
+    Settings the key layout depends on, as recorded in
+    KEY_SCHEMA_LAYOUT_KEY.
+    """
+    return {
+        "REDIS_KEY_SHARDS": str(REDIS_KEY_SHARDS),
+        "REDIS_GREETING_BUCKETS": str(REDIS_GREETING_BUCKETS),
+    }
+
+
+def shard_of(repo: str) -> int:
+    return zlib.crc32(repo.encode()) % REDIS_KEY_SHARDS
+
+
+def shard_key(shard: int, name: str) -> str:
+    """
+    Key format:
+      yaplate:{s<shard>}:{name}
+    """
+    return f"yaplate:{{s{shard}}}:{name}"
+
+
+def repo_key(repo: str, family: str, *parts) -> str:
+    """
+    Key format:
+      yaplate:{s<shard of repo>}:{family}:{part}:...
+    """
+    return shard_key(shard_of(repo), ":".join((family, *map(str, parts))))
+
+
+def greeting_bucket(username: str) -> int:
+    return zlib.crc32(username.encode()) % REDIS_GREETING_BUCKETS
+
+
+def flag_bucket(issue_number: int) -> int:
+    return int(issue_number) // FLAG_BUCKET_SIZE
+
+
+def org_maintainers_key(org: str) -> str:
+    return f"{MAINTAINERS_PREFIX}{{{org}}}"
+
+
+def maintainers_key(repo: str) -> str:
+    return f"{org_maintainers_key(repo.split('/', 1)[0])}:{repo}"
+
+
+def key_shard(key: str) -> int:
+    """
+    Inverse of shard_key() for the shard.
+    """
+    tag = key.split(":", 2)[1]
+    return int(tag[2:-1])
+
+
+def key_family(key: str) -> tuple[str, str]:
+    """
+    Split a repo-scoped key into (family, rest).
+    """
+    family, _, rest = key.split(":", 2)[2].partition(":")
+    return family, rest
+
+
+def followup_key(repo: str, issue_number: int) -> str:
+    return repo_key(repo, FOLLOWUP, repo, issue_number)
+
+
+def stale_key(repo: str, issue_number: int) -> str:
+    return repo_key(repo, STALE, repo, issue_number)
+
+
+def split_issue_key(key: str) -> Optional[tuple[str, int]]:
+    """
+    (repo, issue_number) of a follow-up / stale key (inverse of
+    followup_key / stale_key); None otherwise.
+    """
+    try:
+        family, rest = key_family(key)
+    except (IndexError, ValueError):
+        return None
+
+    if family not in (FOLLOWUP, STALE):
+        return None
+
+    repo, _, number = rest.rpartition(":")
+    try:
+        return repo, int(number)
+    except ValueError:
+        return None
+
+
+def renamed_key(key: str, old_repo: str, new_repo: str) -> str:
+    """
+    The key's name under new_repo: in new_repo's shard, with the repo
+    name replaced for repo-named families.
+    """
+    family, rest = key_family(key)
+
+    if family in REPO_NAMED_FAMILIES and rest.startswith(f"{old_repo}:"):
+        rest = new_repo + rest[len(old_repo):]
+
+    return repo_key(new_repo, family, rest)
+
+
+# ---------------------------------------------------------
+# Repo-scoped families (repo_key)
+# ---------------------------------------------------------
+
 # Comment ↔ Bot reply mapping
-KEY_PREFIX = "yaplate:comment_map:"
+#   yaplate:{s<n>}:comment_map:{user_comment_id}
+COMMENT_MAP = "comment_map"
+
+# Greeting tracking (repo-id safe; hash: user -> greeted at)
+#   yaplate:{s<n>}:first_issue_greeted:{repo_id}:{greeting_bucket(user)}
+FIRST_ISSUE = "first_issue_greeted"
+FIRST_PR = "first_pr_greeted"
+
+# Follow-up / stale scheduling (hash per issue)
+#   yaplate:{s<n>}:followup:{owner}/{repo}:{issue_number}
+FOLLOWUP = "followup"
+STALE = "stale"
+
+# Terminal follow-up states (hash: issue number -> set at)
+#   yaplate:{s<n>}:followup_stopped:{owner}/{repo}:{flag_bucket(issue_number)}
+FOLLOWUP_STOPPED = "followup_stopped"
+FOLLOWUP_COMPLETED = "followup_completed"
 
-# Greeting tracking (repo-id safe)
-FIRST_ISSUE_PREFIX = "yaplate:first_issue_greeted:"
-FIRST_PR_PREFIX = "yaplate:first_pr_greeted:"
+# Families whose key embeds the repo name ("{family}:{repo}:{n}");
+# renamed when a repo is. Greeting keys use the repo id and keep
+# their name (but still move to the new repo's shard).
+REPO_NAMED_FAMILIES = (
+    FOLLOWUP,
+    STALE,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+)
 
-# Follow-up scheduling
-FOLLOWUP_PREFIX = "yaplate:followup:"
-FOLLOWUP_INDEX = "yaplate:followup:index"
+# Per-repo secondary index: the set of every repo-scoped key
+# (follow-up / stale hashes, stopped / completed flags, greeting
+# flags, comment mappings) so repo-wide operations never scan.
+#   yaplate:{s<n>}:repo_keys:{owner}/{repo}
+REPO_KEYS = "repo_keys"
 
-# Stale issue handling
-STALE_PREFIX = "yaplate:stale:"
-STALE_INDEX = "yaplate:stale:index"
 
+# ---------------------------------------------------------
+# Per-shard keys (shard_key)
+# ---------------------------------------------------------
 
-# Installation / repository lifecycle tracking (NEW)
+# Due-time indexes (ZSET: item key -> due_at)
+FOLLOWUP_INDEX = "followup_index"
+STALE_INDEX = "stale_index"
+
+# In-flight claims (ZSET: key -> lease expiry). Due entries move here
+# when a scheduler replica claims them and leave on ack; expired
+# leases go back to the due index.
+FOLLOWUP_LEASES = "followup_leases"
+STALE_LEASES = "stale_leases"
+
+# Installation / repository lifecycle tracking
 # These keys make Redis resilient to missed webhooks
 # and bot restarts while offline.
 
-# Tracks repos that are currently installed for this app
+# Repos of the shard that are currently installed for this app
+# (members: {owner}/{repo}). Mirrored in every process by
+# app.cache.installed_repos; changes are published on the channel.
+INSTALLED_REPOS = "installed_repos"
+INSTALLED_REPOS_CHANNEL = "yaplate:installed_repos:changes"
+
+# Which app installation each repo belongs to (hash: repo -> id).
+# Lets the scheduler act with the right installation token, and is
+# the tenant boundary: an uninstall purges exactly the repos recorded
+# under that installation (see purge_installation).
+REPO_INSTALLATION = "repo_installation"
+
+
+# ---------------------------------------------------------
+# Global keys (single-key operations only)
+# ---------------------------------------------------------
+
+# Conditional-request cache for GitHub GETs (ETag / Last-Modified)
+# Key format:
+#   yaplate:etag:{installation_id}:{endpoint}
+ETAG_PREFIX = "yaplate:etag:"
+
+# Cached repo maintainers (maintain + admin collaborators), hash-tagged
+# by owner. Each org keeps a set of its cached entries, so team /
+# membership changes invalidate them without scanning.
+# Key format (maintainers_key / org_maintainers_key):
+#   yaplate:maintainers:{<owner>}:<owner>/<repo>
+#   yaplate:maintainers:{<owner>}
+MAINTAINERS_PREFIX = "yaplate:maintainers:"
+
+# Durable webhook ingest (WEBHOOK_INGEST_MODE=stream)
+# Stream entries: event, delivery, payload (raw JSON body)
+# Both streams share the {events} tag (dead-lettering is one MULTI).
+EVENT_STREAM_KEY = "yaplate:{events}"
+EVENT_DEADLETTER_KEY = "yaplate:{events}:dead"
+
+# Seen webhook deliveries (X-GitHub-Delivery), TTL-bounded
 # Key format:
-#   yaplate:installed_repo:{owner}/{repo}
-INSTALLED_REPO_PREFIX = "yaplate:installed_repo:"
-
-# (Optional, future-proofing)
-# Track installation ids if you later want multi-install isolation
-# INSTALLATION_PREFIX = "yaplate:installation:"
-FOLLOWUP_STOPPED_PREFIX = "yaplate:followup_stopped:"
-FOLLOWUP_COMPLETED_PREFIX = "yaplate:followup_completed:"
+#   yaplate:delivery:{delivery_id}
+DELIVERY_PREFIX = "yaplate:delivery:"
+
+# Installation purge job (set of repos still to purge). Repos leave
+# it only once fully deleted, so an interrupted purge can be resumed.
+# Key format:
+#   yaplate:purge:installation:{installation_id}
+INSTALLATION_PURGE_PREFIX = "yaplate:purge:installation:"
+
+# Held by the replica running this interval's key sweep
+KEY_SWEEP_LOCK = "yaplate:sweeper:lock"
+
+# Hash of repo -> "<written_at>:<issue_number>" of the last stopped /
+# completed flag looked up on GitHub; the next sweep continues after it
+KEY_SWEEP_FLAG_CURSOR = "yaplate:sweeper:flag_cursor"
@@ -0,0 +1,528 @@
+"""
+One-off Redis data migrations.
+
+    python -m app.cache.migrations repo-key-index [--no-github]
+    python -m app.cache.migrations installed-repos-set
+    python -m app.cache.migrations key-schema-v2 [--no-github]
+    python -m app.cache.migrations key-schema-v3 [--no-github]
+
+key-schema-v2 converts the version 1 (flat) layout to the sharded
+layout, running the two steps above first. Run it with the app
+stopped, against the single instance, before moving the data to a
+cluster.
+
+key-schema-v3 moves version 2 greeting and follow-up flag keys into
+the bucket hashes of app.cache.keys (running key-schema-v2 first on
+version 1 data). Run it with the app stopped; it also works on a
+cluster.
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from app.cache.keys import (
+    KEY_SCHEMA_VERSION,
+    KEY_SCHEMA_VERSION_KEY,
+    KEY_SCHEMA_LAYOUT_KEY,
+    key_layout,
+    COMMENT_MAP,
+    FIRST_ISSUE,
+    FIRST_PR,
+    FOLLOWUP,
+    STALE,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+    FOLLOWUP_INDEX,
+    FOLLOWUP_LEASES,
+    STALE_INDEX,
+    STALE_LEASES,
+    INSTALLED_REPOS,
+    REPO_INSTALLATION,
+    REPO_KEYS,
+    EVENT_STREAM_KEY,
+    EVENT_DEADLETTER_KEY,
+    shard_of,
+    shard_key,
+    repo_key,
+    key_family,
+    greeting_bucket,
+    flag_bucket,
+)
+from app.cache.redis_client import get_redis, get_async_redis
+from app.cache.backends import RETENTION_SECONDS
+from app.cache.backends.redis import BUCKETED_FAMILIES
+from app.logger import get_logger
+
+
+logger = get_logger("yaplate.cache.migrations")
+
+_SCAN_COUNT = 1000
+
+
+# =========================================================
+# Version 1 (flat) key layout
+# =========================================================
+
+_V1_COMMENT_MAP = "yaplate:comment_map:"
+_V1_FIRST_ISSUE = "yaplate:first_issue_greeted:"
+_V1_FIRST_PR = "yaplate:first_pr_greeted:"
+_V1_FOLLOWUP = "yaplate:followup:"
+_V1_STALE = "yaplate:stale:"
+_V1_FOLLOWUP_STOPPED = "yaplate:followup_stopped:"
+_V1_FOLLOWUP_COMPLETED = "yaplate:followup_completed:"
+_V1_REPO_KEYS = "yaplate:repo_keys:"
+_V1_INSTALLED_REPO = "yaplate:installed_repo:"
+_V1_INSTALLED_REPOS = "yaplate:installed_repos"
+_V1_REPO_INSTALLATION = "yaplate:repo_installation"
+_V1_EVENT_STREAM = "yaplate:events"
+_V1_EVENT_DEADLETTER = "yaplate:events:dead"
+
+# Repo-scoped key prefix -> v2 family
+_V1_FAMILIES = {
+    _V1_COMMENT_MAP: COMMENT_MAP,
+    _V1_FIRST_ISSUE: FIRST_ISSUE,
+    _V1_FIRST_PR: FIRST_PR,
+    _V1_FOLLOWUP: FOLLOWUP,
+    _V1_STALE: STALE,
+    _V1_FOLLOWUP_STOPPED: FOLLOWUP_STOPPED,
+    _V1_FOLLOWUP_COMPLETED: FOLLOWUP_COMPLETED,
+}
+
+# Global ZSET -> per-shard ZSET
+_V1_DUE_ZSETS = {
+    "yaplate:followup:index": FOLLOWUP_INDEX,
+    "yaplate:followup:leases": FOLLOWUP_LEASES,
+    "yaplate:stale:index": STALE_INDEX,
+    "yaplate:stale:leases": STALE_LEASES,
+}
+
+# Name prefixes only version 1 keys have (the due ZSETs included)
+_V1_PREFIXES = (*_V1_FAMILIES, _V1_REPO_KEYS, _V1_INSTALLED_REPO)
+
+
+# =========================================================
+# repo-key-index (v1)
+# =========================================================
+
+def _index_repo_named(r) -> int:
+    """
+    Index "{prefix}{owner}/{repo}:{n}" keys under their repo.
+    """
+    indexed = 0
+
+    for prefix in (
+        _V1_FOLLOWUP,
+        _V1_STALE,
+        _V1_FOLLOWUP_STOPPED,
+        _V1_FOLLOWUP_COMPLETED,
+    ):
+        pipe = r.pipeline(transaction=False)
+
+        for key in r.scan_iter(f"{prefix}*", count=_SCAN_COUNT):
+            rest = key[len(prefix):]
+
+            # Skips the ZSET indexes ("yaplate:followup:index", ...)
+            if ":" not in rest:
+                continue
+
+            repo = rest.rsplit(":", 1)[0]
+            pipe.sadd(f"{_V1_REPO_KEYS}{repo}", key)
+            indexed += 1
+
+        pipe.execute()
+
+    return indexed
+
+
+def _index_greetings(r, repo_names: dict[int, str]) -> int:
+    """
+    Index "{prefix}{repo_id}:{user}" greeting keys. Needs the
+    repo id -> full name map; keys of unknown repos are left as is.
+    """
+    indexed = 0
+
+    for prefix in (_V1_FIRST_ISSUE, _V1_FIRST_PR):
+        pipe = r.pipeline(transaction=False)
+
+        for key in r.scan_iter(f"{prefix}*", count=_SCAN_COUNT):
+            repo_id = key[len(prefix):].split(":", 1)[0]
+
+            repo = repo_names.get(int(repo_id)) if repo_id.isdigit() else None
+            if repo is None:
+                continue
+
+            pipe.sadd(f"{_V1_REPO_KEYS}{repo}", key)
+            indexed += 1
+
+        pipe.execute()
+
+    return indexed
+
+
+async def _installed_repo_names() -> dict[int, str]:
+    from app.github.api import iter_installed_repos
+    from app.github.auth import installation_context, list_app_installations
+    from app.github.http_client import close_http_client
+
+    names: dict[int, str] = {}
+
+    try:
+        for installation in await list_app_installations():
+            with installation_context(installation["id"]):
+                async for repo in iter_installed_repos():
+                    names[repo["id"]] = repo["full_name"]
+    finally:
+        await close_http_client()
+
+    return names
+
+
+def build_repo_key_index(repo_names: Optional[dict[int, str]] = None) -> int:
+    """
+    Build yaplate:repo_keys:{repo} for data written before the index
+    existed. Idempotent; safe to run while the app is live.
+
+    Comment mappings carry no repo in their key and are not indexed
+    retroactively (new ones are).
+    """
+    r = get_redis()
+
+    indexed = _index_repo_named(r)
+    if repo_names:
+        indexed += _index_greetings(r, repo_names)
+
+    logger.info("Indexed %s existing repo-scoped key(s)", indexed)
+    return indexed
+
+
+# =========================================================
+# installed-repos-set (v1)
+# =========================================================
+
+def build_installed_repos_set() -> int:
+    """
+    Move legacy yaplate:installed_repo:{repo} markers into the
+    installed-repo set. Idempotent; run after deploying (startup
+    reconciliation also re-adds every installed repo).
+    """
+    r = get_redis()
+    moved = 0
+
+    pipe = r.pipeline(transaction=False)
+    for key in r.scan_iter(f"{_V1_INSTALLED_REPO}*", count=_SCAN_COUNT):
+        pipe.sadd(_V1_INSTALLED_REPOS, key[len(_V1_INSTALLED_REPO):])
+        pipe.delete(key)
+        moved += 1
+    pipe.execute()
+
+    logger.info("Moved %s installed-repo marker(s) into %s", moved, _V1_INSTALLED_REPOS)
+    return moved
+
+
+# =========================================================
+# key-schema-v2
+# =========================================================
+
+def _v2_key(key: str, repo: str) -> Optional[str]:
+    for prefix, family in _V1_FAMILIES.items():
+        if key.startswith(prefix):
+            return repo_key(repo, family, key[len(prefix):])
+    return None
+
+
+def _move_repo(r, v1_index: str, due_scores: dict[str, dict]) -> int:
+    """
+    Rename every indexed key of one repo into its shard and rebuild
+    its index and due entries there.
+    """
+    repo = v1_index[len(_V1_REPO_KEYS):]
+    shard = shard_of(repo)
+    new_index = repo_key(repo, REPO_KEYS, repo)
+
+    keys = sorted(r.smembers(v1_index))
+
+    check = r.pipeline(transaction=False)
+    for key in keys:
+        check.exists(key)
+    exists = check.execute()
+
+    pipe = r.pipeline(transaction=False)
+    moved = 0
+
+    for key, present in zip(keys, exists):
+        new_key = _v2_key(key, repo)
+        if not present or new_key is None:
+            continue
+
+        pipe.rename(key, new_key)
+        pipe.sadd(new_index, new_key)
+
+        for v1_zset, name in _V1_DUE_ZSETS.items():
+            score = due_scores[v1_zset].get(key)
+            if score is not None:
+                pipe.zadd(shard_key(shard, name), {new_key: score})
+
+        moved += 1
+
+    pipe.delete(v1_index)
+    pipe.execute()
+
+    return moved
+
+
+def build_key_schema_v2(repo_names: Optional[dict[int, str]] = None) -> int:
+    """
+    Convert version 1 keys to the v2 layout in place. Idempotent:
+    a database already at v2 (or later) is left alone.
+
+    Keys that cannot be attributed to a repo (comment mappings from
+    before the repo index, greetings of repos GitHub no longer lists)
+    are left under their old names, where nothing reads them.
+    """
+    r = get_redis()
+
+    version = r.get(KEY_SCHEMA_VERSION_KEY)
+    if version is not None:
+        logger.info("Key schema already at version %s", version)
+        return 0
+
+    build_repo_key_index(repo_names)
+    build_installed_repos_set()
+
+    due_scores = {
+        v1_zset: dict(r.zrange(v1_zset, 0, -1, withscores=True))
+        for v1_zset in _V1_DUE_ZSETS
+    }
+
+    moved = 0
+    for v1_index in list(r.scan_iter(f"{_V1_REPO_KEYS}*", count=_SCAN_COUNT)):
+        moved += _move_repo(r, v1_index, due_scores)
+
+    pipe = r.pipeline(transaction=False)
+    for repo in r.smembers(_V1_INSTALLED_REPOS):
+        pipe.sadd(shard_key(shard_of(repo), INSTALLED_REPOS), repo)
+    for repo, installation_id in r.hgetall(_V1_REPO_INSTALLATION).items():
+        pipe.hset(shard_key(shard_of(repo), REPO_INSTALLATION), repo, installation_id)
+    pipe.delete(_V1_INSTALLED_REPOS, _V1_REPO_INSTALLATION, *_V1_DUE_ZSETS)
+    pipe.execute()
+
+    # Streams keep their consumer group across RENAME
+    for old, new in ((_V1_EVENT_STREAM, EVENT_STREAM_KEY), (_V1_EVENT_DEADLETTER, EVENT_DEADLETTER_KEY)):
+        if r.exists(old):
+            r.rename(old, new)
+
+    r.set(KEY_SCHEMA_VERSION_KEY, 2)
+    r.hset(KEY_SCHEMA_LAYOUT_KEY, mapping=key_layout())
+
+    left = sum(
+        1
+        for prefix in _V1_FAMILIES
+        for _ in r.scan_iter(f"{prefix}*", count=_SCAN_COUNT)
+    )
+
+    logger.info(
+        "Moved %s key(s) to schema version 2; %s unattributed legacy key(s) left",
+        moved,
+        left,
+    )
+    return moved
+
+
+# =========================================================
+# key-schema-v3
+# =========================================================
+
+def _v3_entry(key: str, repo: str) -> Optional[tuple[str, str]]:
+    """
+    (bucket, field) for a version 2 greeting / flag key; None for
+    anything else (including buckets already).
+    """
+    family, rest = key_family(key)
+
+    if family in (FIRST_ISSUE, FIRST_PR):
+        repo_id, _, username = rest.partition(":")
+        return repo_key(repo, family, repo_id, greeting_bucket(username)), username
+
+    if family in (FOLLOWUP_STOPPED, FOLLOWUP_COMPLETED):
+        number = rest.rpartition(":")[2]
+        return repo_key(repo, family, repo, flag_bucket(number)), number
+
+    return None
+
+
+def _bucket_repo(r, index: str) -> int:
+    """
+    Fold one repo's version 2 string keys into its buckets, keeping
+    each entry's remaining retention.
+    """
+    repo = key_family(index)[1]
+    now = time.time()
+
+    keys = [key for key in r.smembers(index) if key_family(key)[0] in BUCKETED_FAMILIES]
+
+    check = r.pipeline(transaction=False)
+    for key in keys:
+        check.type(key)
+        check.ttl(key)
+    state = check.execute()
+
+    pipe = r.pipeline(transaction=False)
+    buckets = set()
+    moved = 0
+
+    for i, key in enumerate(keys):
+        kind, ttl = state[2 * i], state[2 * i + 1]
+        entry = _v3_entry(key, repo)
+        if kind != "string" or entry is None:
+            continue
+
+        bucket, field = entry
+        retention = RETENTION_SECONDS.get(key_family(key)[0])
+        written_at = now - retention + ttl if retention and ttl > 0 else now
+
+        pipe.hset(bucket, field, int(written_at))
+        pipe.sadd(index, bucket)
+        pipe.srem(index, key)
+        pipe.unlink(key)
+        buckets.add(bucket)
+        moved += 1
+
+    for bucket in buckets:
+        retention = RETENTION_SECONDS.get(key_family(bucket)[0])
+        if retention:
+            pipe.expire(bucket, retention)
+
+    pipe.execute()
+    return moved
+
+
+def build_key_schema_v3(repo_names: Optional[dict[int, str]] = None) -> int:
+    """
+    Convert version 2 greeting / flag keys to bucket hashes in place.
+    Idempotent: a database already at v3 is left alone.
+    """
+    r = get_redis()
+
+    build_key_schema_v2(repo_names)
+
+    if r.get(KEY_SCHEMA_VERSION_KEY) == str(KEY_SCHEMA_VERSION):
+        logger.info("Key schema already at version %s", KEY_SCHEMA_VERSION)
+        return 0
+
+    moved = 0
+    for index in list(r.scan_iter(f"yaplate:{{s*}}:{REPO_KEYS}:*", count=_SCAN_COUNT)):
+        moved += _bucket_repo(r, index)
+
+    r.set(KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_VERSION)
+    r.hset(KEY_SCHEMA_LAYOUT_KEY, mapping=key_layout())
+
+    logger.info(
+        "Moved %s greeting / flag key(s) into buckets (schema version %s)",
+        moved,
+        KEY_SCHEMA_VERSION,
+    )
+    return moved
+
+
+async def _has_v1_keys(r) -> bool:
+    pipe = r.pipeline(transaction=False)
+    for key in (_V1_INSTALLED_REPOS, _V1_REPO_INSTALLATION, _V1_EVENT_STREAM, *_V1_DUE_ZSETS):
+        pipe.exists(key)
+
+    if any(await pipe.execute()):
+        return True
+
+    # A baseline database may hold nothing but per-repo keys (installed
+    # markers, greetings, flags). Only runs while unstamped, and stops
+    # at the first version 1 key.
+    async for key in r.scan_iter("yaplate:*", count=_SCAN_COUNT):
+        if key.startswith(_V1_PREFIXES):
+            return True
+
+    return False
+
+
+async def _check_key_layout(r):
+    """
+    Refuse to run with REDIS_KEY_SHARDS / REDIS_GREETING_BUCKETS other
+    than the ones the data was written with (entries would be looked up
+    in the wrong shard / bucket). A database stamped before the layout
+    was recorded gets the current values.
+    """
+    recorded = await r.hgetall(KEY_SCHEMA_LAYOUT_KEY)
+    current = key_layout()
+
+    for name, value in current.items():
+        if name in recorded and recorded[name] != value:
+            raise RuntimeError(
+                f"Redis data was written with {name}={recorded[name]}, "
+                f"but {name}={value} is configured; changing it needs a data migration"
+            )
+
+    if recorded.keys() != current.keys():
+        await r.hset(KEY_SCHEMA_LAYOUT_KEY, mapping=current)
+
+
+async def check_key_schema():
+    """
+    Startup guard: refuse to run on older layouts (their data would be
+    silently ignored) or with other shard / bucket counts than the data
+    was written with; stamp a database without yaplate data from an
+    older layout with the current version and layout.
+    """
+    r = get_async_redis()
+
+    version = await r.get(KEY_SCHEMA_VERSION_KEY)
+    if version is not None:
+        if int(version) < KEY_SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Redis key schema is version {version}, expected {KEY_SCHEMA_VERSION}. "
+                "Stop the app and run `python -m app.cache.migrations key-schema-v3` first."
+            )
+        if int(version) != KEY_SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Redis key schema is version {version}, expected {KEY_SCHEMA_VERSION}"
+            )
+        await _check_key_layout(r)
+        return
+
+    if await _has_v1_keys(r):
+        raise RuntimeError(
+            "Redis holds version 1 keys. Stop the app and run "
+            "`python -m app.cache.migrations key-schema-v3` first."
+        )
+
+    await r.set(KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_VERSION)
+    await r.hset(KEY_SCHEMA_LAYOUT_KEY, mapping=key_layout())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="yaplate Redis migrations")
+    parser.add_argument(
+        "migration",
+        choices=["repo-key-index", "installed-repos-set", "key-schema-v2", "key-schema-v3"],
+    )
+    parser.add_argument(
+        "--no-github",
+        action="store_true",
+        help="skip resolving repo ids via GitHub (greeting keys stay unindexed)",
+    )
+    args = parser.parse_args()
+
+    if args.migration == "installed-repos-set":
+        build_installed_repos_set()
+        return
+
+    repo_names = None if args.no_github else asyncio.run(_installed_repo_names())
+
+    if args.migration == "repo-key-index":
+        build_repo_key_index(repo_names)
+    elif args.migration == "key-schema-v2":
+        build_key_schema_v2(repo_names)
+    elif args.migration == "key-schema-v3":
+        build_key_schema_v3(repo_names)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from typing import Optional, Union
 
 from app.logger import get_logger
 
@@ -9,20 +11,40 @@ logger = get_logger("yaplate.redis")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
-_redis: Optional[redis.Redis] = None
+# Connect to a Redis Cluster (REDIS_URL is any node of it).
+# Needs the current (cluster-ready) key schema, see app.cache.keys.
+REDIS_CLUSTER = os.getenv("REDIS_CLUSTER", "false").lower() == "true"
 
+# Async pool (used by app.cache.store and the workers)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT_SECONDS = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "5"))
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "5"))
+REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS", "5")
+)
+REDIS_HEALTH_CHECK_INTERVAL_SECONDS = int(
+    os.getenv("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", "30")
+)
 
-def get_redis() -> redis.Redis:
+_redis: Optional[Union[redis.Redis, redis.RedisCluster]] = None
+_async_redis: Optional[Union[aioredis.Redis, AsyncRedisCluster]] = None
+_async_pubsub_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> Union[redis.Redis, redis.RedisCluster]:
     """
     Return a singleton Redis client.
 
     Lazily initialized and reused across the app.
+    Synchronous: only for CLI tools (migrations, scripts). Code running
+    on the event loop must use get_async_redis().
     """
     global _redis
 
     if _redis is None:
         try:
-            _redis = redis.Redis.from_url(
+            client_cls = redis.RedisCluster if REDIS_CLUSTER else redis.Redis
+            _redis = client_cls.from_url(
                 REDIS_URL,
                 decode_responses=True,
             )
@@ -31,3 +53,87 @@ def get_redis() -> redis.Redis:
             raise exc
 
     return _redis
+
+
+def get_async_redis() -> Union[aioredis.Redis, AsyncRedisCluster]:
+    """
+    Return the singleton asyncio Redis client.
+
+    Backed by a bounded, blocking connection pool: when all
+    REDIS_MAX_CONNECTIONS are busy, callers wait (up to
+    REDIS_POOL_TIMEOUT_SECONDS) instead of opening more.
+    With REDIS_CLUSTER, a cluster client with up to
+    REDIS_MAX_CONNECTIONS per node.
+    """
+    global _async_redis
+
+    if _async_redis is None and REDIS_CLUSTER:
+        try:
+            _async_redis = AsyncRedisCluster.from_url(
+                REDIS_URL,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+            )
+        except redis.RedisError as exc:
+            logger.exception("Failed to create async Redis Cluster client")
+            raise exc
+
+    if _async_redis is None:
+        try:
+            pool = aioredis.BlockingConnectionPool.from_url(
+                REDIS_URL,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT_SECONDS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+            )
+            _async_redis = aioredis.Redis(connection_pool=pool)
+        except redis.RedisError as exc:
+            logger.exception("Failed to create async Redis client")
+            raise exc
+
+    return _async_redis
+
+
+def get_async_pubsub_redis() -> aioredis.Redis:
+    """
+    Client for PUBLISH / SUBSCRIBE.
+
+    The shared client, except on a cluster: the asyncio cluster client
+    has no pub/sub, and classic pub/sub reaches every node anyway, so
+    a plain connection to the REDIS_URL node is used.
+    """
+    global _async_pubsub_redis
+
+    if not REDIS_CLUSTER:
+        return get_async_redis()
+
+    if _async_pubsub_redis is None:
+        _async_pubsub_redis = aioredis.Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+        )
+
+    return _async_pubsub_redis
+
+
+async def close_async_redis():
+    """
+    Close the asyncio clients and their pools. Called on shutdown.
+    """
+    global _async_redis, _async_pubsub_redis
+
+    if _async_pubsub_redis is not None:
+        await _async_pubsub_redis.aclose()
+        _async_pubsub_redis = None
+
+    if _async_redis is not None:
+        await _async_redis.aclose()
+        _async_redis = None
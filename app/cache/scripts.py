@@ -0,0 +1,100 @@
+"""
+Server-side Lua scripts for multi-key store operations that must be
+atomic and take a single round trip.
+
+Scripts are loaded once (EVALSHA, with redis-py falling back to EVAL
+on NOSCRIPT). Every key a script touches is passed in KEYS, and all
+of them share one shard hash tag, so scripts also run on Redis Cluster.
+"""
+from redis.commands.core import AsyncScript
+
+from app.cache.redis_client import get_async_redis
+
+
+# KEYS: INSTALLED_REPOS, item hash, due ZSET, repo key index
+# ARGV: repo, due_at, field, value, field, value, ...
+# Returns 1 if scheduled, 0 if the repo is not installed.
+SCHEDULE = """
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], unpack(ARGV, 3))
+redis.call('ZADD', KEYS[3], ARGV[2], KEYS[2])
+redis.call('SADD', KEYS[4], KEYS[2])
+return 1
+"""
+
+# KEYS: INSTALLED_REPOS, follow-up hash, FOLLOWUP_INDEX,
+#       stale hash, STALE_INDEX, repo key index,
+#       FOLLOWUP_LEASES, STALE_LEASES
+# ARGV: next_due_at, repo
+# Returns the new attempt number, or 0 if the follow-up was gone or
+# the repo uninstalled (in which case it is cancelled, as before).
+RESCHEDULE_FOLLOWUP = """
+if redis.call('EXISTS', KEYS[2]) == 0 or redis.call('SISMEMBER', KEYS[1], ARGV[2]) == 0 then
+    redis.call('DEL', KEYS[2], KEYS[4])
+    redis.call('ZREM', KEYS[3], KEYS[2])
+    redis.call('ZREM', KEYS[5], KEYS[4])
+    redis.call('ZREM', KEYS[7], KEYS[2])
+    redis.call('ZREM', KEYS[8], KEYS[4])
+    redis.call('SREM', KEYS[6], KEYS[2], KEYS[4])
+    return 0
+end
+local attempt = tonumber(redis.call('HGET', KEYS[2], 'attempt') or '1') + 1
+redis.call('HSET', KEYS[2], 'due_at', ARGV[1], 'sent', 0, 'attempt', attempt)
+redis.call('ZADD', KEYS[3], ARGV[1], KEYS[2])
+return attempt
+"""
+
+# KEYS: due ZSET, lease ZSET
+# ARGV: now, lease_until, limit
+# Re-queues expired leases (unless the item was rescheduled since),
+# then moves up to `limit` due members into the lease ZSET, scored by
+# lease expiry. Returns the claimed members.
+CLAIM_DUE = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZADD', KEYS[1], 'NX', ARGV[1], member)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[2], member)
+end
+return due
+"""
+
+# KEYS: lease ZSET
+# ARGV: member, now, lease_until
+# Extends a lease that has not expired yet. Returns 1 if renewed, 0 if
+# the lease is gone or already expired (it may be re-queued and
+# claimed by another replica any moment).
+RENEW_LEASE = """
+local lease = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not lease or tonumber(lease) <= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+return 1
+"""
+
+_SOURCES = {
+    "schedule": SCHEDULE,
+    "reschedule_followup": RESCHEDULE_FOLLOWUP,
+    "claim_due": CLAIM_DUE,
+    "renew_lease": RENEW_LEASE,
+}
+
+_scripts: dict[str, AsyncScript] = {}
+
+
+async def run_script(name: str, keys: list, args: list):
+    r = get_async_redis()
+
+    script = _scripts.get(name)
+    if script is None:
+        script = r.register_script(_SOURCES[name])
+        _scripts[name] = script
+
+    return await script(keys=keys, args=args, client=r)
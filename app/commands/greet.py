@@ -31,10 +31,10 @@ async def greet_if_first_issue(
     body: str,
 ):
     # Hard guard: repo must still be installed
-    if not is_repo_installed(repo_full_name):
+    if not await is_repo_installed(repo_full_name):
         return
 
-    if has_been_greeted(repo_id, username):
+    if await has_been_greeted(repo_id, username, repo=repo_full_name):
         return
 
     try:
@@ -48,10 +48,10 @@ async def greet_if_first_issue(
         )
     except RepoUnavailable:
         logger.warning("Repo unavailable during issue greeting: %s", repo_full_name)
-        unmark_repo_installed(repo_full_name)
+        await unmark_repo_installed(repo_full_name)
         return
 
-    mark_greeted(repo_id, username)
+    await mark_greeted(repo_id, username, repo=repo_full_name)
 
 
 async def greet_if_first_pr(
@@ -63,10 +63,10 @@ async def greet_if_first_pr(
     body: str,
 ):
     # Hard guard: repo must still be installed
-    if not is_repo_installed(repo_full_name):
+    if not await is_repo_installed(repo_full_name):
         return
 
-    if has_been_greeted_pr(repo_id, username):
+    if await has_been_greeted_pr(repo_id, username, repo=repo_full_name):
         return
 
     try:
@@ -80,10 +80,10 @@ async def greet_if_first_pr(
         )
     except RepoUnavailable:
         logger.warning("Repo unavailable during PR greeting: %s", repo_full_name)
-        unmark_repo_installed(repo_full_name)
+        await unmark_repo_installed(repo_full_name)
         return
 
-    mark_greeted_pr(repo_id, username)
+    await mark_greeted_pr(repo_id, username, repo=repo_full_name)
 
 
 # Internal helpers
@@ -1,5 +1,5 @@
-from app.github.api import get_issue_comments
-from app.nlp.context_builder import build_thread_context, chunk_thread_context
+from app.github.api import iter_issue_comments
+from app.nlp.context_builder import build_thread_context
 from app.nlp.formatter import format_thread_summary
 from app.nlp.lingo_client import translate
 from app.nlp.gemini_client import gemini_generate
@@ -28,53 +28,65 @@ Summaries:
     return await safe_llm_call(gemini_generate, prompt)
 
 
+def _quote(trigger_text: str) -> str:
+    return "\n".join(
+        f"> {line}" for line in trigger_text.splitlines()
+    )
+
+
+def _fallback_reply(trigger_text: str, target_lang: str) -> str:
+    formatted = format_thread_summary(FALLBACK_MESSAGE, target_lang)
+    return f"{_quote(trigger_text)}\n\n{formatted}"
+
+
 async def summarize_thread(
     repo: str,
     issue_number: int,
     target_lang: str,
     trigger_text: str,
+    chunk_size: int = 15,
 ):
     trigger_text = trigger_text or ""
 
-    comments = await get_issue_comments(repo, issue_number)
-    context = build_thread_context(comments)
+    # Comments are streamed page by page; each chunk is summarized as
+    # soon as it is full, while later pages are still being fetched.
+    chunk = []
+    chunk_summaries = []
 
-    if not context:
-        return "No discussion found to summarize."
+    async for comment in iter_issue_comments(repo, issue_number):
+        chunk.extend(build_thread_context([comment]))
 
-    chunks = chunk_thread_context(context, chunk_size=15)
+        if len(chunk) < chunk_size:
+            continue
 
-    chunk_summaries = []
-    for chunk in chunks:
         s = await summarize_chunk(chunk)
         if s == FALLBACK_MESSAGE:
-            formatted = format_thread_summary(FALLBACK_MESSAGE, target_lang)
-            quoted_trigger = "\n".join(
-                f"> {line}" for line in trigger_text.splitlines()
-            )
-            return f"{quoted_trigger}\n\n{formatted}"
+            return _fallback_reply(trigger_text, target_lang)
 
         chunk_summaries.append(s)
+        chunk = []
+
+    if chunk:
+        s = await summarize_chunk(chunk)
+        if s == FALLBACK_MESSAGE:
+            return _fallback_reply(trigger_text, target_lang)
+
+        chunk_summaries.append(s)
+
+    if not chunk_summaries:
+        return "No discussion found to summarize."
 
     final_summary_en = await merge_summaries(chunk_summaries)
     if final_summary_en == FALLBACK_MESSAGE:
-        formatted = format_thread_summary(FALLBACK_MESSAGE, target_lang)
-        quoted_trigger = "\n".join(
-            f"> {line}" for line in trigger_text.splitlines()
-        )
-        return f"{quoted_trigger}\n\n{formatted}"
+        return _fallback_reply(trigger_text, target_lang)
 
     if target_lang != "en":
         final_summary = await translate(final_summary_en, target_lang)
     else:
         final_summary = final_summary_en
 
-    quoted_trigger = "\n".join(
-        f"> {line}" for line in trigger_text.splitlines()
-    )
-
     formatted_summary = format_thread_summary(final_summary, target_lang)
 
-    return f"""{quoted_trigger}
+    return f"""{_quote(trigger_text)}
 
 {formatted_summary}"""
@@ -1,12 +1,38 @@
-import httpx
-from typing import Any, Optional
+import asyncio
+import re
+from collections import deque
+from typing import Any, AsyncIterator, Iterable, Optional
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
-from app.github.auth import get_installation_token
+import httpx
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app import metrics
+from app.cache.store import get_cached_maintainers, set_cached_maintainers
+from app.github import etag_cache, rate_limit
+from app.github.auth import current_installation_id, get_installation_token
+from app.github.circuit_breaker import CircuitOpen, github_breaker
+from app.github.http_client import GITHUB_API, get_http_client
+from app.github.rate_limit import RateLimited
 from app.logger import get_logger
+from app.utils.singleflight import SingleFlight
+from app.settings import (
+    GITHUB_GRAPHQL_BATCH_SIZE,
+    GITHUB_PAGE_SIZE,
+    GITHUB_PAGINATION_CONCURRENCY,
+    GITHUB_RETRY_ATTEMPTS,
+    GITHUB_RETRY_BACKOFF_SECONDS,
+    GITHUB_RETRY_MAX_BACKOFF_SECONDS,
+    MAINTAINERS_CACHE_TTL_SECONDS,
+)
 
 
-GITHUB_API = "https://api.github.com"
-
 logger = get_logger("yaplate.github.api")
 
 
@@ -17,36 +43,163 @@ class RepoUnavailable(Exception):
     pass
 
 
-async def _headers() -> dict[str, str]:
-    token = await get_installation_token()
+async def _headers(installation_id: Optional[int] = None) -> dict[str, str]:
+    token = await get_installation_token(installation_id)
     return {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github+json",
     }
 
 
-async def _request(
+_LINK_RE = re.compile(r'<([^>]+)>\s*;\s*rel="([^"]+)"')
+
+
+def _parse_links(value: Optional[str]) -> dict[str, str]:
+    """
+    Parse a GitHub `Link` header into {rel: endpoint}.
+    """
+    links: dict[str, str] = {}
+    if not value:
+        return links
+
+    for url, rel in _LINK_RE.findall(value):
+        if url.startswith(GITHUB_API):
+            url = url[len(GITHUB_API):]
+        links[rel] = url
+
+    return links
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return (response.json() or {}).get("message", "")
+    except (ValueError, AttributeError):
+        return ""
+
+
+# Only these are retried; POST/PATCH may have taken effect already
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+_RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in _RETRY_STATUSES
+    return False
+
+
+def _log_retry(method: str, endpoint: str):
+    def before_sleep(retry_state: RetryCallState):
+        metrics.inc("github_retries_total", method=method)
+        logger.warning(
+            "Retrying GitHub %s %s (attempt %s failed: %r)",
+            method,
+            endpoint,
+            retry_state.attempt_number,
+            retry_state.outcome.exception() if retry_state.outcome else None,
+        )
+
+    return before_sleep
+
+
+async def _send(
     method: str,
     endpoint: str,
     json: Optional[dict] = None,
-) -> Any:
-    headers = await _headers()
+    idempotent: Optional[bool] = None,
+    installation_id: Optional[int] = None,
+) -> tuple[Any, dict[str, str]]:
+    """
+    Perform a GitHub API call.
+    Returns the decoded body and the parsed pagination links.
+
+    Runs as `installation_id`, else the current installation context
+    (see app.github.auth.installation_context), else the default one.
+
+    Idempotent methods are retried on 5xx / transport errors with
+    jittered exponential backoff. All calls go through the circuit
+    breaker and fail fast with CircuitOpen while GitHub is degraded.
+    """
+    if idempotent is None:
+        idempotent = method in _IDEMPOTENT_METHODS
+
+    if installation_id is None:
+        installation_id = current_installation_id()
+
+    attempts = GITHUB_RETRY_ATTEMPTS if idempotent else 1
+
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(attempts),
+        wait=wait_random_exponential(
+            multiplier=GITHUB_RETRY_BACKOFF_SECONDS,
+            max=GITHUB_RETRY_MAX_BACKOFF_SECONDS,
+        ),
+        retry=retry_if_exception(_is_transient),
+        before_sleep=_log_retry(method, endpoint),
+        reraise=True,
+    )
+
+    async for attempt in retrying:
+        with attempt:
+            return await _send_once(method, endpoint, json, installation_id)
+
+
+async def _send_once(
+    method: str,
+    endpoint: str,
+    json: Optional[dict],
+    installation_id: Optional[int],
+) -> tuple[Any, dict[str, str]]:
+    headers = await _headers(installation_id)
     url = f"{GITHUB_API}{endpoint}"
 
-    async with httpx.AsyncClient(follow_redirects=True) as client:
+    # Conditional GET: 304s are served from cache and do not count
+    # against the installation's rate limit. Entries are per
+    # installation since list endpoints differ between them.
+    cache_key = f"{installation_id or 'default'}:{endpoint}"
+    cached = await etag_cache.lookup(cache_key) if method == "GET" else None
+    headers.update(etag_cache.conditional_headers(cached))
+
+    resource = rate_limit.resource_for(endpoint)
+    await rate_limit.acquire(installation_id, resource)
+    github_breaker.before_call()
+
+    client = get_http_client()
+    try:
         response = await client.request(
             method,
             url,
             headers=headers,
             json=json,
         )
+    except httpx.TransportError:
+        github_breaker.record_failure()
+        raise
 
+    rate_limit.record(installation_id, resource, response.headers)
     status = response.status_code
 
+    if status >= 500:
+        github_breaker.record_failure()
+    else:
+        github_breaker.record_success()
+
+    if status == 304 and cached is not None:
+        return cached["body"], cached.get("links") or {}
+
     if status in (404, 410):
         logger.warning("Repo unavailable (%s): %s", status, endpoint)
         raise RepoUnavailable(f"Repository or resource not found: {endpoint}")
 
+    # Primary / secondary rate limits are NOT access loss
+    if status in (403, 429) and rate_limit.is_rate_limit_response(
+        status, response.headers, _error_message(response)
+    ):
+        retry_at = rate_limit.block(installation_id, resource, response.headers)
+        raise RateLimited(f"GitHub rate limit hit: {endpoint}", retry_at=retry_at)
+
     if status in (401, 403):
         logger.warning("Access denied (%s): %s", status, endpoint)
         raise RepoUnavailable(f"Access denied or app uninstalled: {endpoint}")
@@ -54,43 +207,292 @@ async def _request(
     try:
         response.raise_for_status()
     except httpx.HTTPStatusError:
-        logger.exception("GitHub API error %s for %s", status, endpoint)
+        if status in _RETRY_STATUSES:
+            logger.warning("GitHub API error %s for %s", status, endpoint)
+        else:
+            logger.exception("GitHub API error %s for %s", status, endpoint)
         raise
 
     if status == 204:
-        return None
+        return None, {}
 
     try:
-        return response.json()
+        data = response.json()
     except ValueError:
         logger.exception("Failed to decode JSON response from %s", endpoint)
         raise
 
+    links = _parse_links(response.headers.get("link"))
+
+    if method == "GET" and status == 200:
+        await etag_cache.store(cache_key, response.headers, data, links)
+
+    return data, links
+
+
+async def _request(
+    method: str,
+    endpoint: str,
+    json: Optional[dict] = None,
+    idempotent: Optional[bool] = None,
+    installation_id: Optional[int] = None,
+) -> Any:
+    data, _ = await _send(method, endpoint, json, idempotent, installation_id)
+    return data
+
+
+def _with_page(endpoint: str, page: int) -> str:
+    parts = urlsplit(endpoint)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    query["page"] = [str(page)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True, safe="*:+")))
+
+
+def _page_number(endpoint: str) -> Optional[int]:
+    query = parse_qs(urlsplit(endpoint).query)
+    try:
+        return int(query["page"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def _page_items(data: Any, items_key: Optional[str]) -> list:
+    if items_key:
+        data = (data or {}).get(items_key) or []
+    return data or []
+
+
+async def github_paginate(
+    endpoint: str,
+    items_key: Optional[str] = None,
+    installation_id: Optional[int] = None,
+) -> AsyncIterator[Any]:
+    """
+    Stream every item of a paginated list endpoint.
+
+    Follows `Link: rel="next"`. When GitHub advertises `rel="last"`,
+    the remaining pages are fetched concurrently (bounded by
+    GITHUB_PAGINATION_CONCURRENCY) and yielded in page order.
+
+    `items_key` is for endpoints that wrap the list in an object,
+    e.g. /installation/repositories -> "repositories".
+    """
+    if installation_id is None:
+        installation_id = current_installation_id()
+
+    separator = "&" if "?" in endpoint else "?"
+    if "per_page=" not in endpoint:
+        endpoint = f"{endpoint}{separator}per_page={GITHUB_PAGE_SIZE}"
+
+    data, links = await _send("GET", endpoint, installation_id=installation_id)
+    for item in _page_items(data, items_key):
+        yield item
+
+    last = links.get("last")
+    last_page = _page_number(last) if last else None
+
+    # Known page range -> sliding window of concurrent fetches
+    if last_page and last_page > 1:
+        pending: deque[asyncio.Task] = deque()
+        next_page = 2
+
+        try:
+            while next_page <= last_page or pending:
+                while (
+                    next_page <= last_page
+                    and len(pending) < GITHUB_PAGINATION_CONCURRENCY
+                ):
+                    pending.append(asyncio.create_task(
+                        _send(
+                            "GET",
+                            _with_page(last, next_page),
+                            installation_id=installation_id,
+                        )
+                    ))
+                    next_page += 1
+
+                data, _ = await pending.popleft()
+                for item in _page_items(data, items_key):
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+        return
+
+    # Unknown page range -> follow rel="next" sequentially
+    next_endpoint = links.get("next")
+    while next_endpoint:
+        data, links = await _send("GET", next_endpoint, installation_id=installation_id)
+        for item in _page_items(data, items_key):
+            yield item
+        next_endpoint = links.get("next")
+
 
 # Public helpers
-async def github_post(endpoint: str, json: dict):
-    return await _request("POST", endpoint, json)
+async def github_post(endpoint: str, json: dict, installation_id: Optional[int] = None):
+    return await _request("POST", endpoint, json, installation_id=installation_id)
+
+
+async def github_patch(endpoint: str, json: dict, installation_id: Optional[int] = None):
+    return await _request("PATCH", endpoint, json, installation_id=installation_id)
+
 
+# Identical concurrent GETs (e.g. label + assign + comment webhooks for
+# the same issue) share one in-flight request.
+_get_flight = SingleFlight("github_get")
 
-async def github_patch(endpoint: str, json: dict):
-    return await _request("PATCH", endpoint, json)
 
+async def github_get(endpoint: str, installation_id: Optional[int] = None):
+    if installation_id is None:
+        installation_id = current_installation_id()
 
-async def github_get(endpoint: str):
-    return await _request("GET", endpoint)
+    return await _get_flight.do(
+        (installation_id, endpoint),
+        lambda: _request("GET", endpoint, installation_id=installation_id),
+    )
 
 
-async def github_delete(endpoint: str) -> bool:
-    await _request("DELETE", endpoint)
+async def github_delete(endpoint: str, installation_id: Optional[int] = None) -> bool:
+    await _request("DELETE", endpoint, installation_id=installation_id)
     return True
 
 
-async def get_issue_comments(repo: str, issue_number: int):
-    return await github_get(
-        f"/repos/{repo}/issues/{issue_number}/comments?per_page=100"
+async def github_graphql(
+    query: str,
+    variables: Optional[dict] = None,
+    installation_id: Optional[int] = None,
+) -> dict:
+    """
+    Run a read-only GraphQL query.
+
+    Returns the full response ({"data": ..., "errors": [...]}); GitHub
+    reports partial failures such as NOT_FOUND in `errors` with a 200.
+    """
+    return await _request(
+        "POST",
+        "/graphql",
+        {"query": query, "variables": variables or {}},
+        idempotent=True,
+        installation_id=installation_id,
     )
 
 
+_ISSUE_STATE_FIELDS = (
+    "__typename number state author { login } "
+    "labels(first: 100) { nodes { name } } "
+    "assignees(first: 100) { nodes { login } }"
+)
+
+
+def _build_issue_state_query(by_repo: dict[str, list[int]]) -> tuple[str, dict]:
+    """
+    One aliased `repository { issueOrPullRequest }` block per repo.
+    """
+    params = []
+    blocks = []
+    variables: dict[str, str] = {}
+
+    for i, (repo, numbers) in enumerate(by_repo.items()):
+        owner, name = repo.split("/", 1)
+        variables[f"o{i}"] = owner
+        variables[f"n{i}"] = name
+        params.append(f"$o{i}: String!, $n{i}: String!")
+
+        fields = "\n".join(
+            f"    i{n}: issueOrPullRequest(number: {n}) {{"
+            f" ... on Issue {{ {_ISSUE_STATE_FIELDS} }}"
+            f" ... on PullRequest {{ {_ISSUE_STATE_FIELDS} }} }}"
+            for n in numbers
+        )
+        blocks.append(f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{\n{fields}\n  }}")
+
+    query = "query(" + ", ".join(params) + ") {\n" + "\n".join(blocks) + "\n}"
+    return query, variables
+
+
+def _issue_from_graphql(node: dict) -> dict:
+    """
+    Reshape a GraphQL Issue/PullRequest node like the REST issue object,
+    so callers can treat both the same way.
+    """
+    issue = {
+        "number": node.get("number"),
+        "state": (node.get("state") or "").lower(),
+        "user": {"login": (node.get("author") or {}).get("login")},
+        "labels": [
+            {"name": l.get("name")}
+            for l in (node.get("labels") or {}).get("nodes") or []
+        ],
+        "assignees": [
+            {"login": a.get("login")}
+            for a in (node.get("assignees") or {}).get("nodes") or []
+        ],
+    }
+
+    if node.get("__typename") == "PullRequest":
+        issue["pull_request"] = {}
+
+    return issue
+
+
+async def get_issues_state(
+    refs: Iterable[tuple[str, int]],
+) -> dict[tuple[str, int], dict]:
+    """
+    Fetch labels, assignees and author for many issues / PRs at once.
+
+    Issues are grouped by repo into aliased GraphQL queries of at most
+    GITHUB_GRAPHQL_BATCH_SIZE issues each. Returns {(repo, number):
+    REST-shaped issue}; anything GitHub could not resolve (missing repo,
+    missing issue, lost access) is simply absent, so callers can fall
+    back to the REST lookup for it.
+    """
+    unique = sorted({(repo, int(n)) for repo, n in refs if repo and "/" in repo})
+
+    batches: list[dict[str, list[int]]] = []
+    current: dict[str, list[int]] = {}
+    size = 0
+
+    for repo, number in unique:
+        if size >= GITHUB_GRAPHQL_BATCH_SIZE:
+            batches.append(current)
+            current, size = {}, 0
+        current.setdefault(repo, []).append(number)
+        size += 1
+
+    if current:
+        batches.append(current)
+
+    results: dict[tuple[str, int], dict] = {}
+
+    for by_repo in batches:
+        query, variables = _build_issue_state_query(by_repo)
+        response = await github_graphql(query, variables)
+
+        if response.get("errors"):
+            logger.info(
+                "GraphQL issue lookup returned %s partial error(s)",
+                len(response["errors"]),
+            )
+
+        data = response.get("data") or {}
+        for i, (repo, numbers) in enumerate(by_repo.items()):
+            repo_data = data.get(f"r{i}")
+            if not repo_data:
+                continue
+
+            for n in numbers:
+                node = repo_data.get(f"i{n}")
+                if node:
+                    results[(repo, n)] = _issue_from_graphql(node)
+
+    return results
+
+
+def iter_issue_comments(repo: str, issue_number: int) -> AsyncIterator[dict]:
+    return github_paginate(f"/repos/{repo}/issues/{issue_number}/comments")
+
+
 async def get_user_issues(repo: str, username: str):
     return await github_get(
         f"/search/issues?q=repo:{repo}+type:issue+author:{username}"
@@ -104,25 +506,38 @@ async def get_user_prs(repo: str, username: str):
 
 
 async def get_repo_maintainers(repo: str):
-    owners = await github_get(
-        f"/repos/{repo}/collaborators?permission=maintain"
-    )
-    admins = await github_get(
-        f"/repos/{repo}/collaborators?permission=admin"
+    """
+    Logins with maintain or admin permission on the repo.
+
+    Both permission lists are fetched concurrently and fully paginated;
+    the merged result is cached in Redis and dropped on member / team
+    webhooks.
+    """
+    cached = await get_cached_maintainers(repo)
+    if cached is not None:
+        return cached
+
+    async def collect(permission: str) -> list[dict]:
+        return [
+            u async for u in github_paginate(
+                f"/repos/{repo}/collaborators?permission={permission}"
+            )
+        ]
+
+    maintainers, admins = await asyncio.gather(
+        collect("maintain"),
+        collect("admin"),
     )
 
-    users = set()
-    for u in owners + admins:
-        users.add(u["login"])
+    users = sorted({u["login"] for u in maintainers + admins})
 
-    return list(users)
+    await set_cached_maintainers(repo, users, MAINTAINERS_CACHE_TTL_SECONDS)
+    return users
 
 
-async def list_installed_repos():
-    return await github_get("/installation/repositories")
+def iter_installed_repos() -> AsyncIterator[dict]:
+    return github_paginate("/installation/repositories", items_key="repositories")
 
 
-async def list_open_assigned_issues(repo: str):
-    return await github_get(
-        f"/repos/{repo}/issues?state=open&assignee=*"
-    )
+def iter_open_assigned_issues(repo: str) -> AsyncIterator[dict]:
+    return github_paginate(f"/repos/{repo}/issues?state=open&assignee=*")
@@ -1,25 +1,97 @@
+import asyncio
 import time
-from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, Optional
 
-import httpx
 import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
 
+from app.github.http_client import GITHUB_API, get_http_client
 from app.logger import get_logger
-from app.settings import GITHUB_APP_ID, GITHUB_PRIVATE_KEY_PATH, GITHUB_PRIVATE_KEY
+from app.settings import (
+    GITHUB_APP_ID,
+    GITHUB_PRIVATE_KEY_PATH,
+    GITHUB_PRIVATE_KEY,
+    GITHUB_TOKEN_REFRESH_AHEAD_SECONDS,
+    GITHUB_TOKEN_EXPIRY_MARGIN_SECONDS,
+)
+from app.utils.singleflight import SingleFlight
 
 
 logger = get_logger("yaplate.github.auth")
 
-_PRIVATE_KEY: Optional[str] = None
-_CACHED_TOKEN: Optional[str] = None
-_TOKEN_EXPIRY: float = 0.0
+_PRIVATE_KEY: Optional[PrivateKeyTypes] = None
 
+_CACHED_JWT: Optional[str] = None
+_JWT_EXPIRY: float = 0.0
 
-def _load_private_key() -> str:
+# Re-sign this long before the cached App JWT's `exp`
+JWT_REFRESH_MARGIN_SECONDS = 60
+
+
+@dataclass
+class _InstallationToken:
+    token: str
+    expires_at: float
+
+
+# installation id -> token
+_TOKENS: dict[int, _InstallationToken] = {}
+
+# Fallback when no installation context is set (single-install setups)
+_DEFAULT_INSTALLATION_ID: Optional[int] = None
+
+# Concurrent refreshes of the same installation share one mint
+_refresh_flight = SingleFlight("installation_token")
+_background_refreshes: set[asyncio.Task] = set()
+
+# Installation the current webhook / scheduler item belongs to
+_current_installation: ContextVar[Optional[int]] = ContextVar(
+    "github_installation_id",
+    default=None,
+)
+
+
+@contextmanager
+def installation_context(installation_id: Optional[int]) -> Iterator[None]:
+    """
+    Run GitHub calls in this block as the given installation.
+    A None id leaves the surrounding context unchanged.
+    """
+    if installation_id is None:
+        yield
+        return
+
+    token = _current_installation.set(int(installation_id))
+    try:
+        yield
+    finally:
+        _current_installation.reset(token)
+
+
+def current_installation_id() -> Optional[int]:
+    return _current_installation.get()
+
+
+def _parse_private_key(pem: str) -> PrivateKeyTypes:
+    try:
+        return serialization.load_pem_private_key(pem.encode(), password=None)
+    except (ValueError, TypeError) as exc:
+        raise RuntimeError("GitHub private key is not a valid PEM key") from exc
+
+
+def _load_private_key() -> PrivateKeyTypes:
     """
     Load GitHub App private key from:
     1) env var GITHUB_PRIVATE_KEY (recommended for Production)
     2) file path GITHUB_PRIVATE_KEY_PATH (recommended for local dev)
+
+    The PEM is parsed once into a key object, so signing does not
+    re-parse the RSA key on every JWT.
     """
     global _PRIVATE_KEY
 
@@ -28,7 +100,7 @@ def _load_private_key() -> str:
 
     # 1) Railway / production: env var
     if GITHUB_PRIVATE_KEY and GITHUB_PRIVATE_KEY.strip():
-        _PRIVATE_KEY = GITHUB_PRIVATE_KEY.strip()
+        _PRIVATE_KEY = _parse_private_key(GITHUB_PRIVATE_KEY.strip())
         return _PRIVATE_KEY
 
     # 2) Local dev: file path
@@ -40,19 +112,31 @@ def _load_private_key() -> str:
 
     try:
         with open(GITHUB_PRIVATE_KEY_PATH, "r", encoding="utf-8") as f:
-            _PRIVATE_KEY = f.read()
-            return _PRIVATE_KEY
+            pem = f.read()
     except OSError as exc:
         raise RuntimeError(
             f"Failed to read GitHub private key at {GITHUB_PRIVATE_KEY_PATH}"
         ) from exc
 
+    _PRIVATE_KEY = _parse_private_key(pem)
+    return _PRIVATE_KEY
+
 
 def create_jwt() -> str:
+    """
+    Return an App JWT (valid 9 minutes).
+    Reused until JWT_REFRESH_MARGIN_SECONDS before `exp` instead of
+    signing a fresh one per call.
+    """
+    global _CACHED_JWT, _JWT_EXPIRY
+
     if not GITHUB_APP_ID:
         raise RuntimeError("GITHUB_APP_ID is not set")
 
     now = int(time.time())
+    if _CACHED_JWT and now < _JWT_EXPIRY - JWT_REFRESH_MARGIN_SECONDS:
+        return _CACHED_JWT
+
     payload = {
         "iat": now - 30,
         "exp": now + 9 * 60,
@@ -60,50 +144,135 @@ def create_jwt() -> str:
     }
 
     private_key = _load_private_key()
-    return jwt.encode(payload, private_key, algorithm="RS256")
+    _CACHED_JWT = jwt.encode(payload, private_key, algorithm="RS256")
+    _JWT_EXPIRY = payload["exp"]
+    return _CACHED_JWT
 
 
-async def get_installation_token() -> str:
+def _jwt_headers() -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {create_jwt()}",
+        "Accept": "application/vnd.github+json",
+    }
+
+
+async def list_app_installations() -> list[dict]:
     """
-    Return a GitHub installation access token.
-    Cached until expiry to avoid unnecessary regeneration.
+    Every installation of this GitHub App (JWT-authenticated).
     """
-    global _CACHED_TOKEN, _TOKEN_EXPIRY
+    client = get_http_client()
+    installations: list[dict] = []
+    page = 1
 
-    now = time.time()
-    if _CACHED_TOKEN and now < _TOKEN_EXPIRY:
-        return _CACHED_TOKEN
+    while True:
+        resp = await client.get(
+            f"{GITHUB_API}/app/installations",
+            params={"per_page": 100, "page": page},
+            headers=_jwt_headers(),
+        )
+        resp.raise_for_status()
 
-    jwt_token = create_jwt()
+        batch = resp.json()
+        installations.extend(batch)
 
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/vnd.github+json",
-    }
+        if len(batch) < 100:
+            return installations
+        page += 1
 
-    async with httpx.AsyncClient() as client:
-        installations_resp = await client.get(
-            "https://api.github.com/app/installations",
-            headers=headers,
-        )
-        installations_resp.raise_for_status()
 
-        installations = installations_resp.json()
-        if not installations:
-            raise RuntimeError("No GitHub App installations found")
+async def _default_installation_id() -> int:
+    global _DEFAULT_INSTALLATION_ID
+
+    if _DEFAULT_INSTALLATION_ID is not None:
+        return _DEFAULT_INSTALLATION_ID
 
-        installation_id = installations[0]["id"]
+    installations = await list_app_installations()
+    if not installations:
+        raise RuntimeError("No GitHub App installations found")
 
-        token_resp = await client.post(
-            f"https://api.github.com/app/installations/{installation_id}/access_tokens",
-            headers=headers,
+    if len(installations) > 1:
+        logger.warning(
+            "GitHub call without installation context; "
+            "defaulting to installation %s of %s",
+            installations[0]["id"],
+            len(installations),
         )
-        token_resp.raise_for_status()
 
-        data = token_resp.json()
+    _DEFAULT_INSTALLATION_ID = installations[0]["id"]
+    return _DEFAULT_INSTALLATION_ID
+
+
+def _parse_expires_at(value: Optional[str]) -> float:
+    if not value:
+        return time.time() + 50 * 60  # 1 hour minus buffer
+
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+async def _mint_token(installation_id: int) -> str:
+    client = get_http_client()
+
+    token_resp = await client.post(
+        f"{GITHUB_API}/app/installations/{installation_id}/access_tokens",
+        headers=_jwt_headers(),
+    )
+    token_resp.raise_for_status()
+
+    data = token_resp.json()
+
+    _TOKENS[installation_id] = _InstallationToken(
+        token=data["token"],
+        expires_at=_parse_expires_at(data.get("expires_at")),
+    )
+
+    logger.info("GitHub installation token obtained (installation=%s)", installation_id)
+    return data["token"]
+
+
+def _refresh_in_background(installation_id: int):
+    async def refresh():
+        try:
+            await _refresh_flight.do(installation_id, lambda: _mint_token(installation_id))
+        except Exception:
+            logger.exception(
+                "Background token refresh failed (installation=%s)",
+                installation_id,
+            )
+
+    if _refresh_flight.is_running(installation_id):
+        return
+
+    task = asyncio.create_task(refresh())
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+
+async def get_installation_token(installation_id: Optional[int] = None) -> str:
+    """
+    Return an installation access token.
+
+    Resolution order: explicit id, then the current installation
+    context, then the app's first installation.
+
+    Tokens are cached per installation until GitHub's `expires_at`.
+    Within GITHUB_TOKEN_REFRESH_AHEAD_SECONDS of expiry a refresh is
+    started in the background while the current token is still served;
+    concurrent refreshes are coalesced into one mint.
+    """
+    if installation_id is None:
+        installation_id = current_installation_id()
+    if installation_id is None:
+        installation_id = await _default_installation_id()
+
+    now = time.time()
+    cached = _TOKENS.get(installation_id)
 
-        _CACHED_TOKEN = data["token"]
-        _TOKEN_EXPIRY = time.time() + 50 * 60  # 1 hour minus buffer
+    if cached and now < cached.expires_at - GITHUB_TOKEN_EXPIRY_MARGIN_SECONDS:
+        if now >= cached.expires_at - GITHUB_TOKEN_REFRESH_AHEAD_SECONDS:
+            _refresh_in_background(installation_id)
+        return cached.token
 
-        logger.info("GitHub installation token obtained")
-        return _CACHED_TOKEN
+    return await _refresh_flight.do(
+        installation_id,
+        lambda: _mint_token(installation_id),
+    )
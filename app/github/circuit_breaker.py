@@ -0,0 +1,123 @@
+import time
+
+from app import metrics
+from app.logger import get_logger
+from app.settings import (
+    GITHUB_CIRCUIT_FAILURE_THRESHOLD,
+    GITHUB_CIRCUIT_RECOVERY_SECONDS,
+)
+
+
+logger = get_logger("yaplate.github.circuit_breaker")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Exported as github_circuit_state
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling GitHub while the breaker is open.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    - closed:    calls go through; N consecutive failures open it
+    - open:      calls fail fast with CircuitOpen for `recovery_seconds`
+    - half_open: one probe call is let through; success closes,
+                 failure re-opens
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        recovery_seconds: float,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = 0.0
+
+        self._export()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.time() - self._opened_at >= self.recovery_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def is_available(self) -> bool:
+        """
+        True unless the breaker is open (a half-open probe is allowed).
+        """
+        return self.state != OPEN
+
+    def before_call(self):
+        state = self.state
+
+        if state == OPEN:
+            raise CircuitOpen(f"{self.name} circuit is open")
+
+        if state == HALF_OPEN:
+            now = time.time()
+
+            # A probe that never reported back (e.g. cancelled) expires
+            if now - self._probe_started_at < self.recovery_seconds:
+                raise CircuitOpen(f"{self.name} circuit is half-open (probe in flight)")
+
+            self._state = HALF_OPEN
+            self._probe_started_at = now
+            self._export()
+
+    def record_success(self):
+        if self._state != CLOSED:
+            logger.info("%s circuit closed", self.name)
+
+        self._state = CLOSED
+        self._failures = 0
+        self._probe_started_at = 0.0
+        self._export()
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_started_at = 0.0
+
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                metrics.inc("github_circuit_opened_total", circuit=self.name)
+                logger.warning(
+                    "%s circuit opened after %s consecutive failures",
+                    self.name,
+                    self._failures,
+                )
+
+            self._state = OPEN
+            self._opened_at = time.time()
+
+        self._export()
+
+    def _export(self):
+        metrics.set_gauge(
+            "github_circuit_state",
+            _STATE_VALUES[self._state],
+            circuit=self.name,
+        )
+
+
+github_breaker = CircuitBreaker(
+    "github",
+    failure_threshold=GITHUB_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_seconds=GITHUB_CIRCUIT_RECOVERY_SECONDS,
+)
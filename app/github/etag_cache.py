@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.cache.store import get_cached_response, set_cached_response
+from app.logger import get_logger
+from app.settings import (
+    GITHUB_ETAG_CACHE_ENABLED,
+    GITHUB_ETAG_CACHE_MAX_ENTRIES,
+    GITHUB_ETAG_CACHE_TTL_SECONDS,
+)
+
+
+logger = get_logger("yaplate.github.etag_cache")
+
+# endpoint -> {"etag": str | None, "last_modified": str | None,
+#              "body": Any, "links": {rel: endpoint}}
+_LRU: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _remember(endpoint: str, entry: dict):
+    _LRU[endpoint] = entry
+    _LRU.move_to_end(endpoint)
+
+    while len(_LRU) > GITHUB_ETAG_CACHE_MAX_ENTRIES:
+        _LRU.popitem(last=False)
+
+
+async def lookup(endpoint: str) -> Optional[dict]:
+    """
+    Return the cached validators + body for an endpoint.
+
+    Checks the in-process LRU first, then Redis (shared between
+    replicas and survives restarts).
+    """
+    if not GITHUB_ETAG_CACHE_ENABLED:
+        return None
+
+    entry = _LRU.get(endpoint)
+    if entry is not None:
+        _LRU.move_to_end(endpoint)
+        return entry
+
+    entry = await get_cached_response(endpoint)
+    if entry:
+        _remember(endpoint, entry)
+
+    return entry
+
+
+def conditional_headers(entry: Optional[dict]) -> dict[str, str]:
+    if not entry:
+        return {}
+
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    return headers
+
+
+async def store(
+    endpoint: str,
+    response_headers,
+    body: Any,
+    links: Optional[dict[str, str]] = None,
+):
+    """
+    Cache a 200 response if GitHub returned a validator for it.
+    """
+    if not GITHUB_ETAG_CACHE_ENABLED:
+        return
+
+    etag = response_headers.get("etag")
+    last_modified = response_headers.get("last-modified")
+
+    if not etag and not last_modified:
+        return
+
+    entry = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "body": body,
+        "links": links or {},
+    }
+
+    _remember(endpoint, entry)
+    await set_cached_response(endpoint, entry, GITHUB_ETAG_CACHE_TTL_SECONDS)
@@ -1,5 +1,5 @@
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from app.logger import get_logger
 from app.github.comments import handle_comment
@@ -9,22 +9,46 @@ from app.cache.store import (
     cancel_followup,
     cancel_stale,
     purge_repo,
-    purge_all,
+    purge_installation,
     migrate_repo,
     mark_repo_installed,
     unmark_repo_installed,
     clear_followup_stopped,
-    clear_followup_completed
+    clear_followup_completed,
+    invalidate_maintainers,
+    invalidate_org_maintainers,
 )
 from app.nlp.language_detect import detect_with_fallback
 from app.settings import FOLLOWUP_DEFAULT_INTERVAL_HOURS
 from app.github.api import RepoUnavailable
+from app.github.auth import installation_context
+from app.utils.keyed_executor import issue_executor
 
 
 logger = get_logger("yaplate.github.events")
 
-
-async def handle_event(event_type: str, payload: Dict[str, Any]):
+# Event types handle_event can act on. Anything else (push,
+# check_run, workflow_run, ...) is acknowledged by the webhook route
+# without being parsed or queued. Keep in sync with _dispatch_event.
+HANDLED_EVENTS = frozenset({
+    "installation",
+    "installation_repositories",
+    "repository",
+    "member",
+    "team",
+    "membership",
+    "issues",
+    "issue_comment",
+    "pull_request",
+    "pull_request_review_comment",
+})
+
+
+async def handle_event(
+    event_type: str,
+    payload: Dict[str, Any],
+    raise_errors: bool = False,
+):
     """
     Central GitHub webhook dispatcher.
 
@@ -32,15 +56,63 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
     - missed webhooks
     - bot downtime
     - repo removals / renames
+
+    All GitHub calls made while handling the event run as the
+    installation that sent it. Events for the same issue / PR are
+    handled one at a time, in arrival order.
+
+    Failures are logged and swallowed, unless raise_errors (stream
+    ingest: the entry then stays pending and is retried, then
+    dead-lettered).
     """
+    installation_id = (payload.get("installation") or {}).get("id")
+
+    with installation_context(installation_id):
+        await issue_executor.run(
+            _serial_key(payload, installation_id),
+            lambda: _dispatch_event(event_type, payload, installation_id, raise_errors),
+        )
+
+
+def _serial_key(payload: Dict[str, Any], installation_id: Optional[int]):
+    """
+    (repo, issue_number) for issue / PR / comment events, matching the
+    key used by the follow-up scheduler. Repo- and installation-level
+    events serialize per repo / installation.
+    """
+    repo_full = (payload.get("repository") or {}).get("full_name")
+
+    number = (
+        (payload.get("issue") or {}).get("number")
+        or (payload.get("pull_request") or {}).get("number")
+    )
+
+    if repo_full:
+        return (repo_full, number)
+
+    return ("installation", installation_id)
 
+
+async def _dispatch_event(
+    event_type: str,
+    payload: Dict[str, Any],
+    installation_id: Optional[int],
+    raise_errors: bool = False,
+):
     try:
         # ---------------------------------------------------------
-        # 1. App uninstalled -> purge EVERYTHING
+        # 1. App uninstalled -> purge that installation's state
         # ---------------------------------------------------------
         if event_type == "installation" and payload.get("action") == "deleted":
-            logger.info("App uninstalled — purging all state")
-            purge_all()
+            if installation_id is None:
+                logger.warning("Uninstall event without installation id; ignoring")
+                return
+
+            logger.info("App uninstalled — purging installation %s", installation_id)
+            await purge_installation(
+                installation_id,
+                [repo["full_name"] for repo in payload.get("repositories") or []],
+            )
             return
 
         # ---------------------------------------------------------
@@ -48,7 +120,7 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
         # ---------------------------------------------------------
         if event_type == "installation" and payload.get("action") == "created":
             for repo in payload.get("repositories", []):
-                mark_repo_installed(repo["full_name"])
+                await mark_repo_installed(repo["full_name"], installation_id)
             return
 
         if event_type == "installation_repositories":
@@ -56,12 +128,12 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
 
             if action == "added":
                 for repo in payload.get("repositories_added", []):
-                    mark_repo_installed(repo["full_name"])
+                    await mark_repo_installed(repo["full_name"], installation_id)
                 return
 
             if action == "removed":
                 for repo in payload.get("repositories_removed", []):
-                    unmark_repo_installed(repo["full_name"])
+                    await unmark_repo_installed(repo["full_name"])
                 return
 
         # ---------------------------------------------------------
@@ -69,15 +141,35 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
         # ---------------------------------------------------------
         if event_type == "repository" and payload.get("action") == "renamed":
             repo = payload.get("repository") or {}
-            old_full = repo.get("full_name")
+            new_full = repo.get("full_name")
 
+            # repository already carries the new name
             owner = repo.get("owner", {}).get("login")
-            new_name = repo.get("name")
-
-            if old_full and owner and new_name:
-                new_full = f"{owner}/{new_name}"
+            old_name = (
+                payload.get("changes", {})
+                .get("repository", {})
+                .get("name", {})
+                .get("from")
+            )
+
+            if new_full and owner and old_name:
+                old_full = f"{owner}/{old_name}"
                 logger.info("Repository renamed: %s -> %s", old_full, new_full)
-                migrate_repo(old_full, new_full)
+                await migrate_repo(old_full, new_full)
+
+            return
+
+        # ---------------------------------------------------------
+        # 3b. Collaborator / team changes -> drop cached maintainers
+        # ---------------------------------------------------------
+        if event_type in ("member", "team", "membership"):
+            repo_full = (payload.get("repository") or {}).get("full_name")
+            org = (payload.get("organization") or {}).get("login")
+
+            if repo_full:
+                await invalidate_maintainers(repo_full)
+            elif org:
+                await invalidate_org_maintainers(org)
 
             return
 
@@ -95,7 +187,7 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
             return
 
         # Defensive: ensure repo is marked installed if we see traffic
-        mark_repo_installed(repo_full)
+        await mark_repo_installed(repo_full, installation_id)
 
         # ---------------------------------------------------------
         # 5. Comment events
@@ -106,8 +198,8 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
             except RepoUnavailable:
                 issue = payload.get("issue")
                 if issue:
-                    cancel_followup(repo_full, issue["number"])
-                    cancel_stale(repo_full, issue["number"])
+                    await cancel_followup(repo_full, issue["number"])
+                    await cancel_stale(repo_full, issue["number"])
             return
 
         # ---------------------------------------------------------
@@ -140,13 +232,13 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
                 elif action == "assigned":
                     assignee = payload.get("assignee", {}).get("login")
                     if assignee:
-                        clear_followup_completed(repo_full, issue_number)
-                        clear_followup_stopped(repo_full, issue_number)
+                        await clear_followup_completed(repo_full, issue_number)
+                        await clear_followup_stopped(repo_full, issue_number)
 
                         lang = await detect_with_fallback(title, body)
                         due_at = time.time() + FOLLOWUP_DEFAULT_INTERVAL_HOURS * 3600
 
-                        schedule_followup(
+                        await schedule_followup(
                             repo=repo_full,
                             issue_number=issue_number,
                             assignee=assignee,
@@ -155,15 +247,15 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
                         )
 
                 elif action in ("unassigned", "closed", "deleted"):
-                    cancel_followup(repo_full, issue_number)
-                    cancel_stale(repo_full, issue_number)
-                    clear_followup_stopped(repo_full, issue_number)
-                    clear_followup_completed(repo_full, issue_number)
+                    await cancel_followup(repo_full, issue_number)
+                    await cancel_stale(repo_full, issue_number)
+                    await clear_followup_stopped(repo_full, issue_number)
+                    await clear_followup_completed(repo_full, issue_number)
 
 
             except RepoUnavailable:
-                cancel_followup(repo_full, issue_number)
-                cancel_stale(repo_full, issue_number)
+                await cancel_followup(repo_full, issue_number)
+                await cancel_stale(repo_full, issue_number)
 
             return
 
@@ -196,7 +288,7 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
                     lang = await detect_with_fallback(title, body)
                     due_at = time.time() + FOLLOWUP_DEFAULT_INTERVAL_HOURS * 3600
 
-                    schedule_followup(
+                    await schedule_followup(
                         repo=repo_full,
                         issue_number=pr_number,
                         assignee=author,
@@ -205,15 +297,17 @@ async def handle_event(event_type: str, payload: Dict[str, Any]):
                     )
 
                 elif action in ("closed", "converted_to_draft"):
-                    cancel_followup(repo_full, pr_number)
-                    cancel_stale(repo_full, pr_number)
+                    await cancel_followup(repo_full, pr_number)
+                    await cancel_stale(repo_full, pr_number)
 
             except RepoUnavailable:
-                cancel_followup(repo_full, pr_number)
-                cancel_stale(repo_full, pr_number)
+                await cancel_followup(repo_full, pr_number)
+                await cancel_stale(repo_full, pr_number)
 
             return
 
     except Exception:
         # Never crash webhook processing
         logger.exception("Unhandled error while processing event: %s", event_type)
+        if raise_errors:
+            raise
@@ -0,0 +1,93 @@
+import httpx
+from typing import Optional
+
+from app.logger import get_logger
+from app.settings import (
+    GITHUB_HTTP2_ENABLED,
+    GITHUB_HTTP_MAX_CONNECTIONS,
+    GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    GITHUB_HTTP_CONNECT_TIMEOUT_SECONDS,
+    GITHUB_HTTP_READ_TIMEOUT_SECONDS,
+    GITHUB_HTTP_POOL_TIMEOUT_SECONDS,
+)
+
+
+GITHUB_API = "https://api.github.com"
+
+logger = get_logger("yaplate.github.http")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=GITHUB_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    timeout = httpx.Timeout(
+        connect=GITHUB_HTTP_CONNECT_TIMEOUT_SECONDS,
+        read=GITHUB_HTTP_READ_TIMEOUT_SECONDS,
+        write=GITHUB_HTTP_READ_TIMEOUT_SECONDS,
+        pool=GITHUB_HTTP_POOL_TIMEOUT_SECONDS,
+    )
+
+    return httpx.AsyncClient(
+        http2=GITHUB_HTTP2_ENABLED,
+        limits=limits,
+        timeout=timeout,
+        follow_redirects=True,
+    )
+
+
+async def init_http_client() -> httpx.AsyncClient:
+    """
+    Create the shared GitHub HTTP client.
+    Called once from the FastAPI lifespan on startup.
+    """
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        logger.info(
+            "GitHub HTTP client started (http2=%s, max_connections=%s)",
+            GITHUB_HTTP2_ENABLED,
+            GITHUB_HTTP_MAX_CONNECTIONS,
+        )
+
+    return _client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared, pooled GitHub HTTP client.
+
+    Lazily created if the lifespan has not run yet (scripts, shells),
+    so callers never fall back to a per-request client.
+    """
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+    return _client
+
+
+async def close_http_client():
+    """
+    Close the shared client and release pooled connections.
+    Called from the FastAPI lifespan on shutdown.
+    """
+    global _client
+
+    if _client is None:
+        return
+
+    try:
+        await _client.aclose()
+    except Exception:
+        logger.exception("Failed to close GitHub HTTP client")
+    finally:
+        _client = None
+        logger.info("GitHub HTTP client closed")
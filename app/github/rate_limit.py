@@ -0,0 +1,222 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app import metrics
+from app.logger import get_logger
+from app.settings import (
+    GITHUB_RATE_LIMIT_RESERVE,
+    GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS,
+    GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS,
+)
+
+
+logger = get_logger("yaplate.github.rate_limit")
+
+
+class RateLimited(Exception):
+    """
+    Raised when GitHub's primary or secondary rate limit is exhausted
+    and the wait would exceed GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS.
+
+    Distinct from RepoUnavailable: the repo is healthy, only the
+    budget is spent.
+    """
+
+    def __init__(self, message: str, retry_at: float):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+@dataclass
+class _Budget:
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_at: float = 0.0
+    blocked_until: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+# (installation id, resource) -> budget
+# installation None = default installation; resource is GitHub's
+# X-RateLimit-Resource ("core", "search", "graphql", ...), each of
+# which has its own independent budget.
+_BUDGETS: dict[tuple[Optional[int], str], _Budget] = {}
+
+
+def resource_for(endpoint: str) -> str:
+    if endpoint.startswith("/graphql"):
+        return "graphql"
+    if endpoint.startswith("/search/"):
+        return "search"
+    return "core"
+
+
+def _budget(installation_id: Optional[int], resource: str) -> _Budget:
+    budget = _BUDGETS.get((installation_id, resource))
+    if budget is None:
+        budget = _Budget()
+        _BUDGETS[(installation_id, resource)] = budget
+    return budget
+
+
+def _label(installation_id: Optional[int]) -> str:
+    return str(installation_id) if installation_id is not None else "default"
+
+
+def _wait_for(budget: _Budget, now: float) -> float:
+    if budget.blocked_until > now:
+        return budget.blocked_until - now
+
+    if budget.remaining is None or budget.reset_at <= now:
+        return 0.0
+
+    if budget.remaining <= 0:
+        return budget.reset_at - now
+
+    if budget.remaining <= GITHUB_RATE_LIMIT_RESERVE:
+        # Spread what is left evenly over the rest of the window
+        return (budget.reset_at - now) / budget.remaining
+
+    return 0.0
+
+
+async def acquire(installation_id: Optional[int] = None, resource: str = "core"):
+    """
+    Wait until a call fits in the installation's budget.
+
+    Calls are queued behind a per-installation lock once the budget
+    drops into the reserve, so bursts are paced instead of burning
+    the last requests at once.
+    """
+    budget = _budget(installation_id, resource)
+
+    if _wait_for(budget, time.time()) <= 0:
+        if budget.remaining is not None:
+            budget.remaining -= 1
+        return
+
+    async with budget.lock:
+        now = time.time()
+        wait = _wait_for(budget, now)
+
+        if wait > GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS:
+            metrics.inc(
+                "github_rate_limit_rejected_total",
+                installation=_label(installation_id),
+                resource=resource,
+            )
+            raise RateLimited(
+                f"GitHub rate limit exhausted; retry in {wait:.0f}s",
+                retry_at=now + wait,
+            )
+
+        if wait > 0:
+            metrics.inc(
+                "github_rate_limit_throttled_total",
+                installation=_label(installation_id),
+                resource=resource,
+            )
+            await asyncio.sleep(wait)
+
+        if budget.remaining is not None:
+            budget.remaining -= 1
+
+
+def record(installation_id: Optional[int], resource: str, headers):
+    """
+    Update the budget from X-RateLimit-* response headers.
+    """
+    resource = headers.get("x-ratelimit-resource", resource)
+    budget = _budget(installation_id, resource)
+    label = _label(installation_id)
+
+    try:
+        if "x-ratelimit-limit" in headers:
+            budget.limit = int(headers["x-ratelimit-limit"])
+            metrics.set_gauge(
+                "github_rate_limit_limit",
+                budget.limit,
+                installation=label,
+                resource=resource,
+            )
+
+        if "x-ratelimit-remaining" in headers:
+            budget.remaining = int(headers["x-ratelimit-remaining"])
+            metrics.set_gauge(
+                "github_rate_limit_remaining",
+                budget.remaining,
+                installation=label,
+                resource=resource,
+            )
+
+        if "x-ratelimit-reset" in headers:
+            budget.reset_at = float(headers["x-ratelimit-reset"])
+            metrics.set_gauge(
+                "github_rate_limit_reset_timestamp",
+                budget.reset_at,
+                installation=label,
+                resource=resource,
+            )
+    except ValueError:
+        logger.warning("Malformed rate limit headers: %s", dict(headers))
+
+
+def is_rate_limit_response(status: int, headers, message: str) -> bool:
+    """
+    Tell rate-limit 403/429 responses apart from real access loss.
+    """
+    if status == 429:
+        return True
+
+    if status != 403:
+        return False
+
+    if "retry-after" in headers:
+        return True
+
+    if headers.get("x-ratelimit-remaining") == "0":
+        return True
+
+    return "rate limit" in (message or "").lower()
+
+
+def block(installation_id: Optional[int], resource: str, headers) -> float:
+    """
+    Record a rate-limit response and return when calls may resume.
+
+    Honors Retry-After, then X-RateLimit-Reset, then falls back to
+    GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS (GitHub asks for at
+    least a minute on secondary limits without Retry-After).
+    """
+    resource = headers.get("x-ratelimit-resource", resource)
+    budget = _budget(installation_id, resource)
+    now = time.time()
+
+    retry_at = now + GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            retry_at = now + float(retry_after)
+        except ValueError:
+            pass
+    elif headers.get("x-ratelimit-remaining") == "0" and budget.reset_at > now:
+        retry_at = budget.reset_at
+
+    budget.blocked_until = max(budget.blocked_until, retry_at)
+
+    metrics.inc(
+        "github_rate_limited_total",
+        installation=_label(installation_id),
+        resource=resource,
+    )
+    logger.warning(
+        "GitHub %s rate limit hit (installation=%s); pausing for %.0fs",
+        resource,
+        _label(installation_id),
+        budget.blocked_until - now,
+    )
+
+    return budget.blocked_until
@@ -1,31 +1,87 @@
 from app import settings  # load .env
 from fastapi import FastAPI, Request, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import asyncio
+import orjson
 
 from app.security.webhook_verify import verify_signature
-from app.github.events import handle_event
+from app.cache.migrations import check_key_schema
+from app.cache.installed_repos import (
+    start_installed_repos_sync,
+    stop_installed_repos_sync,
+)
+from app.cache.store import claim_delivery, release_delivery, close_store
+from app.github.events import HANDLED_EVENTS
+from app.github.http_client import init_http_client, close_http_client
 from app.logger import get_logger
+from app import metrics
+from app.workers.event_queue import (
+    QueueFull,
+    enqueue_event,
+    start_event_workers,
+    stop_event_workers,
+)
+from app.workers.event_stream import (
+    publish_event,
+    start_stream_consumers,
+    stop_stream_consumers,
+)
 from app.workers.followup_scheduler import followup_loop
-from app.settings import validate_github_settings
+from app.workers.key_sweeper import key_sweeper_loop
+from app.settings import (
+    validate_github_settings,
+    validate_cache_settings,
+    CACHE_BACKEND,
+    WEBHOOK_INGEST_MODE,
+    WEBHOOK_STREAM_CONSUME_IN_APP,
+    WEBHOOK_DELIVERY_DEDUP_TTL_SECONDS,
+    KEY_SWEEP_ENABLED,
+)
 
 
 logger = get_logger()
 
 _scheduler_task: asyncio.Task | None = None
+_sweeper_task: asyncio.Task | None = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _scheduler_task
+    global _scheduler_task, _sweeper_task
 
     # Validate critical configuration early
     validate_github_settings()
+    validate_cache_settings()
+
+    # Refuse to run on an unmigrated Redis key layout
+    if CACHE_BACKEND == "redis":
+        await check_key_schema()
+
+    # Startup: shared, pooled GitHub HTTP client
+    await init_http_client()
+
+    # Startup: local mirror of the installed-repo set
+    if CACHE_BACKEND == "redis":
+        await start_installed_repos_sync()
+
+    # Startup: webhook worker pool (or stream consumers)
+    if WEBHOOK_INGEST_MODE == "stream":
+        if WEBHOOK_STREAM_CONSUME_IN_APP:
+            await start_stream_consumers()
+    else:
+        await start_event_workers()
 
     # Startup: start background follow-up scheduler
     _scheduler_task = asyncio.create_task(followup_loop())
     logger.info("Follow-up scheduler started")
 
+    # Startup: retention sweeper for repo-scoped keys (the embedded
+    # store expires its rows itself)
+    if KEY_SWEEP_ENABLED and CACHE_BACKEND == "redis":
+        _sweeper_task = asyncio.create_task(key_sweeper_loop())
+        logger.info("Key sweeper started")
+
     try:
         yield
     finally:
@@ -38,15 +94,33 @@ async def lifespan(app: FastAPI):
                 pass
             logger.info("Follow-up scheduler stopped")
 
+        if _sweeper_task:
+            _sweeper_task.cancel()
+            try:
+                await _sweeper_task
+            except asyncio.CancelledError:
+                pass
+            logger.info("Key sweeper stopped")
+
+        if WEBHOOK_INGEST_MODE == "stream":
+            await stop_stream_consumers()
+        else:
+            await stop_event_workers()
+
+        await stop_installed_repos_sync()
+        await close_http_client()
+        await close_store()
+
 
 app = FastAPI(lifespan=lifespan)
 
 
-@app.post("/webhook")
+@app.post("/webhook", status_code=202)
 async def github_webhook(
     request: Request,
     x_hub_signature_256: str | None = Header(None),
     x_github_event: str | None = Header(None),
+    x_github_delivery: str | None = Header(None),
 ):
     body = await request.body()
 
@@ -59,11 +133,54 @@ async def github_webhook(
     if not x_github_event:
         raise HTTPException(status_code=400, detail="Missing GitHub event header")
 
-    payload = await request.json()
+    if x_github_event not in HANDLED_EVENTS:
+        # Decided by header alone: the body is never parsed
+        metrics.inc("webhook_events_ignored_total", event=x_github_event)
+        return {"status": "ignored"}
+
     logger.info("Received GitHub event: %s", x_github_event)
 
-    await handle_event(x_github_event, payload)
-    return {"status": "ok"}
+    dedup = bool(x_github_delivery) and WEBHOOK_DELIVERY_DEDUP_TTL_SECONDS > 0
+
+    if dedup and not await claim_delivery(x_github_delivery, WEBHOOK_DELIVERY_DEDUP_TTL_SECONDS):
+        metrics.inc("webhook_duplicate_deliveries_total", event=x_github_event)
+        logger.info("Skipping redelivered webhook %s", x_github_delivery)
+        return {"status": "duplicate"}
+
+    if WEBHOOK_INGEST_MODE == "stream":
+        try:
+            await publish_event(x_github_event, body, x_github_delivery)
+        except Exception:
+            logger.exception("Failed to append event to stream")
+            if dedup:
+                await release_delivery(x_github_delivery)
+            raise HTTPException(status_code=503, detail="Event stream unavailable")
+
+        return {"status": "queued"}
+
+    # Parsed once, from the bytes already read for the HMAC check
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    try:
+        await enqueue_event(
+            x_github_event,
+            payload,
+            x_github_delivery if dedup else None,
+        )
+    except QueueFull:
+        if dedup:
+            await release_delivery(x_github_delivery)
+        raise HTTPException(status_code=503, detail="Event queue full")
+
+    return {"status": "queued"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.render()
 
 
 # 👇 This makes `python -m app.main` work like before
@@ -0,0 +1,78 @@
+from typing import Dict, Tuple
+
+
+# In-process metrics registry.
+# Rendered in Prometheus text format by the /metrics route in app.main.
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+_COUNTERS: Dict[str, Dict[_LabelKey, float]] = {}
+_GAUGES: Dict[str, Dict[_LabelKey, float]] = {}
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    """
+    Increment a counter.
+    """
+    series = _COUNTERS.setdefault(name, {})
+    key = _label_key(labels)
+    series[key] = series.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """
+    Set a gauge to an absolute value.
+    """
+    _GAUGES.setdefault(name, {})[_label_key(labels)] = float(value)
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Record one observation (exported as {name}_count / {name}_sum,
+    plus the largest value seen as {name}_max).
+    """
+    inc(f"{name}_count", 1.0, **labels)
+    inc(f"{name}_sum", value, **labels)
+
+    key = _label_key(labels)
+    series = _GAUGES.setdefault(f"{name}_max", {})
+    if value > series.get(key, float("-inf")):
+        series[key] = float(value)
+
+
+def get_counter(name: str, **labels) -> float:
+    return _COUNTERS.get(name, {}).get(_label_key(labels), 0.0)
+
+
+def get_gauge(name: str, **labels) -> float:
+    return _GAUGES.get(name, {}).get(_label_key(labels), 0.0)
+
+
+def _format_series(name: str, key: _LabelKey, value: float) -> str:
+    if not key:
+        return f"{name} {value}"
+
+    labels = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in key
+    )
+    return f"{name}{{{labels}}} {value}"
+
+
+def render() -> str:
+    """
+    Render every metric in Prometheus text exposition format.
+    """
+    lines = []
+
+    for kind, registry in (("counter", _COUNTERS), ("gauge", _GAUGES)):
+        for name in sorted(registry):
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in registry[name].items():
+                lines.append(_format_series(name, key, value))
+
+    return "\n".join(lines) + "\n"
@@ -52,19 +52,3 @@ def build_thread_context(comments: List[Dict[str, Any]]) -> List[Dict[str, str]]
 
     return cleaned
 
-
-def chunk_thread_context(
-    context: List[Dict[str, str]],
-    chunk_size: int = 15,
-) -> List[List[Dict[str, str]]]:
-    """
-    Split thread into chunks of N messages for hierarchical summarization.
-    """
-    if chunk_size <= 0:
-        return []
-
-    chunks: List[List[Dict[str, str]]] = []
-    for i in range(0, len(context), chunk_size):
-        chunks.append(context[i:i + chunk_size])
-
-    return chunks
@@ -19,6 +19,178 @@ GITHUB_APP_ID = os.getenv("GITHUB_APP_ID")
 GITHUB_PRIVATE_KEY = os.getenv("GITHUB_PRIVATE_KEY")
 GITHUB_PRIVATE_KEY_PATH = os.getenv("GITHUB_PRIVATE_KEY_PATH")
 
+# Installation tokens: refresh in the background this long before
+# GitHub's expires_at, and never hand out a token closer than the margin
+GITHUB_TOKEN_REFRESH_AHEAD_SECONDS = float(
+    os.getenv("GITHUB_TOKEN_REFRESH_AHEAD_SECONDS", "600")
+)
+
+GITHUB_TOKEN_EXPIRY_MARGIN_SECONDS = float(
+    os.getenv("GITHUB_TOKEN_EXPIRY_MARGIN_SECONDS", "60")
+)
+
+# =========================================================
+# GitHub HTTP client (shared, pooled)
+# =========================================================
+
+GITHUB_HTTP2_ENABLED = os.getenv("GITHUB_HTTP2_ENABLED", "true").lower() == "true"
+
+GITHUB_HTTP_MAX_CONNECTIONS = int(
+    os.getenv("GITHUB_HTTP_MAX_CONNECTIONS", "100")
+)
+
+GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+
+GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30")
+)
+
+GITHUB_HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("GITHUB_HTTP_CONNECT_TIMEOUT_SECONDS", "5")
+)
+
+GITHUB_HTTP_READ_TIMEOUT_SECONDS = float(
+    os.getenv("GITHUB_HTTP_READ_TIMEOUT_SECONDS", "30")
+)
+
+GITHUB_HTTP_POOL_TIMEOUT_SECONDS = float(
+    os.getenv("GITHUB_HTTP_POOL_TIMEOUT_SECONDS", "10")
+)
+
+# Conditional-request (ETag) cache for github_get
+GITHUB_ETAG_CACHE_ENABLED = (
+    os.getenv("GITHUB_ETAG_CACHE_ENABLED", "true").lower() == "true"
+)
+
+GITHUB_ETAG_CACHE_MAX_ENTRIES = int(
+    os.getenv("GITHUB_ETAG_CACHE_MAX_ENTRIES", "2000")
+)
+
+GITHUB_ETAG_CACHE_TTL_SECONDS = int(
+    os.getenv("GITHUB_ETAG_CACHE_TTL_SECONDS", "86400")
+)
+
+# Link-header pagination for list endpoints
+GITHUB_PAGE_SIZE = int(
+    os.getenv("GITHUB_PAGE_SIZE", "100")
+)
+
+GITHUB_PAGINATION_CONCURRENCY = int(
+    os.getenv("GITHUB_PAGINATION_CONCURRENCY", "4")
+)
+
+# Issues per GraphQL batch lookup (follow-up scanner)
+GITHUB_GRAPHQL_BATCH_SIZE = int(
+    os.getenv("GITHUB_GRAPHQL_BATCH_SIZE", "50")
+)
+
+# Rate-limit budget tracking / adaptive throttling
+# Below this many remaining requests, calls are paced across the window
+GITHUB_RATE_LIMIT_RESERVE = int(
+    os.getenv("GITHUB_RATE_LIMIT_RESERVE", "200")
+)
+
+# Longer waits fail fast with RateLimited instead of sleeping
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = float(
+    os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", "30")
+)
+
+GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS = float(
+    os.getenv("GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS", "60")
+)
+
+# Retries (idempotent methods only) on 5xx / timeouts
+GITHUB_RETRY_ATTEMPTS = int(
+    os.getenv("GITHUB_RETRY_ATTEMPTS", "3")
+)
+
+GITHUB_RETRY_BACKOFF_SECONDS = float(
+    os.getenv("GITHUB_RETRY_BACKOFF_SECONDS", "0.5")
+)
+
+GITHUB_RETRY_MAX_BACKOFF_SECONDS = float(
+    os.getenv("GITHUB_RETRY_MAX_BACKOFF_SECONDS", "8")
+)
+
+# Circuit breaker: consecutive failures before failing fast
+GITHUB_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("GITHUB_CIRCUIT_FAILURE_THRESHOLD", "5")
+)
+
+GITHUB_CIRCUIT_RECOVERY_SECONDS = float(
+    os.getenv("GITHUB_CIRCUIT_RECOVERY_SECONDS", "60")
+)
+
+# Cached maintainer lookups (invalidated by member / team webhooks)
+MAINTAINERS_CACHE_TTL_SECONDS = int(
+    os.getenv("MAINTAINERS_CACHE_TTL_SECONDS", "3600")
+)
+
+# =========================================================
+# Webhook ingestion
+# =========================================================
+
+# Webhooks are acknowledged with 202 and processed by a worker pool
+WEBHOOK_WORKERS = int(
+    os.getenv("WEBHOOK_WORKERS", "4")
+)
+
+WEBHOOK_QUEUE_MAXSIZE = int(
+    os.getenv("WEBHOOK_QUEUE_MAXSIZE", "1000")
+)
+
+# "reject" (answer 503, GitHub can redeliver) or "drop_oldest"
+WEBHOOK_QUEUE_OVERFLOW = os.getenv("WEBHOOK_QUEUE_OVERFLOW", "reject").lower()
+
+WEBHOOK_SHUTDOWN_DRAIN_SECONDS = float(
+    os.getenv("WEBHOOK_SHUTDOWN_DRAIN_SECONDS", "10")
+)
+
+# Redeliveries (same X-GitHub-Delivery) inside this window are skipped.
+# GitHub keeps deliveries for redelivery for 3 days.
+WEBHOOK_DELIVERY_DEDUP_TTL_SECONDS = int(
+    os.getenv("WEBHOOK_DELIVERY_DEDUP_TTL_SECONDS", "259200")
+)
+
+# "queue": in-process worker pool (single replica)
+# "stream": durable Redis Stream consumed by a consumer group
+WEBHOOK_INGEST_MODE = os.getenv("WEBHOOK_INGEST_MODE", "queue").lower()
+
+WEBHOOK_STREAM_GROUP = os.getenv("WEBHOOK_STREAM_GROUP", "yaplate-workers")
+
+# Approximate cap on stream length (XADD MAXLEN ~)
+WEBHOOK_STREAM_MAXLEN = int(
+    os.getenv("WEBHOOK_STREAM_MAXLEN", "100000")
+)
+
+# Consume the stream inside the web process as well
+# (set false when running dedicated `python -m app.workers.event_stream`)
+WEBHOOK_STREAM_CONSUME_IN_APP = (
+    os.getenv("WEBHOOK_STREAM_CONSUME_IN_APP", "true").lower() == "true"
+)
+
+WEBHOOK_STREAM_BATCH_SIZE = int(
+    os.getenv("WEBHOOK_STREAM_BATCH_SIZE", "10")
+)
+
+# Must stay below REDIS_SOCKET_TIMEOUT_SECONDS
+WEBHOOK_STREAM_BLOCK_MS = int(
+    os.getenv("WEBHOOK_STREAM_BLOCK_MS", "2000")
+)
+
+# Pending entries (failed, or left by dead consumers) idle this long
+# are reclaimed and retried
+WEBHOOK_STREAM_CLAIM_IDLE_SECONDS = float(
+    os.getenv("WEBHOOK_STREAM_CLAIM_IDLE_SECONDS", "300")
+)
+
+# Entries delivered more often than this go to the dead-letter stream
+WEBHOOK_STREAM_MAX_DELIVERIES = int(
+    os.getenv("WEBHOOK_STREAM_MAX_DELIVERIES", "5")
+)
+
 # =========================================================
 # Follow-up configuration
 # =========================================================
@@ -33,6 +205,20 @@ FOLLOWUP_SCAN_INTERVAL_SECONDS = float(
     os.getenv("FOLLOWUP_SCAN_INTERVAL_SECONDS", "600")
 )
 
+# Due follow-ups / stales processed concurrently per scan
+# (always one at a time per issue)
+FOLLOWUP_CONCURRENCY = int(
+    os.getenv("FOLLOWUP_CONCURRENCY", "4")
+)
+
+# Due items are claimed FOLLOWUP_CONCURRENCY at a time under a lease,
+# so several scheduler replicas can share the indexes. Leases are
+# renewed while an item is in flight; one not renewed or acked within
+# FOLLOWUP_LEASE_SECONDS (replica crashed) is handed out again.
+FOLLOWUP_LEASE_SECONDS = float(
+    os.getenv("FOLLOWUP_LEASE_SECONDS", "300")
+)
+
 STALE_INTERVAL_HOURS = float(
     os.getenv("STALE_INTERVAL_HOURS", "72")
 )
@@ -41,6 +227,93 @@ MAX_FOLLOWUP_ATTEMPTS = int(
     os.getenv("MAX_FOLLOWUP_ATTEMPTS", "3")
 )
 
+# =========================================================
+# Redis retention
+# =========================================================
+
+# TTL (days) per repo-scoped key family; 0 keeps keys forever.
+# Comment mappings only matter while a comment may still be edited
+# or deleted. Greeting flags are kept by default: once they expire a
+# returning contributor is welcomed as a first-timer again.
+# Stopped / completed follow-up flags never expire; they go when the
+# issue closes or the repo is purged.
+COMMENT_MAP_RETENTION_DAYS = float(
+    os.getenv("COMMENT_MAP_RETENTION_DAYS", "90")
+)
+
+GREETING_RETENTION_DAYS = float(
+    os.getenv("GREETING_RETENTION_DAYS", "0")
+)
+
+# Background sweeper: purges repos that are no longer installed,
+# drops index entries of expired keys and backfills TTLs on keys
+# written before retention existed. One replica sweeps per interval.
+KEY_SWEEP_ENABLED = os.getenv("KEY_SWEEP_ENABLED", "true").lower() == "true"
+
+KEY_SWEEP_INTERVAL_SECONDS = float(
+    os.getenv("KEY_SWEEP_INTERVAL_SECONDS", "3600")
+)
+
+# SCAN / SSCAN COUNT hint and UNLINK batch size
+KEY_SWEEP_BATCH_SIZE = int(
+    os.getenv("KEY_SWEEP_BATCH_SIZE", "200")
+)
+
+# Upper bound on keys examined per second, so sweeping never
+# competes with live traffic
+KEY_SWEEP_MAX_KEYS_PER_SECOND = float(
+    os.getenv("KEY_SWEEP_MAX_KEYS_PER_SECOND", "500")
+)
+
+# Also drop follow-up state and stopped / completed flags of issues
+# found closed on GitHub (batched GraphQL lookups), in case the
+# `closed` webhook was missed
+KEY_SWEEP_PRUNE_CLOSED_ISSUES = (
+    os.getenv("KEY_SWEEP_PRUNE_CLOSED_ISSUES", "true").lower() == "true"
+)
+
+# Issues looked up on GitHub per sweep at most, across all repos
+KEY_SWEEP_MAX_ISSUE_LOOKUPS = int(
+    os.getenv("KEY_SWEEP_MAX_ISSUE_LOOKUPS", "1000")
+)
+
+# Stopped / completed flags looked up per repo and sweep at most; a
+# repo's flags are checked in rotation, oldest first
+KEY_SWEEP_FLAG_LOOKUPS_PER_REPO = int(
+    os.getenv("KEY_SWEEP_FLAG_LOOKUPS_PER_REPO", "100")
+)
+
+# =========================================================
+# Storage backend
+# =========================================================
+
+# "redis": Redis / Redis Cluster at REDIS_URL (several replicas,
+#   WEBHOOK_INGEST_MODE=stream)
+# "embedded": SQLite inside the process; single-node installs
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis").lower()
+
+# embedded: database file (WAL mode) to persist the store across
+# restarts; empty keeps it in memory only
+EMBEDDED_STORE_PATH = os.getenv("EMBEDDED_STORE_PATH", "")
+
+# redis: shards (cluster hash slots) repo data is spread over, and
+# greeting buckets (small hashes) per repo. Both decide where entries
+# live: the values are recorded with the key schema version and a
+# mismatch refuses startup; only change them with a data migration.
+REDIS_KEY_SHARDS = int(
+    os.getenv("REDIS_KEY_SHARDS", "16")
+)
+
+REDIS_GREETING_BUCKETS = int(
+    os.getenv("REDIS_GREETING_BUCKETS", "64")
+)
+
+# redis: each process mirrors the installed-repo set in memory (kept
+# current over pub/sub); full resync interval
+INSTALLED_REPOS_RESYNC_SECONDS = float(
+    os.getenv("INSTALLED_REPOS_RESYNC_SECONDS", "300")
+)
+
 # =========================================================
 # Configurable messages
 # =========================================================
@@ -109,6 +382,20 @@ def validate_llm_settings() -> None:
         raise RuntimeError("GEMINI_API_KEY is not set")
 
 
+def validate_cache_settings() -> None:
+    if CACHE_BACKEND != "redis" and WEBHOOK_INGEST_MODE == "stream":
+        raise RuntimeError("WEBHOOK_INGEST_MODE=stream needs CACHE_BACKEND=redis")
+
+    if REDIS_KEY_SHARDS < 1:
+        raise RuntimeError("REDIS_KEY_SHARDS must be at least 1")
+
+    if REDIS_GREETING_BUCKETS < 1:
+        raise RuntimeError("REDIS_GREETING_BUCKETS must be at least 1")
+
+    if INSTALLED_REPOS_RESYNC_SECONDS <= 0:
+        raise RuntimeError("INSTALLED_REPOS_RESYNC_SECONDS must be positive")
+
+
 def validate_github_settings() -> None:
     if not GITHUB_APP_ID:
         raise RuntimeError("GITHUB_APP_ID is not set")
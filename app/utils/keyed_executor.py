@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from app import metrics
+
+
+class _KeyState:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class KeyedExecutor:
+    """
+    Run work serially per key and concurrently across keys.
+
+    Calls for the same key run one at a time, in the order they called
+    run() (asyncio.Lock wakes waiters FIFO); calls for different keys
+    do not wait on each other. Per-key state is dropped once a key has
+    nothing pending.
+
+    Used with (repo, issue_number) keys so webhook handling and the
+    follow-up scheduler never interleave work on the same issue.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._keys: dict[Hashable, _KeyState] = {}
+        self._pending = 0
+
+    def pending(self, key: Hashable = None) -> int:
+        if key is None:
+            return self._pending
+        state = self._keys.get(key)
+        return state.pending if state else 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        state = self._keys.get(key)
+        if state is None:
+            state = _KeyState()
+            self._keys[key] = state
+
+        state.pending += 1
+        self._pending += 1
+        metrics.observe("keyed_executor_key_depth", state.pending, executor=self.name)
+        self._export()
+
+        try:
+            async with state.lock:
+                return await fn()
+        finally:
+            state.pending -= 1
+            self._pending -= 1
+
+            if state.pending == 0 and self._keys.get(key) is state:
+                del self._keys[key]
+
+            self._export()
+
+    def _export(self):
+        metrics.set_gauge("keyed_executor_pending", self._pending, executor=self.name)
+        metrics.set_gauge("keyed_executor_keys", len(self._keys), executor=self.name)
+
+
+# Shared by app.github.events and the follow-up scheduler
+issue_executor = KeyedExecutor("issue")
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from app import metrics
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight call.
+
+    The first caller starts the work as a task; callers arriving while
+    it runs await the same task and receive the same result (or
+    exception). A cancelled caller does not cancel the shared work.
+
+    Results are shared objects: callers must not mutate them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            metrics.inc("singleflight_coalesced_total", group=self.name)
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
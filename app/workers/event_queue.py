@@ -0,0 +1,165 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app import metrics
+from app.cache.store import release_delivery
+from app.github.events import handle_event
+from app.logger import get_logger
+from app.settings import (
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_MAXSIZE,
+    WEBHOOK_QUEUE_OVERFLOW,
+    WEBHOOK_SHUTDOWN_DRAIN_SECONDS,
+)
+
+
+logger = get_logger("yaplate.workers.event_queue")
+
+OVERFLOW_REJECT = "reject"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+
+
+class QueueFull(Exception):
+    """
+    Raised by enqueue_event when the queue is full and the overflow
+    policy is "reject" (the webhook route answers 503 so GitHub marks
+    the delivery failed and it can be redelivered).
+    """
+    pass
+
+
+@dataclass
+class QueuedEvent:
+    event_type: str
+    payload: Dict[str, Any]
+    # X-GitHub-Delivery id claimed for dedup, if any
+    delivery_id: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+_queue: Optional[asyncio.Queue] = None
+_workers: list[asyncio.Task] = []
+
+
+def _export_depth():
+    metrics.set_gauge("webhook_queue_depth", _queue.qsize() if _queue else 0)
+
+
+async def enqueue_event(
+    event_type: str,
+    payload: Dict[str, Any],
+    delivery_id: Optional[str] = None,
+):
+    """
+    Hand a verified webhook to the worker pool without waiting for it
+    to be handled.
+
+    An event dropped to make room has its delivery id released, so a
+    redelivery of it is not skipped as a duplicate.
+    """
+    if _queue is None:
+        raise RuntimeError("Event workers are not running")
+
+    event = QueuedEvent(event_type, payload, delivery_id)
+
+    try:
+        _queue.put_nowait(event)
+    except asyncio.QueueFull:
+        metrics.inc("webhook_queue_overflow_total", policy=WEBHOOK_QUEUE_OVERFLOW)
+
+        if WEBHOOK_QUEUE_OVERFLOW != OVERFLOW_DROP_OLDEST:
+            logger.warning("Event queue full; rejecting %s", event_type)
+            raise QueueFull(f"Event queue full ({_queue.maxsize})")
+
+        dropped = _queue.get_nowait()
+        _queue.task_done()
+        logger.warning(
+            "Event queue full; dropped oldest %s to admit %s",
+            dropped.event_type,
+            event_type,
+        )
+        _queue.put_nowait(event)
+
+        if dropped.delivery_id:
+            await release_delivery(dropped.delivery_id)
+
+    metrics.inc("webhook_events_enqueued_total", event=event_type)
+    _export_depth()
+
+
+async def _worker(worker_id: int):
+    while True:
+        event = await _queue.get()
+        _export_depth()
+
+        metrics.observe(
+            "webhook_queue_wait_seconds",
+            time.monotonic() - event.enqueued_at,
+        )
+
+        try:
+            await handle_event(event.event_type, event.payload)
+            metrics.inc("webhook_events_processed_total", event=event.event_type)
+        except Exception:
+            # handle_event already guards itself; never let a worker die
+            logger.exception(
+                "Event worker %s failed on %s",
+                worker_id,
+                event.event_type,
+            )
+        finally:
+            _queue.task_done()
+
+
+async def start_event_workers():
+    """
+    Create the bounded queue and its consumer tasks.
+    Called once from the FastAPI lifespan on startup.
+    """
+    global _queue, _workers
+
+    _queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_MAXSIZE)
+    _workers = [
+        asyncio.create_task(_worker(i))
+        for i in range(WEBHOOK_WORKERS)
+    ]
+
+    metrics.set_gauge("webhook_workers", WEBHOOK_WORKERS)
+    _export_depth()
+
+    logger.info(
+        "Event workers started (workers=%s, maxsize=%s, overflow=%s)",
+        WEBHOOK_WORKERS,
+        WEBHOOK_QUEUE_MAXSIZE,
+        WEBHOOK_QUEUE_OVERFLOW,
+    )
+
+
+async def stop_event_workers():
+    """
+    Drain what is already queued (bounded by
+    WEBHOOK_SHUTDOWN_DRAIN_SECONDS), then cancel the workers.
+    """
+    global _queue, _workers
+
+    if _queue is None:
+        return
+
+    try:
+        await asyncio.wait_for(_queue.join(), WEBHOOK_SHUTDOWN_DRAIN_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(
+            "Shutting down with %s undelivered event(s) in queue",
+            _queue.qsize(),
+        )
+
+    for task in _workers:
+        task.cancel()
+
+    await asyncio.gather(*_workers, return_exceptions=True)
+
+    _queue = None
+    _workers = []
+    logger.info("Event workers stopped")
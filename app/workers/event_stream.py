@@ -0,0 +1,333 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Optional
+
+import orjson
+import redis
+
+from app import metrics
+from app.cache.keys import EVENT_STREAM_KEY, EVENT_DEADLETTER_KEY
+from app.cache.redis_client import get_async_redis
+from app.github.events import handle_event
+from app.logger import get_logger
+from app.settings import (
+    WEBHOOK_WORKERS,
+    WEBHOOK_STREAM_GROUP,
+    WEBHOOK_STREAM_MAXLEN,
+    WEBHOOK_STREAM_BATCH_SIZE,
+    WEBHOOK_STREAM_BLOCK_MS,
+    WEBHOOK_STREAM_CLAIM_IDLE_SECONDS,
+    WEBHOOK_STREAM_MAX_DELIVERIES,
+)
+
+
+logger = get_logger("yaplate.workers.event_stream")
+
+_CONSUMER_PREFIX = f"{socket.gethostname()}-{os.getpid()}"
+
+_consumers: list[asyncio.Task] = []
+
+# consumer -> XAUTOCLAIM cursor
+_reclaim_cursors: dict[str, str] = {}
+
+
+# =========================================================
+# Producer (web tier)
+# =========================================================
+
+async def publish_event(
+    event_type: str,
+    body: bytes | str,
+    delivery_id: Optional[str] = None,
+) -> str:
+    """
+    Append a verified delivery (raw body) to the event stream.
+
+    Raises redis.RedisError if the append fails, so the webhook route
+    can answer 5xx and GitHub keeps the delivery for redelivery.
+    """
+    if isinstance(body, bytes):
+        body = body.decode()
+
+    entry_id = await get_async_redis().xadd(
+        EVENT_STREAM_KEY,
+        {
+            "event": event_type,
+            "delivery": delivery_id or "",
+            "payload": body,
+            "received_at": str(time.time()),
+        },
+        maxlen=WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+    metrics.inc("webhook_stream_published_total", event=event_type)
+    return entry_id
+
+
+# =========================================================
+# Consumer group
+# =========================================================
+
+async def ensure_group():
+    """
+    Create the consumer group (and the stream) if missing.
+    """
+    try:
+        await get_async_redis().xgroup_create(
+            EVENT_STREAM_KEY,
+            WEBHOOK_STREAM_GROUP,
+            id="0",
+            mkstream=True,
+        )
+        logger.info("Created consumer group %s", WEBHOOK_STREAM_GROUP)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+async def _read(consumer: str):
+    resp = await get_async_redis().xreadgroup(
+        WEBHOOK_STREAM_GROUP,
+        consumer,
+        {EVENT_STREAM_KEY: ">"},
+        count=WEBHOOK_STREAM_BATCH_SIZE,
+        block=WEBHOOK_STREAM_BLOCK_MS,
+    )
+    if not resp:
+        return []
+    return resp[0][1]
+
+
+async def _reclaim(consumer: str):
+    """
+    XAUTOCLAIM entries left pending by dead consumers, continuing from
+    where this consumer's previous call stopped (back to the start once
+    the whole pending list has been walked).
+    Returns [(entry_id, fields, times_delivered)].
+    """
+    r = get_async_redis()
+
+    resp = await r.xautoclaim(
+        EVENT_STREAM_KEY,
+        WEBHOOK_STREAM_GROUP,
+        consumer,
+        min_idle_time=int(WEBHOOK_STREAM_CLAIM_IDLE_SECONDS * 1000),
+        start_id=_reclaim_cursors.get(consumer, "0-0"),
+        count=WEBHOOK_STREAM_BATCH_SIZE,
+    )
+    if not resp:
+        return []
+
+    _reclaim_cursors[consumer] = resp[0]
+
+    # Trimmed from the stream while pending (Redis 6.2; Redis 7 drops
+    # them from the pending list itself)
+    trimmed = [entry_id for entry_id, fields in resp[1] if fields is None]
+    if trimmed:
+        await r.xack(EVENT_STREAM_KEY, WEBHOOK_STREAM_GROUP, *trimmed)
+
+    claimed = [(entry_id, fields) for entry_id, fields in resp[1] if fields is not None]
+    if not claimed:
+        return []
+
+    # Delivery counts of the whole batch in one XPENDING over its id
+    # range; ids it misses (crowded out by this consumer's other
+    # pending entries in the range) are looked up one by one
+    pending = await r.xpending_range(
+        EVENT_STREAM_KEY,
+        WEBHOOK_STREAM_GROUP,
+        min=claimed[0][0],
+        max=claimed[-1][0],
+        count=len(claimed) + WEBHOOK_STREAM_BATCH_SIZE,
+        consumername=consumer,
+    )
+    times = {p["message_id"]: p["times_delivered"] for p in pending}
+
+    out = []
+    for entry_id, fields in claimed:
+        if entry_id not in times:
+            pending = await r.xpending_range(
+                EVENT_STREAM_KEY,
+                WEBHOOK_STREAM_GROUP,
+                min=entry_id,
+                max=entry_id,
+                count=1,
+            )
+            times[entry_id] = pending[0]["times_delivered"] if pending else 1
+        out.append((entry_id, fields, times[entry_id]))
+
+    return out
+
+
+async def _ack(entry_id: str):
+    await get_async_redis().xack(EVENT_STREAM_KEY, WEBHOOK_STREAM_GROUP, entry_id)
+
+
+async def _dead_letter(entry_id: str, fields: dict, reason: str):
+    r = get_async_redis()
+    pipe = r.pipeline(transaction=True)
+    pipe.xadd(
+        EVENT_DEADLETTER_KEY,
+        {**fields, "source_id": entry_id, "reason": reason},
+        maxlen=WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+    pipe.xack(EVENT_STREAM_KEY, WEBHOOK_STREAM_GROUP, entry_id)
+    await pipe.execute()
+
+
+async def _process(entry_id: str, fields: dict):
+    event_type = fields.get("event", "")
+
+    try:
+        payload = orjson.loads(fields.get("payload") or "")
+    except orjson.JSONDecodeError:
+        logger.error("Undecodable stream entry %s; dead-lettering", entry_id)
+        await _dead_letter(entry_id, fields, "invalid payload")
+        metrics.inc("webhook_stream_dead_lettered_total", reason="invalid")
+        return
+
+    try:
+        received_at = float(fields.get("received_at", "0"))
+        metrics.observe("webhook_queue_wait_seconds", max(0.0, time.time() - received_at))
+    except ValueError:
+        pass
+
+    # Left pending (and reclaimed later) if this raises or the
+    # process dies before the ack
+    await handle_event(event_type, payload, raise_errors=True)
+
+    await _ack(entry_id)
+    metrics.inc("webhook_events_processed_total", event=event_type)
+
+
+async def _handle(entry_id: str, fields: dict):
+    """
+    Process one entry. A failed entry stays pending: it is reclaimed
+    once idle for WEBHOOK_STREAM_CLAIM_IDLE_SECONDS and dead-lettered
+    after WEBHOOK_STREAM_MAX_DELIVERIES attempts.
+    """
+    try:
+        await _process(entry_id, fields)
+    except Exception:
+        logger.exception("Stream entry %s failed; left pending for retry", entry_id)
+        metrics.inc("webhook_stream_failed_total", event=fields.get("event", ""))
+
+
+async def _poll(consumer: str, reclaim: bool):
+    """
+    One consumer round: optionally reclaim idle pending entries, then
+    read new ones.
+    """
+    if reclaim:
+        for entry_id, fields, times in await _reclaim(consumer):
+            metrics.inc("webhook_stream_reclaimed_total")
+
+            if times > WEBHOOK_STREAM_MAX_DELIVERIES:
+                logger.error(
+                    "Stream entry %s delivered %s times; dead-lettering",
+                    entry_id,
+                    times,
+                )
+                await _dead_letter(entry_id, fields, f"delivered {times} times")
+                metrics.inc("webhook_stream_dead_lettered_total", reason="attempts")
+                continue
+
+            await _handle(entry_id, fields)
+
+    for entry_id, fields in await _read(consumer):
+        await _handle(entry_id, fields)
+
+
+async def _consume(consumer: str):
+    last_reclaim = 0.0
+
+    while True:
+        try:
+            now = time.monotonic()
+
+            reclaim = now - last_reclaim >= WEBHOOK_STREAM_CLAIM_IDLE_SECONDS / 2
+            if reclaim:
+                last_reclaim = now
+
+            await _poll(consumer, reclaim)
+
+        except asyncio.CancelledError:
+            raise
+        except redis.RedisError:
+            logger.exception("Event stream consumer %s: Redis error", consumer)
+            await asyncio.sleep(1)
+        except Exception:
+            logger.exception("Event stream consumer %s failed", consumer)
+            await asyncio.sleep(1)
+
+
+async def start_stream_consumers(count: int = WEBHOOK_WORKERS):
+    """
+    Start `count` consumers in this process, each a member of
+    WEBHOOK_STREAM_GROUP with its own consumer name.
+    """
+    global _consumers
+
+    await ensure_group()
+
+    _consumers = [
+        asyncio.create_task(_consume(f"{_CONSUMER_PREFIX}-{i}"))
+        for i in range(count)
+    ]
+
+    logger.info(
+        "Event stream consumers started (group=%s, consumers=%s)",
+        WEBHOOK_STREAM_GROUP,
+        count,
+    )
+
+
+async def stop_stream_consumers():
+    """
+    Cancel the consumers. Anything read but not acked stays pending
+    and is reclaimed by another consumer.
+    """
+    global _consumers
+
+    for task in _consumers:
+        task.cancel()
+
+    await asyncio.gather(*_consumers, return_exceptions=True)
+
+    _consumers = []
+    _reclaim_cursors.clear()
+    logger.info("Event stream consumers stopped")
+
+
+async def run_worker():
+    from app.cache.installed_repos import start_installed_repos_sync, stop_installed_repos_sync
+    from app.cache.migrations import check_key_schema
+    from app.cache.redis_client import close_async_redis
+    from app.github.http_client import init_http_client, close_http_client
+    from app.settings import validate_cache_settings, validate_github_settings
+
+    validate_github_settings()
+    validate_cache_settings()
+    await check_key_schema()
+    await init_http_client()
+    await start_installed_repos_sync()
+    await start_stream_consumers()
+
+    try:
+        await asyncio.gather(*_consumers)
+    finally:
+        await stop_stream_consumers()
+        await stop_installed_repos_sync()
+        await close_http_client()
+        await close_async_redis()
+
+
+# Standalone worker: `python -m app.workers.event_stream`
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        pass
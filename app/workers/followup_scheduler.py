@@ -1,13 +1,20 @@
 import asyncio
 import time
+from typing import Optional
 
 from app.logger import get_logger
 from app.cache.store import (
-    get_due_followups,
+    claim_due_followups,
+    ack_followup,
+    release_followup,
+    renew_followup_lease,
     get_followup_data,
     mark_followup_sent,
     schedule_stale,
-    get_due_stales,
+    claim_due_stales,
+    ack_stale,
+    release_stale,
+    renew_stale_lease,
     get_stale_data,
     cancel_stale,
     cancel_followup,
@@ -20,19 +27,29 @@ from app.cache.store import (
     mark_user_seen,
     is_followup_stopped,
     is_followup_completed,
-    mark_followup_completed
+    mark_followup_completed,
+    split_issue_key,
+    get_repo_installation,
 )
 from app.github.api import (
     github_post,
     github_get,
+    get_issues_state,
     RepoUnavailable,
-    list_installed_repos,
-    list_open_assigned_issues,
+    RateLimited,
+    CircuitOpen,
+    iter_installed_repos,
+    iter_open_assigned_issues,
 )
+from app.github.auth import installation_context, list_app_installations
+from app.github.circuit_breaker import github_breaker
+from app.utils.keyed_executor import issue_executor
 from app.nlp.lingo_client import translate
 from app.nlp.language_detect import detect_with_fallback
 from app.settings import (
     FOLLOWUP_SCAN_INTERVAL_SECONDS,
+    FOLLOWUP_CONCURRENCY,
+    FOLLOWUP_LEASE_SECONDS,
     STALE_INTERVAL_HOURS,
     MAX_FOLLOWUP_ATTEMPTS,
     FOLLOWUP_DEFAULT_INTERVAL_HOURS,
@@ -44,86 +61,112 @@ from app.settings import (
 logger = get_logger("yaplate.workers.followup")
 
 
+class LeaseLost(Exception):
+    """
+    Raised when a claimed item's lease expired before it was posted:
+    another replica may own it now, so it is left alone (not posted,
+    acked or released).
+    """
+    pass
+
+
+async def _ensure_lease(renew, key: str):
+    if not await renew(key, FOLLOWUP_LEASE_SECONDS):
+        raise LeaseLost(key)
+
+
 # =========================================================
 # Startup reconciliation
 # =========================================================
 
+async def _reconcile_issue(full: str, repo_id: int, issue: dict, now: float):
+    number = issue.get("number")
+    if number is None:
+        return
+
+    # Seed greeting state
+    author = issue.get("user", {}).get("login")
+    if author:
+        await mark_user_seen(repo_id, author, repo=full)
+
+    assignees = issue.get("assignees", [])
+    for a in assignees:
+        login = a.get("login")
+        if login:
+            await mark_user_seen(repo_id, login, repo=full)
+
+    labels = [l.get("name", "").lower() for l in issue.get("labels", [])]
+
+    if not assignees:
+        return
+    if "stale" in labels:
+        return
+    if await has_followup(full, number):
+        return
+    if await is_followup_stopped(full, number):
+        return
+    if await is_followup_completed(full, number):
+        return
+    assignee = assignees[0].get("login")
+    if not assignee:
+        return
+
+    title = issue.get("title", "")
+    body = issue.get("body") or ""
+
+    lang = "en" if not body.strip() else await detect_with_fallback(title, body)
+    due_at = now + FOLLOWUP_DEFAULT_INTERVAL_HOURS * 3600
+
+    await schedule_followup(
+        repo=full,
+        issue_number=number,
+        assignee=assignee,
+        lang=lang,
+        due_at=due_at,
+    )
+
+
+async def _reconcile_installation(installation_id: int, installed: set, now: float):
+    # Streamed across all pages, so large installations are
+    # reconciled in full.
+    async for repo_obj in iter_installed_repos():
+        full = repo_obj.get("full_name")
+        repo_id = repo_obj.get("id")
+
+        if not full or repo_id is None:
+            continue
+
+        installed.add(full)
+        await mark_repo_installed(full, installation_id)
+
+        try:
+            async for issue in iter_open_assigned_issues(full):
+                await _reconcile_issue(full, repo_id, issue, now)
+        except RepoUnavailable:
+            continue
+        except Exception:
+            logger.exception("Failed to list assigned issues for %s", full)
+            continue
+
+
 async def reconcile_on_startup():
     """
     Rebuild authoritative state after downtime.
     """
     try:
-        result = await list_installed_repos()
-        repos = result.get("repositories", [])
         now = time.time()
 
         installed = set()
 
-        for repo_obj in repos:
-            full = repo_obj.get("full_name")
-            repo_id = repo_obj.get("id")
-
-            if not full or repo_id is None:
+        for installation in await list_app_installations():
+            installation_id = installation.get("id")
+            if installation_id is None:
                 continue
 
-            installed.add(full)
-            mark_repo_installed(full)
+            with installation_context(installation_id):
+                await _reconcile_installation(installation_id, installed, now)
 
-            try:
-                issues = await list_open_assigned_issues(full)
-            except RepoUnavailable:
-                continue
-            except Exception:
-                logger.exception("Failed to list assigned issues for %s", full)
-                continue
-
-            for issue in issues:
-                number = issue.get("number")
-                if number is None:
-                    continue
-
-                # Seed greeting state
-                author = issue.get("user", {}).get("login")
-                if author:
-                    mark_user_seen(repo_id, author)
-
-                assignees = issue.get("assignees", [])
-                for a in assignees:
-                    login = a.get("login")
-                    if login:
-                        mark_user_seen(repo_id, login)
-
-                labels = [l.get("name", "").lower() for l in issue.get("labels", [])]
-
-                if not assignees:
-                    continue
-                if "stale" in labels:
-                    continue
-                if has_followup(full, number):
-                    continue
-                if is_followup_stopped(full, number):
-                    continue
-                if is_followup_completed(full, number):
-                    continue
-                assignee = assignees[0].get("login")
-                if not assignee:
-                    continue
-
-                title = issue.get("title", "")
-                body = issue.get("body") or ""
-
-                lang = "en" if not body.strip() else await detect_with_fallback(title, body)
-                due_at = now + FOLLOWUP_DEFAULT_INTERVAL_HOURS * 3600
-
-                schedule_followup(
-                    repo=full,
-                    issue_number=number,
-                    assignee=assignee,
-                    lang=lang,
-                    due_at=due_at,
-                )
-
-        purge_orphaned_repos(installed)
+        await purge_orphaned_repos(installed)
 
     except Exception:
         logger.exception("Startup reconciliation failed")
@@ -132,8 +175,16 @@ async def reconcile_on_startup():
 # =========================================================
 # Follow-up processing
 # =========================================================
-async def process_followup(key: str):
-    data = get_followup_data(key)
+async def _fetch_issue(repo: str, issue_number: int, prefetched: Optional[dict]):
+    issue = (prefetched or {}).get((repo, issue_number))
+    if issue is not None:
+        return issue
+
+    return await github_get(f"/repos/{repo}/issues/{issue_number}")
+
+
+async def process_followup(key: str, prefetched: Optional[dict] = None):
+    data = await get_followup_data(key)
     if not data or str(data.get("sent")) == "1":
         return
 
@@ -146,9 +197,9 @@ async def process_followup(key: str):
     issue_number = int(issue_number)
 
     # 🔒 HARD STOP GUARD (correct place)
-    if is_followup_stopped(repo, issue_number) or is_followup_completed(repo, issue_number):
-        cancel_followup(repo, issue_number)
-        cancel_stale(repo, issue_number)
+    if await is_followup_stopped(repo, issue_number) or await is_followup_completed(repo, issue_number):
+        await cancel_followup(repo, issue_number)
+        await cancel_stale(repo, issue_number)
         logger.info(
             "Skipping follow-up for %s #%s (terminal state)",
             repo,
@@ -156,59 +207,64 @@ async def process_followup(key: str):
         )
         return
 
-    if not is_repo_installed(repo):
-        cancel_followup(repo, issue_number)
-        cancel_stale(repo, issue_number)
+    if not await is_repo_installed(repo):
+        await cancel_followup(repo, issue_number)
+        await cancel_stale(repo, issue_number)
         return
 
     attempt = int(data.get("attempt", 1))
     if attempt > MAX_FOLLOWUP_ATTEMPTS:
-        cancel_followup(repo, issue_number)
-        mark_followup_completed(repo, issue_number)
+        await cancel_followup(repo, issue_number)
+        await mark_followup_completed(repo, issue_number)
         return
 
     assignee = data.get("assignee")
     lang = data.get("lang", "en")
 
     try:
-        issue = await github_get(f"/repos/{repo}/issues/{issue_number}")
+        issue = await _fetch_issue(repo, issue_number, prefetched)
     except RepoUnavailable:
-        unmark_repo_installed(repo)
+        await unmark_repo_installed(repo)
         return
 
     labels = [l.get("name", "").lower() for l in issue.get("labels", [])]
     if "stale" in labels:
-        cancel_followup(repo, issue_number)
-        cancel_stale(repo, issue_number)
+        await cancel_followup(repo, issue_number)
+        await cancel_stale(repo, issue_number)
         return
 
     # Validate assignee
     if "pull_request" in issue:
         if issue.get("user", {}).get("login") != assignee:
+            # Stays due; re-checked next pass
+            await release_followup(key)
             return
         template = FOLLOWUP_PR_MESSAGE
     else:
         assignees = [u.get("login") for u in issue.get("assignees", [])]
         if assignee not in assignees:
+            await release_followup(key)
             return
         template = FOLLOWUP_ISSUE_MESSAGE
 
     translated = await translate(template, lang)
     body = f"@{assignee}\n\n{translated}"
 
+    await _ensure_lease(renew_followup_lease, key)
+
     try:
         await github_post(
             f"/repos/{repo}/issues/{issue_number}/comments",
             {"body": body},
         )
     except RepoUnavailable:
-        unmark_repo_installed(repo)
+        await unmark_repo_installed(repo)
         return
 
-    mark_followup_sent(key)
+    await mark_followup_sent(key)
 
     stale_at = time.time() + STALE_INTERVAL_HOURS * 3600
-    schedule_stale(repo, issue_number, lang, stale_at)
+    await schedule_stale(repo, issue_number, lang, stale_at)
 
 
 
@@ -216,8 +272,8 @@ async def process_followup(key: str):
 # Stale processing
 # =========================================================
 
-async def process_stale(key: str):
-    data = get_stale_data(key)
+async def process_stale(key: str, prefetched: Optional[dict] = None):
+    data = await get_stale_data(key)
     if not data:
         return
 
@@ -229,26 +285,28 @@ async def process_stale(key: str):
 
     issue_number = int(issue_number)
 
-    if not is_repo_installed(repo):
-        cancel_stale(repo, issue_number)
-        cancel_followup(repo, issue_number)
+    if not await is_repo_installed(repo):
+        await cancel_stale(repo, issue_number)
+        await cancel_followup(repo, issue_number)
         return
 
     lang = data.get("lang", "en")
 
     try:
-        issue = await github_get(f"/repos/{repo}/issues/{issue_number}")
+        issue = await _fetch_issue(repo, issue_number, prefetched)
     except RepoUnavailable:
-        unmark_repo_installed(repo)
+        await unmark_repo_installed(repo)
         return
 
     labels = [l.get("name", "").lower() for l in issue.get("labels", [])]
     if "stale" in labels:
-        cancel_stale(repo, issue_number)
+        await cancel_stale(repo, issue_number)
         return
 
     translated = await translate(STALE_MESSAGE, lang)
 
+    await _ensure_lease(renew_stale_lease, key)
+
     try:
         await github_post(
             f"/repos/{repo}/issues/{issue_number}/comments",
@@ -259,32 +317,161 @@ async def process_stale(key: str):
             {"labels": ["stale"]},
         )
     except RepoUnavailable:
-        unmark_repo_installed(repo)
+        await unmark_repo_installed(repo)
         return
 
-    cancel_stale(repo, issue_number)
+    await cancel_stale(repo, issue_number)
 
 
 # =========================================================
 # Main worker loop
 # =========================================================
 
+async def _prefetch_issues(keys: list[str]) -> dict:
+    """
+    Resolve issue state for a whole due batch in a few GraphQL calls.
+    Anything missing falls back to a per-issue REST lookup.
+    """
+    by_installation: dict[Optional[int], list] = {}
+    for ref in map(split_issue_key, keys):
+        if ref:
+            installation_id = await get_repo_installation(ref[0])
+            by_installation.setdefault(installation_id, []).append(ref)
+
+    prefetched: dict = {}
+
+    for installation_id, refs in by_installation.items():
+        try:
+            with installation_context(installation_id):
+                prefetched.update(await get_issues_state(refs))
+        except (RateLimited, CircuitOpen):
+            raise
+        except Exception:
+            logger.exception(
+                "Batched issue lookup failed (installation=%s); falling back to REST",
+                installation_id,
+            )
+
+    return prefetched
+
+
+async def _installation_for(key: str) -> Optional[int]:
+    ref = split_issue_key(key)
+    return await get_repo_installation(ref[0]) if ref else None
+
+
+async def _keep_leases(in_flight: set, renew):
+    """
+    Renew the leases of in-flight keys well before they expire, so
+    GitHub waits (rate limits, retries) cannot hand them to another
+    replica mid-item.
+    """
+    while True:
+        await asyncio.sleep(FOLLOWUP_LEASE_SECONDS / 3)
+        for key in list(in_flight):
+            await renew(key, FOLLOWUP_LEASE_SECONDS)
+
+
+async def _run_due(keys: list[str], process, ack, release, renew, prefetched: dict):
+    """
+    Process claimed keys concurrently (bounded by FOLLOWUP_CONCURRENCY),
+    serialized per issue with webhook handling through issue_executor,
+    keeping their leases alive meanwhile.
+
+    Each key is acked once processed, or released (due again) if it
+    failed; a key whose lease was lost is left to its new owner.
+    Re-raises the first RateLimited / CircuitOpen so the pass is
+    reported like before; other failures are logged per key.
+    """
+    semaphore = asyncio.Semaphore(FOLLOWUP_CONCURRENCY)
+    in_flight = set(keys)
+
+    async def _one(key: str):
+        try:
+            async with semaphore:
+                with installation_context(await _installation_for(key)):
+                    await process(key, prefetched)
+        finally:
+            in_flight.discard(key)
+
+    heartbeat = asyncio.create_task(_keep_leases(in_flight, renew))
+    try:
+        results = await asyncio.gather(
+            *(issue_executor.run(split_issue_key(key) or key, lambda k=key: _one(k)) for key in keys),
+            return_exceptions=True,
+        )
+    finally:
+        heartbeat.cancel()
+
+    stop = None
+
+    for key, result in zip(keys, results):
+        if not isinstance(result, Exception):
+            await ack(key)
+            continue
+
+        if isinstance(result, LeaseLost):
+            logger.warning("Lease on %s expired mid-item; left to its new owner", key)
+            continue
+
+        await release(key)
+
+        if isinstance(result, (RateLimited, CircuitOpen)):
+            stop = stop or result
+        else:
+            logger.error("Failed to process %s", key, exc_info=result)
+
+    if stop is not None:
+        raise stop
+
+
+async def _run_queue(now: float, claim, process, ack, release, renew):
+    """
+    Claim and process one queue's due items, FOLLOWUP_CONCURRENCY at a
+    time, until none are left. Claiming just before processing keeps
+    leases short-lived; items released during the pass are due after
+    `now` and wait for the next one.
+    """
+    while True:
+        keys = await claim(now, FOLLOWUP_LEASE_SECONDS, FOLLOWUP_CONCURRENCY)
+        if not keys:
+            return
+
+        try:
+            prefetched = await _prefetch_issues(keys)
+        except (RateLimited, CircuitOpen):
+            for key in keys:
+                await release(key)
+            raise
+
+        await _run_due(keys, process, ack, release, renew, prefetched)
+
+
+async def _run_pass(now: float):
+    await _run_queue(now, claim_due_followups, process_followup, ack_followup, release_followup, renew_followup_lease)
+    await _run_queue(now, claim_due_stales, process_stale, ack_stale, release_stale, renew_stale_lease)
+
+
 async def followup_loop():
     await reconcile_on_startup()
 
     while True:
         try:
-            now = time.time()
-
-            for key in get_due_followups(now):
-                await process_followup(key)
+            if not github_breaker.is_available():
+                logger.warning("GitHub circuit open; skipping follow-up pass")
+                await asyncio.sleep(FOLLOWUP_SCAN_INTERVAL_SECONDS)
+                continue
 
-            for key in get_due_stales(now):
-                await process_stale(key)
+            await _run_pass(time.time())
 
         except asyncio.CancelledError:
             logger.info("Follow-up scheduler cancelled")
             raise
+        except RateLimited as exc:
+            # Claimed items were released and are picked up next pass
+            logger.warning("Follow-up pass paused by GitHub rate limit: %s", exc)
+        except CircuitOpen:
+            logger.warning("GitHub degraded; follow-up pass stopped early")
         except Exception:
             logger.exception("Follow-up scheduler error")
 
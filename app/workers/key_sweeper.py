@@ -0,0 +1,331 @@
+import asyncio
+import os
+import socket
+import time
+
+from app import metrics
+from app.cache.keys import (
+    REPO_KEYS,
+    KEY_SWEEP_LOCK,
+    KEY_SWEEP_FLAG_CURSOR,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+    key_family,
+    split_issue_key,
+)
+from app.cache.redis_client import get_async_redis
+from app.cache.backends import RETENTION_SECONDS
+from app.cache.backends.redis import (
+    BUCKETED_FAMILIES,
+    cancel_followup,
+    get_all_installed_repos,
+    get_repo_installation,
+    is_repo_installed,
+    purge_repo,
+    resume_purges,
+)
+from app.github.api import get_issues_state, RateLimited, CircuitOpen
+from app.github.auth import installation_context
+from app.github.circuit_breaker import github_breaker
+from app.logger import get_logger
+from app.settings import (
+    KEY_SWEEP_INTERVAL_SECONDS,
+    KEY_SWEEP_BATCH_SIZE,
+    KEY_SWEEP_MAX_KEYS_PER_SECOND,
+    KEY_SWEEP_PRUNE_CLOSED_ISSUES,
+    KEY_SWEEP_MAX_ISSUE_LOOKUPS,
+    KEY_SWEEP_FLAG_LOOKUPS_PER_REPO,
+)
+
+
+logger = get_logger("yaplate.workers.key_sweeper")
+
+_OWNER = f"{socket.gethostname()}-{os.getpid()}"
+
+_FLAG_FAMILIES = (FOLLOWUP_STOPPED, FOLLOWUP_COMPLETED)
+
+
+async def _pace(examined: int):
+    """
+    Sleep so the sweep averages at most KEY_SWEEP_MAX_KEYS_PER_SECOND.
+    """
+    await asyncio.sleep(examined / KEY_SWEEP_MAX_KEYS_PER_SECOND)
+
+
+async def _prune_buckets(r, buckets: list[str]) -> int:
+    """
+    Drop bucket entries written longer ago than their family's
+    retention (a bucket's own TTL is refreshed by every write).
+    """
+    now = time.time()
+
+    read = r.pipeline(transaction=False)
+    for key in buckets:
+        read.hgetall(key)
+    contents = await read.execute()
+
+    write = r.pipeline(transaction=False)
+    pruned = 0
+
+    for key, entries in zip(buckets, contents):
+        cutoff = now - RETENTION_SECONDS[key_family(key)[0]]
+        old = [field for field, written_at in entries.items() if float(written_at) < cutoff]
+        if old:
+            write.hdel(key, *old)
+            pruned += len(old)
+
+    if pruned:
+        await write.execute()
+
+    return pruned
+
+
+async def _next_flags(r, repo: str, flag_buckets: list[str], limit: int) -> dict[int, list[str]]:
+    """
+    Pick up to `limit` stopped / completed flags of a repo to look up,
+    continuing after the repo's KEY_SWEEP_FLAG_CURSOR in (written_at,
+    issue number) order, and move the cursor past them (back to the
+    start once every flag has had its turn).
+
+    Returns {issue number: [buckets flagging it]}.
+    """
+    read = r.pipeline(transaction=False)
+    for key in flag_buckets:
+        read.hgetall(key)
+    read.hget(KEY_SWEEP_FLAG_CURSOR, repo)
+    *contents, cursor = await read.execute()
+
+    entries = sorted(
+        (float(written_at), int(field), key)
+        for key, fields in zip(flag_buckets, contents)
+        for field, written_at in fields.items()
+    )
+
+    after = (-1.0, -1)
+    if cursor:
+        written_at, number = cursor.split(":")
+        after = (float(written_at), int(number))
+
+    due = [entry for entry in entries if entry[:2] > after]
+    picked = due[:limit]
+
+    if len(picked) < len(due):
+        written_at, number, _ = picked[-1]
+        await r.hset(KEY_SWEEP_FLAG_CURSOR, repo, f"{written_at}:{number}")
+    else:
+        await r.hdel(KEY_SWEEP_FLAG_CURSOR, repo)
+
+    flags: dict[int, list[str]] = {}
+    for _, number, key in picked:
+        flags.setdefault(number, []).append(key)
+    return flags
+
+
+async def _prune_closed(
+    r,
+    repo: str,
+    issues: set[int],
+    flag_buckets: list[str],
+    budget: int,
+) -> tuple[int, int]:
+    """
+    Drop the follow-up / stale state and stopped / completed flags of
+    issues and PRs that are closed (or merged) on GitHub, as the
+    `closed` webhook does, in case it was missed.
+
+    Looks up at most `budget` issues: every issue with follow-up /
+    stale state first, then up to KEY_SWEEP_FLAG_LOOKUPS_PER_REPO
+    flags in rotation (flags pile up, live state does not). Issues
+    GitHub does not resolve are kept. Returns (issues pruned, lookups
+    made).
+    """
+    issues = set(sorted(issues)[:budget])
+    limit = min(KEY_SWEEP_FLAG_LOOKUPS_PER_REPO, budget - len(issues))
+    flags = await _next_flags(r, repo, flag_buckets, limit) if limit > 0 and flag_buckets else {}
+
+    numbers = issues | flags.keys()
+    if not numbers:
+        return 0, 0
+
+    with installation_context(await get_repo_installation(repo)):
+        found = await get_issues_state((repo, n) for n in numbers)
+
+    closed = {
+        number
+        for (_, number), issue in found.items()
+        if issue.get("state") in ("closed", "merged")
+    }
+
+    for number in issues & closed:
+        await cancel_followup(repo, number)
+
+    write = r.pipeline(transaction=False)
+    for number in flags.keys() & closed:
+        for key in flags[number]:
+            write.hdel(key, number)
+    await write.execute()
+
+    await _pace(len(numbers))
+    return len(closed), len(numbers)
+
+
+async def _sweep_index(r, index: str):
+    """
+    Walk one repo index with SSCAN: drop entries whose key has expired,
+    give keys written without a TTL their family's retention and prune
+    expired bucket entries.
+
+    Returns (dropped, expiring, pruned, issues, flag_buckets): issues
+    with follow-up / stale state and the stopped / completed buckets,
+    for _prune_closed.
+    """
+    dropped = expiring = pruned = 0
+    issues: set[int] = set()
+    flag_buckets: list[str] = []
+    cursor = 0
+
+    while True:
+        cursor, members = await r.sscan(index, cursor, count=KEY_SWEEP_BATCH_SIZE)
+
+        if members:
+            read = r.pipeline(transaction=False)
+            for key in members:
+                read.ttl(key)
+            ttls = await read.execute()
+
+            gone = [key for key, ttl in zip(members, ttls) if ttl == -2]
+            unbounded = [
+                (key, RETENTION_SECONDS.get(key_family(key)[0]))
+                for key, ttl in zip(members, ttls)
+                if ttl == -1
+            ]
+            unbounded = [(key, ttl) for key, ttl in unbounded if ttl]
+
+            if gone or unbounded:
+                write = r.pipeline(transaction=False)
+                if gone:
+                    write.srem(index, *gone)
+                for key, ttl in unbounded:
+                    write.expire(key, ttl)
+                await write.execute()
+
+            buckets = [
+                key
+                for key, ttl in zip(members, ttls)
+                if ttl != -2
+                and key_family(key)[0] in BUCKETED_FAMILIES
+                and RETENTION_SECONDS.get(key_family(key)[0])
+            ]
+            if buckets:
+                pruned += await _prune_buckets(r, buckets)
+
+            for key, ttl in zip(members, ttls):
+                if ttl == -2:
+                    continue
+                ref = split_issue_key(key)
+                if ref:
+                    issues.add(ref[1])
+                elif key_family(key)[0] in _FLAG_FAMILIES:
+                    flag_buckets.append(key)
+
+            dropped += len(gone)
+            expiring += len(unbounded)
+            await _pace(len(members))
+
+        if cursor == 0:
+            return dropped, expiring, pruned, issues, flag_buckets
+
+
+async def sweep_once() -> dict:
+    """
+    Finishes interrupted installation purges, then makes one pass over
+    every repo index:
+      - repos no longer installed are purged (UNLINK);
+      - index entries of expired keys are dropped;
+      - keys without a TTL get their family's retention;
+      - greeting bucket entries past retention are removed;
+      - follow-up / stale state and stopped / completed flags of
+        closed issues are removed (KEY_SWEEP_PRUNE_CLOSED_ISSUES), at
+        most KEY_SWEEP_MAX_ISSUE_LOOKUPS GitHub lookups per sweep.
+
+    Comment mappings do not record their issue: they are left to
+    COMMENT_MAP_RETENTION_DAYS.
+    """
+    r = get_async_redis()
+    started = time.monotonic()
+    stats = {
+        "repos_purged": await resume_purges(),
+        "entries_dropped": 0,
+        "ttl_backfilled": 0,
+        "bucket_entries_pruned": 0,
+        "closed_issues_pruned": 0,
+    }
+    check_closed = KEY_SWEEP_PRUNE_CLOSED_ISSUES and github_breaker.is_available()
+    lookups_left = KEY_SWEEP_MAX_ISSUE_LOOKUPS
+
+    installed = await get_all_installed_repos()
+    if not installed:
+        # An empty answer is more likely an outage than zero installs
+        logger.warning("No installed repos known; skipping repo purge this sweep")
+
+    examined = 0
+    async for index in r.scan_iter(f"yaplate:{{s*}}:{REPO_KEYS}:*", count=KEY_SWEEP_BATCH_SIZE):
+        repo = key_family(index)[1]
+
+        if installed and repo not in installed and not await is_repo_installed(repo):
+            await purge_repo(repo)
+            await r.hdel(KEY_SWEEP_FLAG_CURSOR, repo)
+            stats["repos_purged"] += 1
+        else:
+            dropped, expiring, pruned, issues, flag_buckets = await _sweep_index(r, index)
+            stats["entries_dropped"] += dropped
+            stats["ttl_backfilled"] += expiring
+            stats["bucket_entries_pruned"] += pruned
+
+            if check_closed and lookups_left > 0:
+                try:
+                    closed, looked_up = await _prune_closed(
+                        r, repo, issues, flag_buckets, lookups_left
+                    )
+                    stats["closed_issues_pruned"] += closed
+                    lookups_left -= looked_up
+                except (RateLimited, CircuitOpen) as exc:
+                    # Retention work goes on; closed issues wait for
+                    # the next sweep
+                    logger.warning("Closed-issue pruning paused for this sweep: %s", exc)
+                    check_closed = False
+                except Exception:
+                    logger.exception("Failed to prune closed issues of %s", repo)
+
+        examined += 1
+        if examined % KEY_SWEEP_BATCH_SIZE == 0:
+            await _pace(KEY_SWEEP_BATCH_SIZE)
+
+    for name, value in stats.items():
+        metrics.inc(f"key_sweeper_{name}_total", value)
+    metrics.set_gauge("key_sweeper_last_duration_seconds", time.monotonic() - started)
+
+    return stats
+
+
+async def key_sweeper_loop():
+    """
+    Sweep every KEY_SWEEP_INTERVAL_SECONDS; with several replicas, the
+    one taking KEY_SWEEP_LOCK for the interval does the work.
+    """
+    while True:
+        await asyncio.sleep(KEY_SWEEP_INTERVAL_SECONDS)
+
+        try:
+            r = get_async_redis()
+            if not await r.set(KEY_SWEEP_LOCK, _OWNER, nx=True, ex=int(KEY_SWEEP_INTERVAL_SECONDS)):
+                continue
+
+            stats = await sweep_once()
+            logger.info("Key sweep done: %s", stats)
+
+        except asyncio.CancelledError:
+            logger.info("Key sweeper cancelled")
+            raise
+        except Exception:
+            logger.exception("Key sweep failed")
@@ -0,0 +1,121 @@
+"""
+Microbenchmark: webhook ingress CPU per delivery.
+
+For representative payload sizes, compares
+  1) before: HMAC check, then stdlib json on the same bytes
+             (what request.json() did) for every event type
+  2) after:  HMAC check, then a single orjson parse
+  3) after:  HMAC check only, for event types rejected by header
+
+Usage:
+    python scripts/bench_ingress.py [iterations]
+"""
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+
+from app.security.webhook_verify import verify_signature
+
+
+SECRET = "bench-secret"
+
+
+def _user(i: int) -> dict:
+    return {
+        "login": f"user{i}",
+        "id": 1000 + i,
+        "node_id": f"MDQ6VXNlcj{i:08d}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{1000 + i}?v=4",
+        "html_url": f"https://github.com/user{i}",
+        "type": "User",
+        "site_admin": False,
+    }
+
+
+def _payload(body_chars: int, files: int) -> dict:
+    """
+    Shape of a pull_request webhook; size is driven by the body text
+    and the number of nested label / reviewer objects.
+    """
+    return {
+        "action": "opened",
+        "number": 42,
+        "pull_request": {
+            "id": 123456789,
+            "number": 42,
+            "state": "open",
+            "title": "Improve things",
+            "body": "x" * body_chars,
+            "user": _user(0),
+            "labels": [
+                {"id": i, "name": f"label-{i}", "color": "ededed"}
+                for i in range(files)
+            ],
+            "requested_reviewers": [_user(i) for i in range(files)],
+            "head": {"ref": "feature", "sha": "a" * 40, "user": _user(1)},
+            "base": {"ref": "main", "sha": "b" * 40, "user": _user(2)},
+        },
+        "repository": {
+            "id": 1,
+            "full_name": "octo/repo",
+            "owner": _user(3),
+        },
+        "installation": {"id": 99},
+        "sender": _user(0),
+    }
+
+
+SIZES = [
+    ("small (~2 KB)", _payload(200, 2)),
+    ("medium (~60 KB)", _payload(20_000, 120)),
+    ("large (~500 KB)", _payload(200_000, 1_000)),
+]
+
+
+def _bench(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    os.environ["GITHUB_WEBHOOK_SECRET"] = SECRET
+
+    print(f"{iterations} iterations per case (us per delivery)\n")
+    print(f"{'payload':<18} {'bytes':>9} {'before':>10} {'after':>10} {'ignored':>10}")
+
+    for label, payload in SIZES:
+        body = json.dumps(payload).encode()
+        signature = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+        def before():
+            assert verify_signature(body, signature)
+            json.loads(body)
+
+        def after():
+            assert verify_signature(body, signature)
+            orjson.loads(body)
+
+        def ignored():
+            assert verify_signature(body, signature)
+
+        print(
+            f"{label:<18} {len(body):>9,} "
+            f"{_bench(before, iterations):>10.1f} "
+            f"{_bench(after, iterations):>10.1f} "
+            f"{_bench(ignored, iterations):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
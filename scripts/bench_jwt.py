@@ -0,0 +1,80 @@
+"""
+Microbenchmark: GitHub App JWT mint cost.
+
+Compares
+  1) before: PEM string passed to jwt.encode on every mint
+  2) after:  key parsed once, still signing every call
+  3) after:  create_jwt() with the cached JWT (what callers now hit)
+
+Usage:
+    python scripts/bench_jwt.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.github import auth
+
+
+def _payload() -> dict:
+    now = int(time.time())
+    return {"iat": now - 30, "exp": now + 9 * 60, "iss": 12345}
+
+
+def _bench(label: str, fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call_us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<40} {per_call_us:>10.1f} us/mint")
+    return per_call_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+    # Point app.github.auth at the throwaway key
+    auth.GITHUB_APP_ID = "12345"
+    auth.GITHUB_PRIVATE_KEY = pem
+    auth._PRIVATE_KEY = None
+    auth._CACHED_JWT = None
+
+    print(f"RS256, 2048-bit key, {iterations} iterations\n")
+
+    before = _bench(
+        "before: PEM string per mint",
+        lambda: jwt.encode(_payload(), pem, algorithm="RS256"),
+        iterations,
+    )
+
+    parsed = auth._load_private_key()
+    _bench(
+        "after: pre-parsed key, signing each call",
+        lambda: jwt.encode(_payload(), parsed, algorithm="RS256"),
+        iterations,
+    )
+
+    cached = _bench(
+        "after: create_jwt() (cached JWT)",
+        auth.create_jwt,
+        iterations * 100,
+    )
+
+    print(f"\ncreate_jwt speedup vs before: {before / cached:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark: Redis memory per greeting / follow-up flag entry, one
+string key per entry (schema version 2) vs the bucket hashes of
+app.cache.keys.
+
+Writes a synthetic dataset (by default 1M contributors greeted across
+1,000 repos, and a stopped flag on 1M issues of the same repos) in each
+layout, the same commands the store issues (value, retention TTL if
+configured and repo index entry), and reports the growth of used_memory.
+
+Usage:
+    python scripts/bench_memory.py [contributors] [repos]
+
+Needs a real Redis (INFO / MEMORY are not emulated by fakeredis).
+REDIS_URL must point at an EMPTY scratch database: the script refuses
+to start otherwise and flushes it between layouts.
+
+Results (defaults: 1M entries over 1,000 repos; Redis 6.2.14, libc
+malloc, hash-max-ziplist-entries 128, used_memory growth per entry,
+index entries and a TTL on every key included):
+
+    dataset          layout                   keys        MB  bytes/entry
+    greetings        string per entry      1001000     220.3        220.3
+    greetings        bucket hashes           65000      35.8         35.8
+    stopped flags    string per entry      1001000     219.4        219.4
+    stopped flags    bucket hashes            9000      12.3         12.3
+
+Buckets stay compact: MEMORY USAGE of a 16-field greeting bucket is
+361 B and of a full 128-field flag bucket 1,246 B (ziplist), against
+96 B for one string key before its index entry.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache.keys import (
+    FIRST_ISSUE,
+    FOLLOWUP_STOPPED,
+    REPO_KEYS,
+    repo_key,
+    greeting_bucket,
+    flag_bucket,
+)
+from app.cache.redis_client import get_redis
+from app.cache.backends import RETENTION_SECONDS
+
+
+_PIPELINE_SIZE = 10_000
+
+
+def _repo(i: int) -> str:
+    return f"bench-org/repo-{i}"
+
+
+def _entries(contributors: int, repos: int):
+    """
+    (repo, repo_id, n): n-th entry, spread round-robin over the repos.
+    """
+    for n in range(contributors):
+        i = n % repos
+        yield _repo(i), 1_000_000 + i, n
+
+
+def _write(r, commands):
+    pipe = r.pipeline(transaction=False)
+    queued = 0
+
+    for command in commands:
+        command(pipe)
+        queued += 1
+        if queued == _PIPELINE_SIZE:
+            pipe.execute()
+            queued = 0
+
+    pipe.execute()
+
+
+# =========================================================
+# Layouts
+# =========================================================
+
+def _strings_greetings(contributors, repos):
+    ttl = RETENTION_SECONDS.get(FIRST_ISSUE)
+    for repo, repo_id, n in _entries(contributors, repos):
+        key = repo_key(repo, FIRST_ISSUE, repo_id, f"user-{n}")
+        yield lambda p, key=key: p.set(key, 1, ex=ttl)
+        yield lambda p, key=key, repo=repo: p.sadd(repo_key(repo, REPO_KEYS, repo), key)
+
+
+def _strings_flags(issues, repos):
+    ttl = RETENTION_SECONDS.get(FOLLOWUP_STOPPED)
+    for repo, _, n in _entries(issues, repos):
+        key = repo_key(repo, FOLLOWUP_STOPPED, repo, n // repos)
+        yield lambda p, key=key: p.set(key, 1, ex=ttl)
+        yield lambda p, key=key, repo=repo: p.sadd(repo_key(repo, REPO_KEYS, repo), key)
+
+
+def _buckets_greetings(contributors, repos):
+    ttl = RETENTION_SECONDS.get(FIRST_ISSUE)
+    now = int(time.time())
+    for repo, repo_id, n in _entries(contributors, repos):
+        user = f"user-{n}"
+        key = repo_key(repo, FIRST_ISSUE, repo_id, greeting_bucket(user))
+        yield lambda p, key=key, user=user: p.hset(key, user, now)
+        if ttl:
+            yield lambda p, key=key: p.expire(key, ttl)
+        yield lambda p, key=key, repo=repo: p.sadd(repo_key(repo, REPO_KEYS, repo), key)
+
+
+def _buckets_flags(issues, repos):
+    ttl = RETENTION_SECONDS.get(FOLLOWUP_STOPPED)
+    now = int(time.time())
+    for repo, _, n in _entries(issues, repos):
+        number = n // repos
+        key = repo_key(repo, FOLLOWUP_STOPPED, repo, flag_bucket(number))
+        yield lambda p, key=key, number=number: p.hset(key, number, now)
+        if ttl:
+            yield lambda p, key=key: p.expire(key, ttl)
+        yield lambda p, key=key, repo=repo: p.sadd(repo_key(repo, REPO_KEYS, repo), key)
+
+
+LAYOUTS = {
+    ("greetings", "string per entry"): _strings_greetings,
+    ("greetings", "bucket hashes"): _buckets_greetings,
+    ("stopped flags", "string per entry"): _strings_flags,
+    ("stopped flags", "bucket hashes"): _buckets_flags,
+}
+
+
+def _used_memory(r) -> int:
+    return int(r.info("memory")["used_memory"])
+
+
+def main():
+    args = sys.argv[1:]
+    entries = int(args[0]) if args else 1_000_000
+    repos = int(args[1]) if len(args) > 1 else 1_000
+
+    r = get_redis()
+    if r.dbsize():
+        sys.exit("REDIS_URL must point at an empty scratch database")
+
+    print(f"{entries} entries over {repos} repos per dataset\n")
+    print(f"{'dataset':<16} {'layout':<18} {'keys':>10} {'MB':>9} {'bytes/entry':>12}")
+
+    try:
+        for (dataset, layout), commands in LAYOUTS.items():
+            base = _used_memory(r)
+            _write(r, commands(entries, repos))
+            used = _used_memory(r) - base
+            keys = r.dbsize()
+
+            print(f"{dataset:<16} {layout:<18} {keys:>10} {used / 1e6:>9.1f} {used / entries:>12.1f}")
+
+            r.flushdb()
+    finally:
+        r.flushdb()
+
+
+if __name__ == "__main__":
+    main()
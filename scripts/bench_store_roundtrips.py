@@ -0,0 +1,243 @@
+"""
+Benchmark: Redis round trips per webhook, before / after the
+pipelined + Lua store operations.
+
+"before" replays the previous command sequence of each store call
+(one command per round trip); "after" calls app.cache.store. A
+pipeline / MULTI or script call counts as one round trip.
+
+Usage:
+    python scripts/bench_store_roundtrips.py [iterations]
+
+Runs against REDIS_URL (use a scratch database: it writes under the
+"bench/repo" repo and purges it afterwards). With --fake it uses
+fakeredis instead (pip install fakeredis lupa), which only makes the
+round-trip counts meaningful, not the timings.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import redis_client
+from app.cache.backends import redis as store
+from app.cache.keys import (
+    FOLLOWUP,
+    STALE,
+    FOLLOWUP_STOPPED,
+    FOLLOWUP_COMPLETED,
+    REPO_KEYS,
+    shard_of,
+    shard_key,
+    repo_key,
+)
+from app.cache import keys
+
+
+REPO = "bench/repo"
+SHARD = shard_of(REPO)
+INDEX = repo_key(REPO, REPO_KEYS, REPO)
+INSTALLED_REPOS = shard_key(SHARD, keys.INSTALLED_REPOS)
+REPO_INSTALLATION = shard_key(SHARD, keys.REPO_INSTALLATION)
+FOLLOWUP_INDEX = shard_key(SHARD, keys.FOLLOWUP_INDEX)
+STALE_INDEX = shard_key(SHARD, keys.STALE_INDEX)
+
+
+class _Counter:
+    def __init__(self):
+        self.round_trips = 0
+
+
+def _instrument(r, counter: _Counter):
+    """
+    Count client commands and pipeline executions as round trips.
+    """
+    execute_command = r.execute_command
+
+    async def counted(*args, **kwargs):
+        counter.round_trips += 1
+        return await execute_command(*args, **kwargs)
+
+    r.execute_command = counted
+
+    pipeline_cls = type(r.pipeline())
+    pipeline_execute = pipeline_cls.execute
+
+    async def counted_execute(self, *args, **kwargs):
+        counter.round_trips += 1
+        return await pipeline_execute(self, *args, **kwargs)
+
+    pipeline_cls.execute = counted_execute
+
+
+# =========================================================
+# Previous implementation (one command per round trip)
+# =========================================================
+
+async def _before_mark_installed(r):
+    await r.sadd(INSTALLED_REPOS, REPO)
+    await r.hset(REPO_INSTALLATION, REPO, 1)
+
+
+async def _before_schedule_followup(r, n, due_at):
+    if not await r.sismember(INSTALLED_REPOS, REPO):
+        return
+    key = repo_key(REPO, FOLLOWUP, REPO, n)
+    await r.hset(key, mapping={"repo": REPO, "issue_number": n, "assignee": "u",
+                         "lang": "en", "due_at": due_at, "sent": 0, "attempt": 1})
+    await r.zadd(FOLLOWUP_INDEX, {key: due_at})
+    await r.sadd(INDEX, key)
+
+
+async def _before_reschedule_followup(r, n, due_at):
+    key = repo_key(REPO, FOLLOWUP, REPO, n)
+    data = await r.hgetall(key)
+    if not data or not await r.sismember(INSTALLED_REPOS, REPO):
+        await _before_cancel_followup(r, n)
+        return
+    await r.hset(key, mapping={"due_at": due_at, "sent": 0,
+                         "attempt": int(data.get("attempt", 1)) + 1})
+    await r.zadd(FOLLOWUP_INDEX, {key: due_at})
+
+
+async def _before_cancel_followup(r, n):
+    key = repo_key(REPO, FOLLOWUP, REPO, n)
+    stale_key = repo_key(REPO, STALE, REPO, n)
+    await r.delete(key)
+    await r.zrem(FOLLOWUP_INDEX, key)
+    await r.delete(stale_key)
+    await r.zrem(STALE_INDEX, stale_key)
+    await r.srem(INDEX, key, stale_key)
+
+
+async def _before_cancel_stale(r, n):
+    key = repo_key(REPO, STALE, REPO, n)
+    await r.delete(key)
+    await r.zrem(STALE_INDEX, key)
+    await r.srem(INDEX, key)
+
+
+async def _before_clear_flag(r, family, n):
+    key = repo_key(REPO, family, REPO, n)
+    await r.delete(key)
+    await r.srem(INDEX, key)
+
+
+async def _before_mark_sent(r, n):
+    key = repo_key(REPO, FOLLOWUP, REPO, n)
+    await r.hset(key, "sent", 1)
+    await r.zrem(FOLLOWUP_INDEX, key)
+
+
+async def _before_schedule_stale(r, n, due_at):
+    if not await r.sismember(INSTALLED_REPOS, REPO):
+        return
+    key = repo_key(REPO, STALE, REPO, n)
+    await r.hset(key, mapping={"repo": REPO, "issue_number": n, "lang": "en", "due_at": due_at})
+    await r.zadd(STALE_INDEX, {key: due_at})
+    await r.sadd(INDEX, key)
+
+
+BEFORE = {
+    "issues.assigned": lambda r, n: (
+        _before_mark_installed(r),
+        _before_clear_flag(r, FOLLOWUP_COMPLETED, n),
+        _before_clear_flag(r, FOLLOWUP_STOPPED, n),
+        _before_schedule_followup(r, n, 1e9),
+    ),
+    "issue_comment (assignee reply)": lambda r, n: (
+        _before_mark_installed(r),
+        _before_reschedule_followup(r, n, 2e9),
+    ),
+    "scheduler: follow-up sent": lambda r, n: (
+        _before_mark_sent(r, n),
+        _before_schedule_stale(r, n, 3e9),
+    ),
+    "issues.closed": lambda r, n: (
+        _before_mark_installed(r),
+        _before_cancel_followup(r, n),
+        _before_cancel_stale(r, n),
+        _before_clear_flag(r, FOLLOWUP_STOPPED, n),
+        _before_clear_flag(r, FOLLOWUP_COMPLETED, n),
+    ),
+}
+
+AFTER = {
+    "issues.assigned": lambda r, n: (
+        store.mark_repo_installed(REPO, 1),
+        store.clear_followup_completed(REPO, n),
+        store.clear_followup_stopped(REPO, n),
+        store.schedule_followup(REPO, n, "u", "en", 1e9),
+    ),
+    "issue_comment (assignee reply)": lambda r, n: (
+        store.mark_repo_installed(REPO, 1),
+        store.reschedule_followup(REPO, n, 2e9),
+    ),
+    "scheduler: follow-up sent": lambda r, n: (
+        store.mark_followup_sent(repo_key(REPO, FOLLOWUP, REPO, n)),
+        store.schedule_stale(REPO, n, "en", 3e9),
+    ),
+    "issues.closed": lambda r, n: (
+        store.mark_repo_installed(REPO, 1),
+        store.cancel_followup(REPO, n),
+        store.cancel_stale(REPO, n),
+        store.clear_followup_stopped(REPO, n),
+        store.clear_followup_completed(REPO, n),
+    ),
+}
+
+
+async def _measure(r, counter, flows, iterations):
+    results = {}
+
+    for name, flow in flows.items():
+        counter.round_trips = 0
+        start = time.perf_counter()
+
+        for n in range(iterations):
+            # Each flow is the sequence of store calls one webhook makes
+            for call in flow(r, n):
+                await call
+
+        elapsed = time.perf_counter() - start
+        results[name] = (counter.round_trips / iterations, elapsed / iterations * 1e6)
+
+    return results
+
+
+async def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    iterations = int(args[0]) if args else 500
+
+    if "--fake" in sys.argv:
+        import fakeredis
+        redis_client._async_redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    r = redis_client.get_async_redis()
+    counter = _Counter()
+    _instrument(r, counter)
+
+    await r.sadd(INSTALLED_REPOS, REPO)
+
+    try:
+        before = await _measure(r, counter, BEFORE, iterations)
+        after = await _measure(r, counter, AFTER, iterations)
+    finally:
+        await store.purge_repo(REPO)
+        await r.srem(INSTALLED_REPOS, REPO)
+        await r.hdel(REPO_INSTALLATION, REPO)
+        await redis_client.close_async_redis()
+
+    print(f"{iterations} iterations per flow\n")
+    print(f"{'flow':<32} {'RTT before':>10} {'RTT after':>10} {'us before':>10} {'us after':>10}")
+
+    for name in BEFORE:
+        b_rtt, b_us = before[name]
+        a_rtt, a_us = after[name]
+        print(f"{name:<32} {b_rtt:>10.1f} {a_rtt:>10.1f} {b_us:>10.1f} {a_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,452 @@
 """
-This file will be used in future features
-"""
\ No newline at end of file
+Store backend conformance suite: every test runs against each backend
+of app.cache.backends.
+
+The embedded backend always runs (in memory). The Redis backend runs
+when YAPLATE_TEST_REDIS_URL points at a scratch database; the suite
+deletes every yaplate key in it.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.cache import redis_client
+from app.cache.backends import load_backend
+from app.cache.keys import split_issue_key
+
+
+REPO = "octo/widgets"
+OTHER_REPO = "octo/gadgets"
+REPO_ID = 4242
+INSTALLATION = 7
+OTHER_INSTALLATION = 8
+
+
+@pytest.fixture(params=["embedded", "redis"])
+def store(request):
+    if request.param == "redis":
+        url = os.getenv("YAPLATE_TEST_REDIS_URL")
+        if not url:
+            pytest.skip("YAPLATE_TEST_REDIS_URL not set")
+        redis_client.REDIS_URL = url
+
+    return load_backend(request.param)
+
+
+def run(store, scenario):
+    """
+    Run one scenario on a fresh event loop and an empty store.
+    """
+    async def main():
+        await store.purge_all()
+        try:
+            await scenario()
+        finally:
+            await store.purge_all()
+            await store.close_store()
+
+    asyncio.run(main())
+
+
+# =========================================================
+# Installation state
+# =========================================================
+
+def test_installation_state(store):
+    async def scenario():
+        assert not await store.is_repo_installed(REPO)
+        assert await store.get_repo_installation(REPO) is None
+
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.mark_repo_installed(OTHER_REPO)
+
+        assert await store.is_repo_installed(REPO)
+        assert await store.get_repo_installation(REPO) == INSTALLATION
+        assert await store.get_repo_installation(OTHER_REPO) is None
+        assert await store.get_all_installed_repos() == {REPO, OTHER_REPO}
+
+        # Seeing traffic without an installation id keeps the recorded one
+        await store.mark_repo_installed(REPO)
+        assert await store.get_repo_installation(REPO) == INSTALLATION
+
+    run(store, scenario)
+
+
+def test_unmark_repo_installed_purges_its_state(store):
+    async def scenario():
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", time.time() + 3600)
+        await store.mark_greeted(REPO_ID, "alice", REPO)
+        await store.set_comment_mapping(11, 12, repo=REPO)
+
+        await store.unmark_repo_installed(REPO)
+
+        assert not await store.is_repo_installed(REPO)
+        assert not await store.has_followup(REPO, 1)
+        assert not await store.has_been_greeted(REPO_ID, "alice", REPO)
+        assert await store.get_comment_mapping(11, repo=REPO) is None
+        assert REPO not in await store.get_indexed_repos()
+
+    run(store, scenario)
+
+
+def test_purge_orphaned_repos(store):
+    async def scenario():
+        for repo in (REPO, OTHER_REPO):
+            await store.mark_repo_installed(repo, INSTALLATION)
+            await store.mark_followup_stopped(repo, 3)
+
+        assert await store.get_indexed_repos() == {REPO, OTHER_REPO}
+
+        await store.purge_orphaned_repos({REPO})
+
+        assert await store.is_followup_stopped(REPO, 3)
+        assert not await store.is_followup_stopped(OTHER_REPO, 3)
+
+    run(store, scenario)
+
+
+# =========================================================
+# Key-value state
+# =========================================================
+
+def test_comment_mapping(store):
+    async def scenario():
+        assert await store.get_comment_mapping(100, repo=REPO) is None
+
+        await store.set_comment_mapping(100, 200, repo=REPO)
+        assert await store.get_comment_mapping(100, repo=REPO) == "200"
+        assert await store.get_comment_mapping(100, repo=OTHER_REPO) is None
+
+        await store.delete_comment_mapping(100, repo=REPO)
+        assert await store.get_comment_mapping(100, repo=REPO) is None
+
+    run(store, scenario)
+
+
+def test_response_and_maintainer_caches(store):
+    async def scenario():
+        entry = {"etag": '"abc"', "body": [1, 2]}
+        await store.set_cached_response("7:/repos/octo/widgets", entry, 60)
+        assert await store.get_cached_response("7:/repos/octo/widgets") == entry
+        assert await store.get_cached_response("8:/repos/octo/widgets") is None
+
+        await store.set_cached_maintainers(REPO, ["alice", "bob"], 60)
+        await store.set_cached_maintainers(OTHER_REPO, [], 60)
+        assert await store.get_cached_maintainers(REPO) == ["alice", "bob"]
+        assert await store.get_cached_maintainers(OTHER_REPO) == []
+
+        await store.invalidate_maintainers(REPO)
+        assert await store.get_cached_maintainers(REPO) is None
+
+        await store.set_cached_maintainers(REPO, ["alice"], 60)
+        await store.set_cached_maintainers("elsewhere/repo", ["carol"], 60)
+        await store.set_cached_maintainers("octo-labs/repo", ["dave"], 60)
+        await store.invalidate_org_maintainers("octo")
+        assert await store.get_cached_maintainers(REPO) is None
+        assert await store.get_cached_maintainers(OTHER_REPO) is None
+        assert await store.get_cached_maintainers("elsewhere/repo") == ["carol"]
+        assert await store.get_cached_maintainers("octo-labs/repo") == ["dave"]
+
+    run(store, scenario)
+
+
+def test_delivery_dedup(store):
+    async def scenario():
+        assert await store.claim_delivery("d-1", 60)
+        assert not await store.claim_delivery("d-1", 60)
+        assert await store.claim_delivery("d-2", 60)
+
+        await store.release_delivery("d-1")
+        assert await store.claim_delivery("d-1", 60)
+
+    run(store, scenario)
+
+
+def test_greetings(store):
+    async def scenario():
+        assert not await store.has_been_greeted(REPO_ID, "alice", REPO)
+
+        await store.mark_greeted(REPO_ID, "alice", REPO)
+        await store.mark_user_seen(REPO_ID, "bob", REPO)
+        await store.mark_user_seen(REPO_ID, "", REPO)
+
+        assert await store.has_been_greeted(REPO_ID, "alice", REPO)
+        assert await store.has_been_greeted(REPO_ID, "bob", REPO)
+        assert not await store.has_been_greeted(REPO_ID + 1, "alice", OTHER_REPO)
+
+        # Issue and PR greetings are tracked separately
+        assert not await store.has_been_greeted_pr(REPO_ID, "alice", REPO)
+        await store.mark_greeted_pr(REPO_ID, "alice", REPO)
+        assert await store.has_been_greeted_pr(REPO_ID, "alice", REPO)
+
+    run(store, scenario)
+
+
+def test_followup_flags(store):
+    async def scenario():
+        await store.mark_followup_stopped(REPO, 5)
+        await store.mark_followup_completed(REPO, 6)
+
+        assert await store.is_followup_stopped(REPO, 5)
+        assert not await store.is_followup_stopped(REPO, 6)
+        assert await store.is_followup_completed(REPO, 6)
+        assert not await store.is_followup_completed(REPO, 5)
+
+        await store.clear_followup_stopped(REPO, 5)
+        await store.clear_followup_completed(REPO, 6)
+        assert not await store.is_followup_stopped(REPO, 5)
+        assert not await store.is_followup_completed(REPO, 6)
+
+    run(store, scenario)
+
+
+# =========================================================
+# Follow-up / stale scheduling
+# =========================================================
+
+def test_schedule_followup_needs_installed_repo(store):
+    async def scenario():
+        await store.schedule_followup(REPO, 1, "alice", "en", time.time() - 1)
+        assert not await store.has_followup(REPO, 1)
+        assert await store.claim_due_followups(time.time(), 60, 10) == []
+
+    run(store, scenario)
+
+
+def test_followup_claim_ack_release(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        for n in (1, 2, 3):
+            await store.schedule_followup(REPO, n, "alice", "en", now - 10 + n)
+        await store.schedule_followup(REPO, 4, "alice", "en", now + 3600)
+
+        data = await store.get_followup_data((await store.claim_due_followups(now, 60, 1))[0])
+        assert data["repo"] == REPO
+        assert data["issue_number"] == "1"
+        assert data["assignee"] == "alice"
+        assert data["lang"] == "en"
+        assert data["sent"] == "0"
+        assert data["attempt"] == "1"
+
+        # Claimed keys are handed out once; not-yet-due ones are not
+        rest = await store.claim_due_followups(now, 60, 10)
+        assert sorted(split_issue_key(key) for key in rest) == [(REPO, 2), (REPO, 3)]
+        assert await store.claim_due_followups(now, 60, 10) == []
+
+        await store.ack_followup(rest[0])
+        await store.release_followup(rest[1])
+        again = await store.claim_due_followups(time.time(), 60, 10)
+        assert again == [rest[1]]
+
+    run(store, scenario)
+
+
+def test_expired_lease_is_claimed_again(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", now - 1)
+
+        # Lease already expired: the claiming replica "died"
+        claimed = await store.claim_due_followups(now, -1, 10)
+        assert len(claimed) == 1
+
+        assert await store.claim_due_followups(now, 60, 10) == claimed
+
+    run(store, scenario)
+
+
+def test_lease_renewal(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", now - 1)
+        await store.schedule_stale(REPO, 1, "en", now - 1)
+
+        (key,) = await store.claim_due_followups(now, 60, 10)
+        assert await store.renew_followup_lease(key, 3600)
+        # Renewed past the original lease: not handed out again
+        assert await store.claim_due_followups(now + 120, 60, 10) == []
+
+        await store.ack_followup(key)
+        assert not await store.renew_followup_lease(key, 3600)
+
+        # An expired lease can be re-queued any moment: not renewed
+        (stale,) = await store.claim_due_stales(now, -1, 10)
+        assert not await store.renew_stale_lease(stale, 3600)
+        assert await store.claim_due_stales(time.time(), 60, 10) == [stale]
+        assert await store.renew_stale_lease(stale, 60)
+
+    run(store, scenario)
+
+
+def test_reschedule_and_mark_sent(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", now - 1)
+        key = (await store.claim_due_followups(now, 60, 10))[0]
+
+        await store.mark_followup_sent(key)
+        assert (await store.get_followup_data(key))["sent"] == "1"
+        await store.ack_followup(key)
+
+        await store.reschedule_followup(REPO, 1, now + 3600)
+        data = await store.get_followup_data(key)
+        assert data["attempt"] == "2"
+        assert data["sent"] == "0"
+        assert float(data["due_at"]) == now + 3600
+        assert await store.claim_due_followups(now, 60, 10) == []
+        assert await store.claim_due_followups(now + 3600, 60, 10) == [key]
+
+    run(store, scenario)
+
+
+def test_reschedule_cancels_when_gone_or_uninstalled(store):
+    async def scenario():
+        now = time.time()
+        await store.reschedule_followup(REPO, 1, now)
+        assert not await store.has_followup(REPO, 1)
+
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 2, "alice", "en", now + 60)
+        await store.schedule_stale(REPO, 2, "en", now - 1)
+        await store.unmark_repo_installed(REPO)
+        await store.reschedule_followup(REPO, 2, now)
+
+        assert not await store.has_followup(REPO, 2)
+        assert await store.claim_due_stales(now, 60, 10) == []
+
+    run(store, scenario)
+
+
+def test_cancel_followup_drops_followup_and_stale(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", now - 1)
+        await store.schedule_stale(REPO, 1, "en", now - 1)
+
+        await store.cancel_followup(REPO, 1)
+
+        assert not await store.has_followup(REPO, 1)
+        assert await store.claim_due_followups(now, 60, 10) == []
+        assert await store.claim_due_stales(now, 60, 10) == []
+
+    run(store, scenario)
+
+
+def test_stale_lifecycle(store):
+    async def scenario():
+        now = time.time()
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_stale(REPO, 9, "de", now - 1)
+        await store.schedule_stale(REPO, 10, "de", now - 1)
+
+        claimed = await store.claim_due_stales(now, 60, 10)
+        assert sorted(split_issue_key(key) for key in claimed) == [(REPO, 9), (REPO, 10)]
+
+        data = await store.get_stale_data(claimed[0])
+        assert data["repo"] == REPO
+        assert data["lang"] == "de"
+
+        await store.ack_stale(claimed[0])
+        await store.release_stale(claimed[1])
+        assert await store.claim_due_stales(time.time(), 60, 10) == [claimed[1]]
+
+        await store.cancel_stale(*split_issue_key(claimed[1]))
+        assert await store.get_stale_data(claimed[1]) == {}
+
+    run(store, scenario)
+
+
+# =========================================================
+# Repo-wide operations
+# =========================================================
+
+def test_purge_repo(store):
+    async def scenario():
+        now = time.time()
+        for repo in (REPO, OTHER_REPO):
+            await store.mark_repo_installed(repo, INSTALLATION)
+            await store.schedule_followup(repo, 1, "alice", "en", now - 1)
+            await store.mark_followup_completed(repo, 2)
+
+        await store.purge_repo(REPO)
+
+        assert not await store.has_followup(REPO, 1)
+        assert not await store.is_followup_completed(REPO, 2)
+        assert await store.has_followup(OTHER_REPO, 1)
+        assert await store.is_followup_completed(OTHER_REPO, 2)
+
+        claimed = await store.claim_due_followups(now, 60, 10)
+        assert [split_issue_key(key) for key in claimed] == [(OTHER_REPO, 1)]
+
+    run(store, scenario)
+
+
+def test_migrate_repo(store):
+    async def scenario():
+        now = time.time()
+        new_repo = "octo/widgets-ng"
+
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", now - 1)
+        await store.mark_followup_stopped(REPO, 2)
+        await store.mark_greeted(REPO_ID, "alice", REPO)
+        await store.set_comment_mapping(100, 200, repo=REPO)
+
+        await store.migrate_repo(REPO, new_repo)
+
+        assert not await store.is_repo_installed(REPO)
+        assert await store.is_repo_installed(new_repo)
+        assert await store.get_repo_installation(new_repo) == INSTALLATION
+
+        assert not await store.has_followup(REPO, 1)
+        assert await store.has_followup(new_repo, 1)
+        assert await store.is_followup_stopped(new_repo, 2)
+        assert await store.has_been_greeted(REPO_ID, "alice", new_repo)
+        assert await store.get_comment_mapping(100, repo=new_repo) == "200"
+
+        claimed = await store.claim_due_followups(now, 60, 10)
+        assert [split_issue_key(key) for key in claimed] == [(new_repo, 1)]
+        assert (await store.get_followup_data(claimed[0]))["repo"] == new_repo
+
+        # Migrating a repo onto its own name leaves it untouched
+        await store.migrate_repo(new_repo, new_repo)
+
+        assert await store.is_repo_installed(new_repo)
+        assert await store.get_repo_installation(new_repo) == INSTALLATION
+        assert await store.has_followup(new_repo, 1)
+        assert await store.is_followup_stopped(new_repo, 2)
+        assert new_repo in await store.get_indexed_repos()
+
+    run(store, scenario)
+
+
+def test_purge_installation_keeps_other_tenants(store):
+    async def scenario():
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.mark_repo_installed(OTHER_REPO, OTHER_INSTALLATION)
+        for repo in (REPO, OTHER_REPO):
+            await store.mark_followup_stopped(repo, 1)
+        await store.set_cached_response(f"{INSTALLATION}:/x", {"etag": "a"}, 60)
+        await store.set_cached_response(f"{OTHER_INSTALLATION}:/x", {"etag": "b"}, 60)
+
+        # The webhook may list repos of another installation: kept
+        await store.purge_installation(INSTALLATION, [REPO, OTHER_REPO])
+        assert await store.resume_purges() == 0
+
+        assert not await store.is_repo_installed(REPO)
+        assert not await store.is_followup_stopped(REPO, 1)
+        assert await store.get_cached_response(f"{INSTALLATION}:/x") is None
+
+        assert await store.is_repo_installed(OTHER_REPO)
+        assert await store.is_followup_stopped(OTHER_REPO, 1)
+        assert await store.get_cached_response(f"{OTHER_INSTALLATION}:/x") == {"etag": "b"}
+
+    run(store, scenario)
@@ -0,0 +1,112 @@
+"""
+GitHub circuit breaker state changes, on a fake clock.
+"""
+import pytest
+
+from app.github import circuit_breaker
+from app.github.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpen,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker("test", failure_threshold=3, recovery_seconds=60)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = _breaker()
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    # A success resets the count
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.is_available()
+
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 59
+    assert breaker.state == OPEN
+
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+    assert breaker.is_available()
+
+    breaker.before_call()
+
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 60
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    # The recovery wait starts over from the failed probe
+    clock.now += 60
+    assert breaker.state == HALF_OPEN
+
+
+def test_lost_probe_expires(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 60
+    breaker.before_call()
+
+    # The probe never reports back (e.g. cancelled)
+    clock.now += 59
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    clock.now += 1
+    breaker.before_call()
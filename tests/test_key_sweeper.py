@@ -0,0 +1,121 @@
+"""
+Key sweeper, run when YAPLATE_TEST_REDIS_URL points at a scratch Redis
+database; the suite deletes every yaplate key in it.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.cache import redis_client
+from app.cache.backends import load_backend
+from app.workers import key_sweeper
+
+
+REPO = "octo/widgets"
+INSTALLATION = 7
+
+
+@pytest.fixture
+def sweeper(monkeypatch):
+    url = os.getenv("YAPLATE_TEST_REDIS_URL")
+    if not url:
+        pytest.skip("YAPLATE_TEST_REDIS_URL not set")
+    redis_client.REDIS_URL = url
+
+    monkeypatch.setattr(key_sweeper, "KEY_SWEEP_MAX_KEYS_PER_SECOND", 1e9)
+    return monkeypatch
+
+
+def run(scenario):
+    store = load_backend("redis")
+
+    async def main():
+        await store.purge_all()
+        try:
+            await scenario(store)
+        finally:
+            await store.purge_all()
+            await store.close_store()
+
+    asyncio.run(main())
+
+
+def _github(closed: set[int], looked_up: list[set[int]]):
+    async def get_issues_state(refs):
+        refs = set(refs)
+        looked_up.append({number for _, number in refs})
+        return {
+            ref: {"state": "closed" if ref[1] in closed else "open"}
+            for ref in refs
+        }
+
+    return get_issues_state
+
+
+def test_sweep_prunes_closed_issues(sweeper):
+    looked_up = []
+    sweeper.setattr(key_sweeper, "get_issues_state", _github({1, 3}, looked_up))
+
+    async def scenario(store):
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", time.time() + 3600)
+        await store.schedule_followup(REPO, 2, "bob", "en", time.time() + 3600)
+        await store.mark_followup_stopped(REPO, 3)
+        await store.mark_followup_completed(REPO, 4)
+
+        stats = await key_sweeper.sweep_once()
+
+        assert stats["closed_issues_pruned"] == 2
+        assert looked_up == [{1, 2, 3, 4}]
+        assert not await store.has_followup(REPO, 1)
+        assert await store.has_followup(REPO, 2)
+        assert not await store.is_followup_stopped(REPO, 3)
+        assert await store.is_followup_completed(REPO, 4)
+
+    run(scenario)
+
+
+def test_sweep_looks_up_flags_in_rotation(sweeper):
+    looked_up = []
+    sweeper.setattr(key_sweeper, "get_issues_state", _github(set(), looked_up))
+    sweeper.setattr(key_sweeper, "KEY_SWEEP_FLAG_LOOKUPS_PER_REPO", 2)
+
+    async def scenario(store):
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        for number in (10, 11, 12):
+            await store.mark_followup_stopped(REPO, number)
+
+        for _ in range(3):
+            await key_sweeper.sweep_once()
+
+        # Two flags per sweep, then back to the start
+        assert looked_up == [{10, 11}, {12}, {10, 11}]
+
+        # Flags of open issues never expire
+        r = redis_client.get_async_redis()
+        (bucket,) = [
+            key async for key in r.scan_iter("yaplate:*:followup_stopped:*")
+        ]
+        assert await r.ttl(bucket) == -1
+
+    run(scenario)
+
+
+def test_sweep_lookup_budget(sweeper):
+    looked_up = []
+    sweeper.setattr(key_sweeper, "get_issues_state", _github(set(), looked_up))
+    sweeper.setattr(key_sweeper, "KEY_SWEEP_MAX_ISSUE_LOOKUPS", 2)
+
+    async def scenario(store):
+        await store.mark_repo_installed(REPO, INSTALLATION)
+        await store.schedule_followup(REPO, 1, "alice", "en", time.time() + 3600)
+        for number in (10, 11):
+            await store.mark_followup_stopped(REPO, number)
+
+        await key_sweeper.sweep_once()
+
+        assert looked_up == [{1, 10}]
+
+    run(scenario)
@@ -0,0 +1,76 @@
+"""
+KeyedExecutor: serial per key, concurrent across keys.
+"""
+import asyncio
+
+import pytest
+
+from app.utils.keyed_executor import KeyedExecutor
+
+
+def test_same_key_runs_in_call_order():
+    executor = KeyedExecutor("test")
+    log = []
+
+    def work(n):
+        async def fn():
+            log.append(("start", n))
+            # Later calls are shorter: only the lock keeps them in order
+            await asyncio.sleep(0.01 * (3 - n))
+            log.append(("end", n))
+            return n
+        return fn
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run("issue", work(n))) for n in range(3)]
+        await asyncio.sleep(0)
+        assert executor.pending("issue") == 3
+
+        assert await asyncio.gather(*tasks) == [0, 1, 2]
+        assert executor.pending() == 0
+        assert executor._keys == {}
+
+    asyncio.run(main())
+
+    assert log == [(event, n) for n in range(3) for event in ("start", "end")]
+
+
+def test_different_keys_run_concurrently():
+    executor = KeyedExecutor("test")
+    running = 0
+    peak = 0
+
+    async def fn():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def main():
+        await asyncio.gather(*(executor.run(("repo", n), fn) for n in range(3)))
+
+    asyncio.run(main())
+
+    assert peak == 3
+
+
+def test_failure_does_not_block_the_key():
+    executor = KeyedExecutor("test")
+
+    async def fail():
+        raise RuntimeError("handler failed")
+
+    async def ok():
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(executor.run("issue", fail))
+        second = asyncio.ensure_future(executor.run("issue", ok))
+
+        with pytest.raises(RuntimeError):
+            await first
+        assert await second == "done"
+        assert executor.pending() == 0
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Key schema startup guard, run when YAPLATE_TEST_REDIS_URL points at a
+scratch Redis database; the suite deletes every yaplate key in it.
+"""
+import asyncio
+import os
+
+import pytest
+
+from app.cache import migrations, redis_client
+from app.cache.keys import (
+    KEY_SCHEMA_VERSION,
+    KEY_SCHEMA_VERSION_KEY,
+    KEY_SCHEMA_LAYOUT_KEY,
+    key_layout,
+)
+
+
+@pytest.fixture
+def redis_url():
+    url = os.getenv("YAPLATE_TEST_REDIS_URL")
+    if not url:
+        pytest.skip("YAPLATE_TEST_REDIS_URL not set")
+    redis_client.REDIS_URL = url
+
+
+def run(scenario):
+    async def main():
+        r = redis_client.get_async_redis()
+        await r.delete(KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_LAYOUT_KEY)
+        try:
+            await scenario(r)
+        finally:
+            await r.delete(KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_LAYOUT_KEY)
+            await redis_client.close_async_redis()
+
+    asyncio.run(main())
+
+
+def test_empty_database_is_stamped_with_version_and_layout(redis_url):
+    async def scenario(r):
+        await migrations.check_key_schema()
+
+        assert await r.get(KEY_SCHEMA_VERSION_KEY) == str(KEY_SCHEMA_VERSION)
+        assert await r.hgetall(KEY_SCHEMA_LAYOUT_KEY) == key_layout()
+
+    run(scenario)
+
+
+def test_layout_is_recorded_on_a_database_stamped_without_it(redis_url):
+    async def scenario(r):
+        await r.set(KEY_SCHEMA_VERSION_KEY, KEY_SCHEMA_VERSION)
+
+        await migrations.check_key_schema()
+
+        assert await r.hgetall(KEY_SCHEMA_LAYOUT_KEY) == key_layout()
+
+    run(scenario)
+
+
+def test_changed_shard_count_refuses_startup(redis_url, monkeypatch):
+    async def scenario(r):
+        await migrations.check_key_schema()
+        shards = key_layout()["REDIS_KEY_SHARDS"]
+
+        layout = {**key_layout(), "REDIS_KEY_SHARDS": str(int(shards) * 2)}
+        monkeypatch.setattr(migrations, "key_layout", lambda: layout)
+
+        with pytest.raises(RuntimeError, match="REDIS_KEY_SHARDS"):
+            await migrations.check_key_schema()
+
+        # The recorded layout is left as it was
+        assert await r.hget(KEY_SCHEMA_LAYOUT_KEY, "REDIS_KEY_SHARDS") == shards
+
+    run(scenario)
@@ -0,0 +1,140 @@
+"""
+GitHub rate-limit budget tracking and throttling, on a fake clock.
+"""
+import asyncio
+
+import pytest
+
+from app.github import rate_limit
+from app.github.rate_limit import RateLimited
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", clock.sleep)
+    monkeypatch.setattr(rate_limit, "_BUDGETS", {})
+    monkeypatch.setattr(rate_limit, "GITHUB_RATE_LIMIT_RESERVE", 100)
+    monkeypatch.setattr(rate_limit, "GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", 30)
+    monkeypatch.setattr(rate_limit, "GITHUB_SECONDARY_RATE_LIMIT_BACKOFF_SECONDS", 60)
+    return clock
+
+
+def _headers(remaining: int, reset_in: float, clock: FakeClock, **extra) -> dict:
+    return {
+        "x-ratelimit-limit": "5000",
+        "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-reset": str(clock.now + reset_in),
+        **extra,
+    }
+
+
+def acquire(installation_id=7, resource="core"):
+    asyncio.run(rate_limit.acquire(installation_id, resource))
+
+
+def test_calls_go_through_while_budget_lasts(clock):
+    # Nothing known yet
+    acquire()
+
+    rate_limit.record(7, "core", _headers(1000, 600, clock))
+    for _ in range(3):
+        acquire()
+
+    assert clock.sleeps == []
+    assert rate_limit._budget(7, "core").remaining == 997
+
+
+def test_reserve_spreads_remaining_calls(clock):
+    rate_limit.record(7, "core", _headers(10, 100, clock))
+
+    acquire()
+    acquire()
+
+    # 100s left for 10 calls, then 90s for 9
+    assert clock.sleeps == [10, 10]
+
+
+def test_exhausted_budget_waits_for_reset(clock):
+    rate_limit.record(7, "core", _headers(0, 20, clock))
+    acquire()
+    assert clock.sleeps == [20]
+
+    # A new window: no more waiting
+    acquire()
+    assert clock.sleeps == [20]
+
+
+def test_exhausted_budget_past_max_wait_is_rejected(clock):
+    rate_limit.record(7, "core", _headers(0, 120, clock))
+
+    with pytest.raises(RateLimited) as exc:
+        acquire()
+
+    assert exc.value.retry_at == clock.now + 120
+    assert clock.sleeps == []
+
+
+def test_budgets_are_per_installation_and_resource(clock):
+    rate_limit.record(7, "core", _headers(0, 120, clock))
+
+    acquire(8, "core")
+    acquire(7, "graphql")
+    with pytest.raises(RateLimited):
+        acquire(7, "core")
+
+
+def test_resource_header_picks_the_budget(clock):
+    rate_limit.record(7, "core", _headers(0, 120, clock, **{"x-ratelimit-resource": "search"}))
+
+    acquire(7, "core")
+    with pytest.raises(RateLimited):
+        acquire(7, "search")
+
+
+def test_block_honors_retry_after(clock):
+    retry_at = rate_limit.block(7, "core", {"retry-after": "5"})
+    assert retry_at == clock.now + 5
+
+    acquire()
+    assert clock.sleeps == [5]
+
+    rate_limit.block(7, "core", {"retry-after": "300"})
+    with pytest.raises(RateLimited):
+        acquire()
+
+
+def test_block_waits_for_ratelimit_reset(clock):
+    headers = _headers(0, 25, clock)
+    rate_limit.record(7, "core", headers)
+
+    assert rate_limit.block(7, "core", headers) == clock.now + 25
+
+
+def test_block_falls_back_to_secondary_backoff(clock):
+    assert rate_limit.block(7, "core", {}) == clock.now + 60
+    assert rate_limit.block(7, "core", {"retry-after": "soon"}) == clock.now + 60
+
+
+def test_rate_limit_responses_are_told_apart_from_access_loss():
+    assert rate_limit.is_rate_limit_response(429, {}, "")
+    assert rate_limit.is_rate_limit_response(403, {"retry-after": "60"}, "")
+    assert rate_limit.is_rate_limit_response(403, {"x-ratelimit-remaining": "0"}, "")
+    assert rate_limit.is_rate_limit_response(403, {}, "API rate limit exceeded")
+
+    assert not rate_limit.is_rate_limit_response(403, {"x-ratelimit-remaining": "42"}, "Forbidden")
+    assert not rate_limit.is_rate_limit_response(404, {"retry-after": "60"}, "")
@@ -0,0 +1,99 @@
+"""
+SingleFlight: concurrent calls sharing a key run the work once.
+"""
+import asyncio
+
+import pytest
+
+from app.utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"etag": "abc"}
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        assert flight.in_flight() == 0
+        return results
+
+    results = asyncio.run(main())
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+
+
+def test_concurrent_callers_share_one_exception():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("GitHub down")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("key", fetch) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+
+    assert calls == [1]
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert all(result is results[0] for result in results)
+
+
+def test_different_keys_and_later_calls_run_again():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def main():
+        assert await asyncio.gather(
+            flight.do("a", lambda: fetch("a")),
+            flight.do("b", lambda: fetch("b")),
+        ) == ["a", "b"]
+
+        # The first call has finished: nothing left to join
+        assert await flight.do("a", lambda: fetch("a")) == "a"
+
+    asyncio.run(main())
+
+    assert calls == ["a", "b", "a"]
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = SingleFlight("test")
+    release = None
+
+    async def fetch():
+        await release.wait()
+        return 42
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        release.set()
+
+        assert await second == 42
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
@@ -1,3 +1,249 @@
 """
-This file will be used in future features
-"""
\ No newline at end of file
+Webhook handlers, run against the embedded store backend, and stream
+ingest, run when YAPLATE_TEST_REDIS_URL points at a scratch Redis
+database.
+"""
+import asyncio
+import os
+import time
+
+import orjson
+import pytest
+
+from app.cache import redis_client
+from app.cache.backends import STORE_API, load_backend
+from app.cache.keys import EVENT_STREAM_KEY, EVENT_DEADLETTER_KEY
+from app.github import comments, events
+from app.settings import (
+    FOLLOWUP_DEFAULT_INTERVAL_HOURS,
+    MAX_FOLLOWUP_ATTEMPTS,
+    WEBHOOK_STREAM_GROUP,
+)
+from app.workers import event_queue, event_stream
+
+
+REPO = "octo/widgets"
+ISSUE = 5
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = load_backend("embedded")
+    for name in STORE_API:
+        if hasattr(comments, name):
+            monkeypatch.setattr(comments, name, getattr(backend, name))
+    return backend
+
+
+def run(store, scenario):
+    async def main():
+        await store.purge_all()
+        try:
+            await scenario()
+        finally:
+            await store.purge_all()
+            await store.close_store()
+
+    asyncio.run(main())
+
+
+def _comment(body: str) -> dict:
+    return {
+        "action": "created",
+        "comment": {"id": 101, "body": body, "user": {"login": "alice"}},
+        "issue": {"number": ISSUE},
+        "repository": {"full_name": REPO},
+    }
+
+
+async def _followup(store):
+    await store.mark_repo_installed(REPO, 7)
+    await store.schedule_followup(REPO, ISSUE, "alice", "en", time.time() + 60)
+    (key,) = await store.claim_due_followups(time.time() + 60, 60, 10)
+    await store.ack_followup(key)
+    return key
+
+
+@pytest.mark.parametrize("body", ["Still on it, PR soon", "> any update?\n\nyes, PR soon"])
+def test_assignee_reply_reschedules_followup(store, body):
+    async def scenario():
+        key = await _followup(store)
+
+        before = time.time()
+        await comments.handle_comment(_comment(body))
+
+        data = await store.get_followup_data(key)
+        assert data["attempt"] == "2"
+        assert float(data["due_at"]) >= before + FOLLOWUP_DEFAULT_INTERVAL_HOURS * 3600
+        assert not await store.is_followup_completed(REPO, ISSUE)
+
+    run(store, scenario)
+
+
+def test_assignee_reply_after_last_attempt_completes_followup(store):
+    async def scenario():
+        await _followup(store)
+        for _ in range(MAX_FOLLOWUP_ATTEMPTS - 1):
+            await store.reschedule_followup(REPO, ISSUE, time.time() + 60)
+
+        await comments.handle_comment(_comment("Still on it, PR soon"))
+
+        assert not await store.has_followup(REPO, ISSUE)
+        assert await store.is_followup_completed(REPO, ISSUE)
+
+    run(store, scenario)
+
+
+def test_repository_renamed_migrates_from_old_name(monkeypatch):
+    migrated = []
+
+    async def migrate_repo(old_repo, new_repo):
+        migrated.append((old_repo, new_repo))
+
+    monkeypatch.setattr(events, "migrate_repo", migrate_repo)
+
+    # repository already carries the new name
+    payload = {
+        "action": "renamed",
+        "changes": {"repository": {"name": {"from": "widgets"}}},
+        "repository": {
+            "full_name": "octo/widgets-ng",
+            "name": "widgets-ng",
+            "owner": {"login": "octo"},
+        },
+    }
+    asyncio.run(events.handle_event("repository", payload))
+
+    assert migrated == [(REPO, "octo/widgets-ng")]
+
+
+def test_dropped_event_releases_its_delivery(store, monkeypatch):
+    monkeypatch.setattr(event_queue, "release_delivery", store.release_delivery)
+    monkeypatch.setattr(event_queue, "WEBHOOK_QUEUE_OVERFLOW", event_queue.OVERFLOW_DROP_OLDEST)
+
+    async def scenario():
+        # No workers: the queue only fills
+        monkeypatch.setattr(event_queue, "_queue", asyncio.Queue(maxsize=1))
+
+        for delivery in ("d-1", "d-2"):
+            assert await store.claim_delivery(delivery, 60)
+            await event_queue.enqueue_event("issues", {"action": "opened"}, delivery)
+
+        assert event_queue._queue.get_nowait().delivery_id == "d-2"
+
+        # The dropped event can be redelivered; the queued one is
+        # still deduplicated
+        assert await store.claim_delivery("d-1", 60)
+        assert not await store.claim_delivery("d-2", 60)
+
+    run(store, scenario)
+
+
+# =========================================================
+# Stream ingest
+# =========================================================
+
+@pytest.fixture
+def stream(monkeypatch):
+    url = os.getenv("YAPLATE_TEST_REDIS_URL")
+    if not url:
+        pytest.skip("YAPLATE_TEST_REDIS_URL not set")
+    redis_client.REDIS_URL = url
+
+    # Pending entries are reclaimable at once
+    monkeypatch.setattr(event_stream, "WEBHOOK_STREAM_CLAIM_IDLE_SECONDS", 0)
+    monkeypatch.setattr(event_stream, "WEBHOOK_STREAM_MAX_DELIVERIES", 2)
+    monkeypatch.setattr(event_stream, "WEBHOOK_STREAM_BLOCK_MS", 10)
+    return monkeypatch
+
+
+def run_stream(scenario):
+    async def main():
+        r = redis_client.get_async_redis()
+        await r.delete(EVENT_STREAM_KEY, EVENT_DEADLETTER_KEY)
+        try:
+            await event_stream.ensure_group()
+            await scenario(r)
+        finally:
+            await r.delete(EVENT_STREAM_KEY, EVENT_DEADLETTER_KEY)
+            await redis_client.close_async_redis()
+
+    asyncio.run(main())
+
+
+def test_stream_entry_is_acked_once_handled(stream):
+    handled = []
+
+    async def handle_event(event_type, payload, raise_errors=False):
+        handled.append((event_type, payload, raise_errors))
+
+    stream.setattr(event_stream, "handle_event", handle_event)
+
+    async def scenario(r):
+        await event_stream.publish_event("issues", b'{"action": "opened"}', "d-1")
+        await event_stream._poll("test-0", reclaim=True)
+
+        assert handled == [("issues", {"action": "opened"}, True)]
+        assert (await r.xpending(EVENT_STREAM_KEY, WEBHOOK_STREAM_GROUP))["pending"] == 0
+
+    run_stream(scenario)
+
+
+def test_failing_stream_entry_is_retried_then_dead_lettered(stream):
+    attempts = []
+
+    async def handle_comment(payload):
+        attempts.append(payload["comment"]["id"])
+        raise RuntimeError("handler failed")
+
+    # Fails inside the real dispatcher, which swallows errors outside
+    # stream ingest
+    stream.setattr(events, "handle_comment", handle_comment)
+
+    body = orjson.dumps({**_comment("Still on it"), "repository": {"full_name": REPO, "id": 1}})
+
+    async def scenario(r):
+        await event_stream.publish_event("issue_comment", body, "d-1")
+
+        # Read (attempt 1), reclaim (attempt 2), reclaim past the
+        # limit (dead-lettered), then nothing is left
+        for _ in range(4):
+            await event_stream._poll("test-0", reclaim=True)
+
+        assert attempts == [101, 101]
+        assert (await r.xpending(EVENT_STREAM_KEY, WEBHOOK_STREAM_GROUP))["pending"] == 0
+
+        dead = await r.xrange(EVENT_DEADLETTER_KEY)
+        assert len(dead) == 1
+        assert dead[0][1]["delivery"] == "d-1"
+        assert dead[0][1]["reason"] == "delivered 3 times"
+
+    run_stream(scenario)
+
+
+def test_reclaim_continues_from_its_cursor(stream):
+    async def handle_event(event_type, payload, raise_errors=False):
+        raise RuntimeError("handler failed")
+
+    stream.setattr(event_stream, "handle_event", handle_event)
+    stream.setattr(event_stream, "_reclaim_cursors", {})
+
+    async def scenario(r):
+        ids = [
+            await event_stream.publish_event("issues", b'{"action": "opened"}', f"d-{n}")
+            for n in range(3)
+        ]
+        # Read once and failed: all three left pending
+        await event_stream._poll("test-0", reclaim=False)
+
+        stream.setattr(event_stream, "WEBHOOK_STREAM_BATCH_SIZE", 2)
+        first = await event_stream._reclaim("test-1")
+        second = await event_stream._reclaim("test-1")
+
+        assert [(entry_id, times) for entry_id, _, times in first + second] == [
+            (entry_id, 2) for entry_id in ids
+        ]
+        assert event_stream._reclaim_cursors["test-1"] == "0-0"
+
+    run_stream(scenario)
+